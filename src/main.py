@@ -1,4 +1,4 @@
-from src.simulator.plotter import Plotter
+from src.simulator.plotter import Plotter, PlotterProcess
 from src.simulator.simulator import Simulator
 
 import matplotlib.pyplot as plt
@@ -19,6 +19,9 @@ def main():
         plot_graph_on_start=Plotter.PlotGraphEnum.NO, # NO, YES, YES_WITH_LABELS
         # scale_on_start=2.5,
     )
+    # the plotter can also run in a separate process (with its frame rate capped),
+    #   so drawing does not slow the simulation down:
+    # pl = PlotterProcess(sim, fps=30, background_img="assets/background.png")
 
     pl.run()
 
@@ -0,0 +1,329 @@
+"""
+Command line interface of the simulator. It never imports pygame nor matplotlib,
+so it can be used on machines without a display.
+
+Usage (from the src directory, or with src on PYTHONPATH):
+
+    python -m simulator run --model ../assets/model.json --steps 3600 --seed 0 --output ../results/run-0
+    python -m simulator replicate --model ../assets/model.json --replications 30 --seed 0
+    python -m simulator sweep --model ../assets/model.json --grid sweep.json --replications 10 --output ../results/sweep
+    python -m simulator optimize --model ../assets/model.json --kpi cars_delay --candidates 27 --output ../results/plan
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from time import time
+
+from .simulator import Simulator
+from .telemetry import TelemetryRecorder, DiskSink
+from .kpi import KPIS, DEFAULT_KPIS
+from .runner import run_simulation
+from .replications import ReplicationRunner
+from .sweep import ParameterSweep
+from .overrides import expand_grid
+from .optimizer import SignalTimingOptimizer
+
+
+def _parse_kpis(value: str) -> list[str]:
+    names = [name.strip() for name in value.split(",") if name.strip() != ""]
+    for name in names:
+        if name not in KPIS.keys():
+            raise argparse.ArgumentTypeError(f"unknown KPI {name} (available: {', '.join(KPIS.keys())})")
+    return names
+
+
+def _add_run_parser(subparsers) -> None:
+    parser = subparsers.add_parser("run", help="run a single simulation without visualisation")
+    parser.add_argument("--model", required=True, help="path to the JSON file with the model")
+    parser.add_argument("--steps", type=int, default=1000, help="number of steps (1 step == 1 s)")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random number generator")
+    parser.add_argument("--output", default=None,
+                        help="directory for the results (results.json and, optionally, telemetry)")
+    parser.add_argument("--kpis", type=_parse_kpis, default=DEFAULT_KPIS,
+                        help=f"comma separated KPIs to compute (default: {','.join(DEFAULT_KPIS)}; "
+                             f"available: {','.join(KPIS.keys())})")
+    parser.add_argument("--t-gap", type=float, default=0,
+                        help="real time between steps [s] (default: 0 - as fast as possible)")
+    parser.add_argument("--engine", choices=[e.name for e in Simulator.EngineEnum],
+                        default=Simulator.EngineEnum.OBJECTS.name)
+    parser.add_argument("--telemetry", action="store_true",
+                        help="write the state of cars, pedestrians and lights at every step "
+                             "to <output>/telemetry")
+    parser.set_defaults(func=_run)
+
+
+def _run(args) -> int:
+    telemetry = None
+    sink = None
+    if args.telemetry:
+        if args.output is None:
+            print("--telemetry requires --output", file=sys.stderr)
+            return 2
+        sink = DiskSink(os.path.join(args.output, "telemetry"))
+        telemetry = TelemetryRecorder(pedestrians_every=1, sink=sink)
+
+    results = run_simulation(
+        args.model,
+        args.steps,
+        seed=args.seed,
+        kpis=args.kpis,
+        engine=Simulator.EngineEnum[args.engine],
+        t_gap=args.t_gap,
+        telemetry=telemetry,
+    )
+
+    print(f"Steps: {results['steps']}, "
+          f"time elapsed (real): {results['time_elapsed_real']:.2f} [s], "
+          f"steps/s: {results['steps_per_second']:.1f}")
+    for name, value in results["kpis"].items():
+        print(f"{name}: {value:.4f}")
+    if sink is not None and sink.get_n_dropped() > 0:
+        print(f"Telemetry chunks dropped (writing fell behind): {sink.get_n_dropped()}", file=sys.stderr)
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        with open(os.path.join(args.output, "results.json"), "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    return 0
+
+
+def _add_replicate_parser(subparsers) -> None:
+    parser = subparsers.add_parser("replicate", help="run independent replications in parallel processes")
+    parser.add_argument("--model", required=True, help="path to the JSON file with the model")
+    parser.add_argument("--replications", type=int, default=10, help="number of replications")
+    parser.add_argument("--steps", type=int, default=1000, help="number of steps of every replication")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first replication")
+    parser.add_argument("--output", default=None,
+                        help="directory for the results (replications.csv and summary.csv)")
+    parser.add_argument("--kpis", type=_parse_kpis, default=DEFAULT_KPIS,
+                        help=f"comma separated KPIs to compute (default: {','.join(DEFAULT_KPIS)})")
+    parser.add_argument("--confidence", type=float, default=.95, help="confidence level of the intervals")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--engine", choices=[e.name for e in Simulator.EngineEnum],
+                        default=Simulator.EngineEnum.OBJECTS.name)
+    parser.set_defaults(func=_replicate)
+
+
+def _replicate(args) -> int:
+    runner = ReplicationRunner(
+        args.model,
+        args.replications,
+        steps=args.steps,
+        base_seed=args.seed,
+        kpis=args.kpis,
+        engine=Simulator.EngineEnum[args.engine],
+        max_workers=args.workers,
+    )
+    t_start = time()
+    results = runner.run()
+    t_end = time()
+    summary = runner.get_summary(args.confidence)
+
+    print(f"Replications: {len(results)}, "
+          f"time elapsed (real): {t_end - t_start:.2f} [s], "
+          f"steps/s (total): {len(results) * args.steps / (t_end - t_start):.1f}")
+    print(summary.to_string())
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        results.to_csv(os.path.join(args.output, "replications.csv"))
+        summary.to_csv(os.path.join(args.output, "summary.csv"))
+    return 0
+
+
+def _parse_value(value: str) -> float | bool | str:
+    # numbers, true / false, or strings (e.g. states of lights), checked against the parameters by the overrides
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _parse_set(value: str) -> tuple[str, list]:
+    # <type>.<id>.<parameter>=v1,v2,...
+    if "=" not in value:
+        raise argparse.ArgumentTypeError(f"{value} is not of the form <type>.<id>.<parameter>=v1,v2,...")
+    key, values = value.split("=", 1)
+    return key.strip(), [_parse_value(v.strip()) for v in values.split(",")]
+
+
+def _add_sweep_parser(subparsers) -> None:
+    parser = subparsers.add_parser(
+        "sweep",
+        help="run every configuration of overridden parameters (e.g. light timings) in parallel processes"
+    )
+    parser.add_argument("--model", required=True, help="path to the JSON file with the model")
+    parser.add_argument("--grid", default=None,
+                        help="JSON file with the configurations: either a grid "
+                             "{\"lights.0.duration_green\": [30, 60], ...} or a list of overrides "
+                             "[{\"lights.0.duration_green\": 30, ...}, ...]")
+    parser.add_argument("--set", type=_parse_set, action="append", default=[], dest="grid_values",
+                        metavar="TYPE.ID.PARAMETER=V1,V2",
+                        help="values of a parameter in the grid (can be repeated, combined with --grid)")
+    parser.add_argument("--replications", type=int, default=1, help="number of replications of every configuration")
+    parser.add_argument("--steps", type=int, default=1000, help="number of steps of every replication")
+    parser.add_argument("--seed", type=int, default=0, help="seed the seeds of the replications are derived from")
+    parser.add_argument("--output", default=None,
+                        help="directory for the results (results.csv, written as the jobs finish, and summary.csv)")
+    parser.add_argument("--kpis", type=_parse_kpis, default=DEFAULT_KPIS,
+                        help=f"comma separated KPIs to compute (default: {','.join(DEFAULT_KPIS)})")
+    parser.add_argument("--confidence", type=float, default=.95, help="confidence level of the intervals")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--engine", choices=[e.name for e in Simulator.EngineEnum],
+                        default=Simulator.EngineEnum.OBJECTS.name)
+    parser.set_defaults(func=_sweep)
+
+
+def _sweep(args) -> int:
+    grid = dict(args.grid_values)
+    configs = [{}]
+    if args.grid is not None:
+        with open(args.grid, "r") as grid_file:
+            source = json.load(grid_file)
+        configs = expand_grid(source) if isinstance(source, dict) else source
+    configs = [
+        {**config, **grid_config}
+        for config in configs
+        for grid_config in expand_grid(grid)
+    ]
+
+    sweep = ParameterSweep(
+        args.model,
+        configs,
+        n_replications=args.replications,
+        steps=args.steps,
+        seed=args.seed,
+        kpis=args.kpis,
+        engine=Simulator.EngineEnum[args.engine],
+        max_workers=args.workers,
+    )
+    print(f"Configurations: {len(configs)}, replications: {args.replications}")
+
+    results_file = None
+    writer = None
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        results_file = open(os.path.join(args.output, "results.csv"), "w", newline="")
+        keys = list(dict.fromkeys(key for config in configs for key in config.keys()))
+        writer = csv.DictWriter(results_file, ["config", "replication"] + keys + args.kpis + ["time_elapsed_real"])
+        writer.writeheader()
+
+    t_start = time()
+    try:
+        for i, row in enumerate(sweep.iter_results()):
+            if writer is not None:
+                writer.writerow(row)
+                results_file.flush()
+            print(f"[{i + 1}/{len(configs) * args.replications}] config {row['config']}, "
+                  f"replication {row['replication']}")
+    finally:
+        if results_file is not None:
+            results_file.close()
+    t_end = time()
+    summary = sweep.get_summary(args.confidence)
+
+    print(f"Time elapsed (real): {t_end - t_start:.2f} [s]")
+    print(summary.to_string())
+
+    if args.output is not None:
+        summary.to_csv(os.path.join(args.output, "summary.csv"))
+    return 0
+
+
+def _parse_bounds(value: str) -> tuple[int, int]:
+    try:
+        low, high = (int(v) for v in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not of the form MIN,MAX")
+    return low, high
+
+
+def _parse_ids(value: str) -> list[int]:
+    try:
+        return [int(v) for v in value.split(",") if v.strip() != ""]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a comma separated list of ids")
+
+
+def _add_optimize_parser(subparsers) -> None:
+    parser = subparsers.add_parser("optimize", help="search light timings minimising a KPI (successive halving)")
+    parser.add_argument("--model", required=True, help="path to the JSON file with the model")
+    parser.add_argument("--kpi", choices=list(KPIS.keys()), default="cars_stopped_avg", help="KPI to optimize")
+    parser.add_argument("--maximize", action="store_true", help="maximize the KPI instead of minimizing it")
+    parser.add_argument("--lights", type=_parse_ids, default=None,
+                        help="comma separated ids of the lights to optimize "
+                             "(default: all lights that are not complementary to another light)")
+    parser.add_argument("--green", type=_parse_bounds, default=(10, 90), metavar="MIN,MAX",
+                        help="bounds of the green durations [s]")
+    parser.add_argument("--red", type=_parse_bounds, default=(10, 90), metavar="MIN,MAX",
+                        help="bounds of the red durations [s]")
+    parser.add_argument("--candidates", type=int, default=27, help="number of candidate plans")
+    parser.add_argument("--eta", type=int, default=3,
+                        help="1 / eta of the candidates are kept in every rung, their simulations are eta times longer")
+    parser.add_argument("--min-steps", type=int, default=400, help="number of steps of the first rung")
+    parser.add_argument("--max-steps", type=int, default=3600, help="maximal number of steps of a simulation")
+    parser.add_argument("--replications", type=int, default=2,
+                        help="number of replications of every candidate in every rung")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the candidates and of the replications")
+    parser.add_argument("--output", default=None,
+                        help="directory for the results (plan.json and history.csv)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--engine", choices=[e.name for e in Simulator.EngineEnum],
+                        default=Simulator.EngineEnum.OBJECTS.name)
+    parser.set_defaults(func=_optimize)
+
+
+def _optimize(args) -> int:
+    optimizer = SignalTimingOptimizer(
+        args.model,
+        kpi=args.kpi,
+        minimize=not args.maximize,
+        lights=args.lights,
+        green_bounds=args.green,
+        red_bounds=args.red,
+        n_candidates=args.candidates,
+        eta=args.eta,
+        min_steps=args.min_steps,
+        max_steps=args.max_steps,
+        n_replications=args.replications,
+        seed=args.seed,
+        engine=Simulator.EngineEnum[args.engine],
+        max_workers=args.workers,
+    )
+    t_start = time()
+    best = optimizer.run()
+    t_end = time()
+
+    print(f"Time elapsed (real): {t_end - t_start:.2f} [s], "
+          f"steps simulated: {optimizer.get_steps_simulated()}")
+    print(f"{args.kpi}: {optimizer.get_best_value():.4f}")
+    for key, value in best.items():
+        print(f"{key}: {value}")
+    if len(best) == 0:
+        print("the current plan of the model is the best")
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        with open(os.path.join(args.output, "plan.json"), "w") as plan_file:
+            json.dump(best, plan_file, indent=2)
+        optimizer.get_history().to_csv(os.path.join(args.output, "history.csv"), index=False)
+    return 0
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m simulator", description="Traffic simulator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    _add_run_parser(subparsers)
+    _add_replicate_parser(subparsers)
+    _add_sweep_parser(subparsers)
+    _add_optimize_parser(subparsers)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import pandas as pd
+from time import time
+
+from .simulator import Simulator
+from .runner import run_steps
+
+
+def generate_grid_model(size: int, d: float = 100, spawn_freq: float = .2, border: bool = False) -> dict:
+    # square grid of junctions connected with two-way, two-lane roads;
+    #   the corners are terminal junctions with car spawners,
+    #   so the demand stays the same regardless of the size of the grid
+    #   (all the junctions on the border if ``border`` is set, for many cars at once)
+    junctions = []
+    roads = []
+    spawners = []
+    corners = [0, size - 1, size * (size - 1), size * size - 1]
+    if border:
+        corners = [i * size + j for i in range(size) for j in range(size) if i in (0, size - 1) or j in (0, size - 1)]
+    for i in range(size):
+        for j in range(size):
+            junctions.append({
+                "id": i * size + j,
+                "x": 50 + j * d,
+                "y": 50 + i * d,
+                "terminal": i * size + j in corners,
+            })
+    for i in range(size):
+        for j in range(size):
+            for (di, dj) in ((0, 1), (1, 0)):
+                if i + di >= size or j + dj >= size:
+                    continue
+                a, b = i * size + j, (i + di) * size + j + dj
+                for (src, tgt) in ((a, b), (b, a)):
+                    roads.append({
+                        "id": len(roads),
+                        "source": src,
+                        "target": tgt,
+                        "v_avg": 14,
+                        "v_std": 1,
+                        "lanes": 2,
+                        "is_sidewalk": False,
+                    })
+    for c in corners:
+        spawners.append({
+            "junction": c,
+            "spawns_pedestrians": False,
+            "spawn_freq": spawn_freq,
+            "spawn_freq_std": 0,
+            "random_delay_on_start": False,
+        })
+    return {
+        "width": 100 + (size - 1) * d,
+        "height": 100 + (size - 1) * d,
+        "junctions": junctions,
+        "roads": roads,
+        "lights": [],
+        "spawners": spawners,
+        "cars": [],
+        "pedestrians": [],
+    }
+
+
+def load_simulator(
+        model: dict | str,
+        engine: Simulator.EngineEnum = Simulator.EngineEnum.OBJECTS,
+        seed: int = 0
+) -> Simulator:
+    if isinstance(model, str):
+        return Simulator(model, engine=engine, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, "model.json")
+        with open(model_path, "w") as model_file:
+            json.dump(model, model_file)
+        return Simulator(model_path, engine=engine, seed=seed)
+
+
+def get_model_path() -> str:
+    return os.path.join(os.path.dirname(__file__), "..", "..", "assets", "model.json")
+
+
+def compare_engines():
+
+    # comparing the engines on the same scenarios (and seed): the steps are measured
+    #   after a warm-up, so the network is filled with cars
+
+    scenarios = [
+        ("assets/model.json", get_model_path(), 0, 800),
+        ("grid 12x12", generate_grid_model(12), 600, 200),
+        ("grid 12x12, border", generate_grid_model(12, spawn_freq=.1, border=True), 300, 200),
+    ]
+    print(f"{'scenario':>20} {'engine':>14} {'steps/s':>10} {'cars avg':>10} {'speedup':>8}")
+    for name, model, warm_up, steps in scenarios:
+        steps_per_s = {}
+        for engine in Simulator.EngineEnum:
+            sim = load_simulator(model, engine)
+            sim.step(steps=warm_up)
+
+            t_start = time()
+            sim.step(steps=steps)
+            t_end = time()
+
+            cars = sim.get_cars_dataframe()
+            cars_avg = cars[cars["step"] > warm_up].groupby("step")["id"].count().mean()
+            steps_per_s[engine] = steps / (t_end - t_start)
+            speedup = steps_per_s[engine] / steps_per_s[Simulator.EngineEnum.OBJECTS]
+
+            print(f"{name:>20} {engine.name:>14} {steps_per_s[engine]:>10.1f} {cars_avg:>10.1f} {speedup:>8.2f}")
+
+
+def check_engines(seeds: int = 5, rtol: float = .05, atol: float = .01) -> None:
+
+    # the engines implement the same model, so the means of the KPIs over several seeds must agree,
+    #   within the tolerance |a - b| <= rtol * |a| + atol (the random numbers are drawn differently);
+    #   raises if they do not
+
+    kpis = ["cars_finished", "cars_stopped_ratio", "cars_velocity_avg", "cars_count_avg"]
+    scenarios = [
+        ("assets/model.json", get_model_path(), 600),
+        ("grid 12x12, border", generate_grid_model(12, spawn_freq=.1, border=True), 400),
+    ]
+    failed = []
+    print(f"{'scenario':>20} {'kpi':>20} {'OBJECTS':>10} {'VEHICLE_STORE':>14} {'diff [%]':>9}")
+    for name, model, steps in scenarios:
+        means = {}
+        for engine in Simulator.EngineEnum:
+            results = []
+            for seed in range(seeds):
+                sim = load_simulator(model, engine, seed)
+                results.append(run_steps(sim, steps, kpis=kpis)["kpis"])
+                sim.close()
+            means[engine] = pd.DataFrame(results).mean()
+
+        for kpi in kpis:
+            a = means[Simulator.EngineEnum.OBJECTS][kpi]
+            b = means[Simulator.EngineEnum.VEHICLE_STORE][kpi]
+            print(f"{name:>20} {kpi:>20} {a:>10.3f} {b:>14.3f} {(b - a) / a * 100:>9.1f}")
+            if abs(b - a) > rtol * abs(a) + atol:
+                failed.append(f"{kpi} ({name})")
+
+    if len(failed) > 0:
+        raise RuntimeError(f"KPIs of the engines do not agree: {', '.join(failed)}!")
+
+
+def measure_subgraphs(sim: Simulator, repeat: int = 20) -> tuple[float, float]:
+    # time of building the subgraphs of cars and pedestrians (once per topology change now,
+    #   once per entity and step before they were cached) - and of getting the cached ones [us]
+    t_start = time()
+    for _ in range(repeat):
+        sim._build_subgraphs()
+    t_build = (time() - t_start) / repeat * 1e6
+
+    t_start = time()
+    for _ in range(repeat * 1000):
+        sim._get_roads_for_cars_subgraph()
+        sim._get_roads_for_pedestrians_subgraph()
+    t_get = (time() - t_start) / (repeat * 1000) * 1e6
+    return t_build, t_get
+
+
+def main():
+
+    # measuring how the speed of the simulation depends on the size of the road network.
+    #   the demand is constant, but bigger networks mean longer trips, hence more cars at once,
+    #   so the steps/s drop with the size even with the cached subgraphs - it is the time per car
+    #   and step that stays (roughly) flat, as it depends on the number of cars, not of roads.
+    #   building the subgraphs is measured separately: it is the cost every car paid every step
+    #   before they were cached, and it grows with the number of roads.
+
+    steps = 200
+    print(f"{'junctions':>10} {'roads':>8} {'steps/s':>10} {'cars avg':>10} {'us/car-step':>12} "
+          f"{'subgraphs build [us]':>21} {'cached [us]':>12}")
+    for size in (4, 8, 12, 16):
+        model = generate_grid_model(size)
+        sim = load_simulator(model)
+
+        t_start = time()
+        sim.step(steps=steps)
+        t_end = time()
+
+        cars_avg = sim.get_cars_dataframe().groupby("step")["id"].count().mean()
+        t_car_step = (t_end - t_start) / steps / max(cars_avg, 1) * 1e6
+        t_build, t_get = measure_subgraphs(sim)
+
+        print(f"{len(model['junctions']):>10} {len(model['roads']):>8} "
+              f"{steps / (t_end - t_start):>10.1f} {cars_avg:>10.1f} {t_car_step:>12.1f} "
+              f"{t_build:>21.1f} {t_get:>12.2f}")
+
+    print()
+    compare_engines()
+    print()
+    check_engines()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import numpy as np
+from multiprocessing import shared_memory
+
+from .elements.road import Road
+
+
+class CellArena:
+    """
+    Cells of all the roads in a single contiguous int32 array (-1 for a free cell, the id of the entity otherwise).
+
+    The lanes of road ``i`` are the ``lanes * n_cell`` cells starting at ``offset[i]`` (lane by lane),
+    and ``Road.cells`` of the road is a (lanes, n_cell) view into the arena, so the roads are used as before,
+    while questions about the whole network (occupancy, snapshots) are answered with single array operations.
+
+    The arena can be placed in shared memory, so other processes can read the state of the network
+    (see get_layout and attach).
+    """
+
+    def __init__(self, roads: dict[int, Road], shared: bool = False) -> None:
+        self.road_ids: np.ndarray = np.array(sorted(roads.keys()), dtype=np.int64)
+        self.lanes: np.ndarray = np.array([roads[i].lanes for i in self.road_ids], dtype=np.int64)
+        self.n_cell: np.ndarray = np.array([roads[i].n_cell for i in self.road_ids], dtype=np.int64)
+        self.is_pavement: np.ndarray = np.array([roads[i].is_pavement for i in self.road_ids], dtype=bool)
+        self.offset: np.ndarray = np.concatenate([[0], np.cumsum(self.lanes * self.n_cell)])
+
+        self._shared_memory: shared_memory.SharedMemory | None = None
+        size = int(self.offset[-1])
+        if shared:
+            self._shared_memory = shared_memory.SharedMemory(create=True, size=max(1, size) * 4)
+            self.cells: np.ndarray = np.ndarray((size,), dtype=np.int32, buffer=self._shared_memory.buf)
+            self.cells[:] = -1
+        else:
+            self.cells: np.ndarray = np.zeros(size, dtype=np.int32) - 1
+
+        self._index: dict[int, int] = {int(road_id): i for i, road_id in enumerate(self.road_ids)}
+        self._index_roads()
+        self._roads: dict[int, Road] = roads
+        self._bind_roads()
+
+    def _index_roads(self) -> None:
+        # road id - offset and length of its lanes, for looking up many cells at once
+        size = int(self.road_ids.max()) + 1 if len(self.road_ids) > 0 else 0
+        self._road_offset: np.ndarray = np.zeros(size, dtype=np.int64)
+        self._road_n_cell: np.ndarray = np.zeros(size, dtype=np.int64)
+        self._road_offset[self.road_ids] = self.offset[:-1]
+        self._road_n_cell[self.road_ids] = self.n_cell
+
+    def _bind_roads(self) -> None:
+        for road_id, rd in self._roads.items():
+            rd.cells = self.get_road_cells(road_id)
+
+    def get_road_cells(self, road_id: int) -> np.ndarray:
+        i = self._index[road_id]
+        return self.cells[self.offset[i]:self.offset[i + 1]].reshape(self.lanes[i], self.n_cell[i])
+
+    def get_positions(self, road_ids: np.ndarray, lanes: np.ndarray, cells: np.ndarray) -> np.ndarray:
+        """
+        Positions of the given cells (road, lane, cell) in the arena.
+        """
+        return self._road_offset[road_ids] + lanes * self._road_n_cell[road_ids] + cells
+
+    def get_lane_ends(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Position after the last cell of the lane of each of the given positions.
+        """
+        i = np.searchsorted(self.offset, positions, side="right") - 1
+        return positions + self.n_cell[i] - (positions - self.offset[i]) % self.n_cell[i]
+
+    def get_next_occupied(self, positions: np.ndarray, occupied: np.ndarray = None) -> np.ndarray:
+        """
+        Position of the first occupied cell after each of the given ones in the same lane, -1 if there is none
+        (``occupied`` is a mask of the occupied cells, e.g. of an earlier state, the current one by default).
+        """
+        occupied_positions = np.flatnonzero(self.cells != -1 if occupied is None else occupied)
+        i = np.searchsorted(occupied_positions, positions, side="right")
+        next_occupied = np.append(occupied_positions, -1)[i]
+        next_occupied[next_occupied >= self.get_lane_ends(positions)] = -1
+        return next_occupied
+
+    def count_occupied(self, positions: np.ndarray, ends: np.ndarray, occupied: np.ndarray = None) -> np.ndarray:
+        """
+        Number of occupied cells from each of the given positions up to the given end (exclusive), see get_next_occupied.
+        """
+        occupied_positions = np.flatnonzero(self.cells != -1 if occupied is None else occupied)
+        return np.searchsorted(occupied_positions, ends) - np.searchsorted(occupied_positions, positions)
+
+    def clear(self) -> None:
+        self.cells[:] = -1
+        self._rebuild_road_indexes()
+
+    def _rebuild_road_indexes(self) -> None:
+        # the cells were written directly, see Road.rebuild_index
+        for rd in self._roads.values():
+            rd.rebuild_index()
+
+    def snapshot(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Copies the cells of the whole network (into ``out`` if given, e.g. a preallocated buffer).
+        """
+        if out is None:
+            return self.cells.copy()
+        np.copyto(out, self.cells)
+        return out
+
+    def restore(self, snapshot: np.ndarray) -> None:
+        np.copyto(self.cells, snapshot)
+        self._rebuild_road_indexes()
+
+    def get_occupied(self, pavements: bool = None) -> np.ndarray:
+        """
+        Number of occupied cells of every road (in the order of road_ids),
+        of the roads for cars or of the pavements only if ``pavements`` is given.
+        """
+        occupied = np.add.reduceat((self.cells != -1).astype(np.int64), self.offset[:-1]) \
+            if len(self.cells) > 0 \
+            else np.zeros(0, dtype=np.int64)
+        if pavements is None:
+            return occupied
+        return occupied[self.is_pavement == pavements]
+
+    def get_occupancy(self, pavements: bool = None) -> np.ndarray:
+        """
+        Share of occupied cells of every road, see get_occupied.
+        """
+        size = self.lanes * self.n_cell
+        if pavements is not None:
+            size = size[self.is_pavement == pavements]
+        return self.get_occupied(pavements) / size
+
+    # ======================
+    # shared memory
+
+    def get_layout(self) -> dict:
+        """
+        Everything another process needs to attach to the shared arena.
+        """
+        if self._shared_memory is None:
+            raise RuntimeError("Cell arena is not in shared memory!")
+        return {
+            "name": self._shared_memory.name,
+            "road_ids": self.road_ids,
+            "lanes": self.lanes,
+            "n_cell": self.n_cell,
+            "is_pavement": self.is_pavement,
+        }
+
+    @staticmethod
+    def attach(layout: dict) -> CellArena:
+        """
+        Arena backed by the shared memory of an arena created in another process (without any roads).
+        """
+        arena = CellArena.__new__(CellArena)
+        arena.road_ids = layout["road_ids"]
+        arena.lanes = layout["lanes"]
+        arena.n_cell = layout["n_cell"]
+        arena.is_pavement = layout["is_pavement"]
+        arena.offset = np.concatenate([[0], np.cumsum(arena.lanes * arena.n_cell)])
+        arena._shared_memory = shared_memory.SharedMemory(name=layout["name"])
+        arena.cells = np.ndarray((int(arena.offset[-1]),), dtype=np.int32, buffer=arena._shared_memory.buf)
+        arena._index = {int(road_id): i for i, road_id in enumerate(arena.road_ids)}
+        arena._index_roads()
+        arena._roads = {}
+        return arena
+
+    def close(self, unlink: bool = False) -> None:
+        """
+        Moves the cells out of the shared memory and releases it (unlink only in the process that created it).
+        Views of the cells taken before (other than Road.cells) must not be used any more.
+        """
+        if self._shared_memory is None:
+            return
+        self.cells = self.cells.copy()
+        self._bind_roads()
+        self._shared_memory.close()
+        if unlink:
+            self._shared_memory.unlink()
+        self._shared_memory = None
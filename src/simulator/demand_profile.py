@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+class DemandProfile:
+    """
+    Time-varying demand of a spawner: a piecewise-linear factor of its spawn frequency,
+    given by points (time [s], factor), e.g. [[0, .5], [1800, 2], [3600, .5]] for a peak hour.
+    Before the first point the factor of the first point holds, after the last point the factor of the last one.
+
+    Arrivals are generated by time rescaling: arrivals of the spawner at its nominal frequency
+    are generated in operational time u, and mapped to the simulated time t with u = F(t),
+    where F(t) is the integral of the factor from 0 to t.
+    """
+
+    def __init__(self, points: list[tuple[float, float]]) -> None:
+        if len(points) == 0:
+            raise RuntimeError("Demand profile does not have any points!")
+        times = np.array([p[0] for p in points], dtype=float)
+        factors = np.array([p[1] for p in points], dtype=float)
+        if (times < 0).any() or (np.diff(times) <= 0).any():
+            raise RuntimeError("Times of the demand profile must be non-negative and increasing!")
+        if (factors < 0).any():
+            raise RuntimeError("Factors of the demand profile must be non-negative!")
+        if times[0] > 0:
+            times = np.concatenate([[0.], times])
+            factors = np.concatenate([factors[:1], factors])
+
+        self._times: np.ndarray = times  # [s]
+        self._factors: np.ndarray = factors
+        # slope of the factor and the operational time at the start of every segment
+        self._slopes: np.ndarray = np.append(np.diff(factors) / np.diff(times), 0.)
+        self._operational: np.ndarray = np.concatenate([
+            [0.], np.cumsum((factors[1:] + factors[:-1]) / 2 * np.diff(times))
+        ])
+
+    def get_factor(self, t: float | np.ndarray) -> float | np.ndarray:
+        return np.interp(t, self._times, self._factors)
+
+    def to_operational(self, t: float | np.ndarray) -> float | np.ndarray:
+        # F(t)
+        i = np.searchsorted(self._times, t, side="right") - 1
+        tau = t - self._times[i]
+        return self._operational[i] + self._factors[i] * tau + self._slopes[i] * tau ** 2 / 2
+
+    def to_time(self, u: np.ndarray) -> np.ndarray:
+        """
+        Simulated times [s] of the given operational times (inverse of F),
+        inf for the operational times that are never reached (the factor drops to 0 for good).
+        """
+        u = np.asarray(u, dtype=float)
+        # the last segment starting at or before u, so the segments of zero demand (F is flat there) are skipped
+        i = np.searchsorted(self._operational, u, side="right") - 1
+        r = u - self._operational[i]
+        m = self._factors[i]
+        s = self._slopes[i]
+        # the root of s / 2 * tau^2 + m * tau - r = 0, in the form stable for s -> 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tau = 2 * r / (m + np.sqrt(np.maximum(m ** 2 + 2 * s * r, 0)))
+        tau = np.where(r == 0, 0., tau)
+        return np.where(np.isfinite(tau), self._times[i] + tau, np.inf)
@@ -2,6 +2,12 @@ import numpy as np
 
 
 class Car:
+    # no per-instance dict: there are many cars and their instances are recycled (see Simulator._add_car)
+    __slots__ = (
+        "_rng", "id", "rd", "lane", "cell", "profile", "velocity", "target_junction",
+        "_junction_velocity", "_color", "jam_counter",
+    )
+
     def __init__(
             self,
             id: int,
@@ -9,29 +15,43 @@ class Car:
             lane: int,
             cell: int,
             target_junction: int,
-            velocity: float = 0
+            velocity: float = 0,
+            rng: np.random.Generator = None,
+            color: tuple = None
     ):
+        self.reset(id, rw, lane, cell, target_junction, velocity, rng, color)
+
+    def reset(
+            self,
+            id: int,
+            rw: int,
+            lane: int,
+            cell: int,
+            target_junction: int,
+            velocity: float = 0,
+            rng: np.random.Generator = None,
+            color: tuple = None
+    ):
+        # the car's own random stream, used for its profile and decisions (and color, if none is given)
+        self._rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
         self.id: int = id
         self.rd: int = rw
         self.lane: int = lane
         self.cell: int = cell
-        self.profile: float = np.random.random()
+        self.profile: float = self._rng.random()
         self.velocity = velocity  # [m/s]
         self.target_junction: int = target_junction
 
         self._junction_velocity = 5 + self.get_profile_parameter()  # [m/s]
 
-        self._color = self._generate_color()
+        # the simulator hands out colours drawn in blocks (see Simulator._get_color)
+        self._color = color if color is not None else self._generate_color()
 
         self.jam_counter = 0 # [s]
 
     def _generate_color(self):
-        color = np.zeros(3)
-        for i in range(3):
-            c = 50 + np.random.randint(150)
-            color[i] = c
-
-        return tuple(color)
+        return tuple(int(c) for c in 50 + self._rng.integers(150, size=3))
 
     def set_junction_velocity(self):
         self.velocity = self._junction_velocity
@@ -1,6 +1,11 @@
 import numpy as np
 
 class Pedestrian:
+    # no per-instance dict: there are many pedestrians and their instances are recycled
+    __slots__ = (
+        "_rng", "id", "rd", "lane", "cell", "profile", "target_junction", "velocity", "t_walk_lights", "_color",
+    )
+
     def __init__(
             self,
             id: int,
@@ -9,24 +14,38 @@ class Pedestrian:
             cell: int,
             target_junction: int,
             velocity: float = 1.1, # [m/s]
-            t_walk_lights: float = 5 # [s]
+            t_walk_lights: float = 5, # [s]
+            rng: np.random.Generator = None,
+            color: tuple = None
+    ):
+        self.reset(id, rw, lane, cell, target_junction, velocity, t_walk_lights, rng, color)
+
+    def reset(
+            self,
+            id: int,
+            rw: int,
+            lane: int,
+            cell: int,
+            target_junction: int,
+            velocity: float = 1.1, # [m/s]
+            t_walk_lights: float = 5, # [s]
+            rng: np.random.Generator = None,
+            color: tuple = None
     ):
+        # the pedestrian's own random stream, used for its profile and decisions (and color, if none is given)
+        self._rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
         self.id: int = id
         self.rd: int = rw
         self.lane: int = lane
         self.cell: int = cell
-        self.profile: float = np.random.random()
+        self.profile: float = self._rng.random()
         self.target_junction: int = target_junction
         self.velocity = velocity
         self.t_walk_lights: float = t_walk_lights
 
 
-        self._color = self._generate_color()
+        self._color = color if color is not None else self._generate_color()
 
     def _generate_color(self):
-        color = np.zeros(3)
-        for i in range(3):
-            c = 50 + np.random.randint(150)
-            color[i] = c
-
-        return tuple(color)
\ No newline at end of file
+        return tuple(int(c) for c in 50 + self._rng.integers(150, size=3))
@@ -1,4 +1,5 @@
 import numpy as np
+from bisect import bisect_left, bisect_right, insort
 from math import ceil
 from enum import Enum
 
@@ -37,7 +38,10 @@ class Road:
         self.n_cell: int = n_cell
         self.d_cell: float = distance / n_cell
 
-        self.cells: np.ndarray = np.zeros((self.lanes, self.n_cell), dtype=int) - 1
+        self.cells: np.ndarray = np.zeros((self.lanes, self.n_cell), dtype=np.int32) - 1
+        # sorted positions of the occupied cells of every lane, kept up to date by take_cell and free_cell
+        #   (cells must not be written directly, see rebuild_index and invalidate_index)
+        self._occupied: list[list[int]] | None = [[] for _ in range(self.lanes)]
 
     def get_cells(self, lane: int = None) -> np.ndarray:
         if lane is None:
@@ -49,9 +53,48 @@ class Road:
     def get_cell_distance(self):
         return self.d_cell
 
+    def take_cell(self, lane: int, cell: int, id: int) -> None:
+        if self._occupied is not None and self.cells[lane, cell] == -1:
+            insort(self._occupied[lane], cell)
+        self.cells[lane, cell] = id
+
     def free_cell(self, lane: int, cell: int) -> None:
+        if self._occupied is not None and self.cells[lane, cell] != -1:
+            occupied = self._occupied[lane]
+            del occupied[bisect_left(occupied, cell)]
         self.cells[lane, cell] = -1
 
+    def rebuild_index(self) -> None:
+        # after the cells were written directly (e.g. cleared or restored from a snapshot)
+        self._occupied = [np.flatnonzero(self.cells[ln] != -1).tolist() for ln in range(self.lanes)]
+
+    def invalidate_index(self) -> None:
+        # after the cells were written directly, the index is rebuilt when it is needed next time
+        #   (e.g. the cells of many roads are written in every step, but only a few of them are queried)
+        self._occupied = None
+
+    def _get_occupied(self, lane: int) -> list[int]:
+        if self._occupied is None:
+            self.rebuild_index()
+        return self._occupied[lane]
+
+    def get_next_occupied(self, lane: int, cell: int) -> int:
+        # the first occupied cell of the lane after the given one, -1 if there is none
+        occupied = self._get_occupied(lane)
+        i = bisect_right(occupied, cell)
+        return occupied[i] if i < len(occupied) else -1
+
+    def get_previous_occupied(self, lane: int, cell: int) -> int:
+        # the last occupied cell of the lane before the given one, -1 if there is none
+        occupied = self._get_occupied(lane)
+        i = bisect_left(occupied, cell)
+        return occupied[i - 1] if i > 0 else -1
+
+    def has_free_cell(self, lane: int, cell: int = 0) -> bool:
+        # whether any cell of the lane from the given one to the end of the road is free
+        occupied = self._get_occupied(lane)
+        return len(occupied) - bisect_left(occupied, cell) < self.n_cell - cell
+
     def is_type_for_cars(self):
         return not self.is_pavement
 
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import numpy as np
-from queue import Queue
 
-from src.simulator.elements.pedestrian import Pedestrian
-from src.simulator.elements.car import Car
+from ..demand_profile import DemandProfile
 
 
 class Spawner:
+    """
+    Arrivals of the spawner are generated in blocks of ``block_size``, as an array of arrival times
+    consumed with a cursor: the intervals between arrivals are 1 / f, where f is drawn uniformly
+    from [spawn_freq - spawn_freq_std, spawn_freq + spawn_freq_std] for every arrival.
+    With ``random_delay_on_start``, the first interval is shortened to a random part of itself.
+    With a demand profile, the spawn frequency changes over time (see DemandProfile).
+
+    The random numbers of the choices made while spawning (road, lane and destination)
+    are drawn in blocks as well, one row per attempt to spawn.
+    """
+
     def __init__(
             self,
             junction: int,
@@ -15,37 +24,84 @@ class Spawner:
             spawn_freq: float = .5,  # [1/s]
             spawn_freq_std: float = 0,
             random_delay_on_start: bool = True,
+            rng: np.random.Generator = None,
+            demand_profile: DemandProfile = None,
+            block_size: int = 256,
     ):
+        # the spawner's own random streams: of the arrivals and of the choices made while spawning,
+        #   so the arrivals do not depend on how many attempts to spawn were made
+        self._rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+        self._choices_rng: np.random.Generator = self._rng.spawn(1)[0]
+
         self._junction: int = junction
         self._spawns_pedestrians = spawns_pedestrians
         self._spawn_freq: float = spawn_freq
         self._spawn_freq_std: float = spawn_freq_std
+        self._demand_profile: DemandProfile | None = demand_profile
+        self._block_size: int = block_size
 
-        self._queue: int = 0
+        self._queue: int = 0  # arrivals that have not been spawned yet
+        self._time: float = 0  # [s]
 
-        self._counter_max: int = 0
-        self._counter: float = \
-            - int(np.random.random() * self._calculate_counter_max()) \
-                if random_delay_on_start \
-                else 0
-        self._reset_counter()
+        # arrivals: times of the current block [s], the next arrival and the operational time of the last one
+        self._arrivals: np.ndarray = np.zeros(0)
+        self._cursor: int = 0
+        self._last_arrival: float = 0
+        # part of the first interval after which the first arrival comes; the interval is shortened
+        #   (not the arrival time moved back), so no arrival comes before the start
+        self._first_interval_part: float = self._rng.random() if random_delay_on_start else 1
 
-    def _reset_counter(self):
-        self._counter = 0
-        self._counter_max = self._calculate_counter_max()
+        # random numbers of the choices made while spawning
+        self._choices: np.ndarray = np.zeros((0, 3))
+        self._choices_cursor: int = 0
 
-    def _calculate_counter_max(self):
-        return 1 / max(
+    def _draw_intervals(self, n: int) -> np.ndarray:
+        return 1 / np.maximum(
             0.001,
-            self._spawn_freq + np.random.random() * 2 * self._spawn_freq_std - self._spawn_freq_std
+            self._spawn_freq + self._rng.random(n) * 2 * self._spawn_freq_std - self._spawn_freq_std
         )
 
-    def step(self, dt):
-        self._counter += dt
-        if self._counter >= self._counter_max:
-            self._reset_counter()
-            return True
-        return False
+    def _generate_arrivals(self) -> None:
+        intervals = self._draw_intervals(self._block_size)
+        intervals[0] *= self._first_interval_part
+        self._first_interval_part = 1
+        arrivals = self._last_arrival + np.cumsum(intervals)
+        self._last_arrival = arrivals[-1]
+        if self._demand_profile is not None:
+            arrivals = self._demand_profile.to_time(arrivals)
+        self._arrivals = arrivals
+        self._cursor = 0
+
+    def step(self, dt) -> int:
+        """
+        Adds the arrivals of the next dt seconds to the queue and returns their number.
+        """
+        self._time += dt
+        n = 0
+        while True:
+            if self._cursor == len(self._arrivals):
+                self._generate_arrivals()
+            cursor = np.searchsorted(self._arrivals, self._time, side="right")
+            n += int(cursor) - self._cursor
+            self._cursor = int(cursor)
+            if cursor < len(self._arrivals):
+                break
+        self._queue += n
+        return n
+
+    def get_choices(self) -> tuple[float, float, float]:
+        """
+        Random numbers in [0, 1) of the next attempt to spawn: for the road, the lane and the destination.
+        """
+        if self._choices_cursor == len(self._choices):
+            self._choices = self._choices_rng.random((self._block_size, 3))
+            self._choices_cursor = 0
+        choices = self._choices[self._choices_cursor]
+        self._choices_cursor += 1
+        return choices[0], choices[1], choices[2]
+
+    def get_rng(self) -> np.random.Generator:
+        return self._rng
 
     def add_to_queue(self):
         self._queue += 1
@@ -59,8 +115,11 @@ class Spawner:
             return True
         return False
 
+    def get_queue_length(self) -> int:
+        return self._queue
+
     def is_for_pedesrians(self):
         return self._spawns_pedestrians
 
     def is_for_cars(self):
-        return not self._spawns_pedestrians
\ No newline at end of file
+        return not self._spawns_pedestrians
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class FrameBuffer:
+    """
+    Snapshots of the state of the simulation shown by a plotter (frames) in shared memory,
+    written by the simulation and read by a plotter running in another process.
+
+    A frame holds the cells of the whole network (in the order of the cells of CellArena), the colours and
+    the velocities of the entities in them, whether the lights are green (in the order of SignalPlan) and the stats of the simulation.
+
+    The buffer is double: a frame is written into the slot that is not the latest one, which becomes
+    the latest when the frame is complete, so the writer never waits for the reader. Every slot has
+    a sequence number, odd while the slot is being written, so the reader detects and retries a read
+    overlapping a write of the slot (the writer lapped it) instead of showing a torn frame.
+    """
+
+    STATS = ["step", "max_steps", "time_elapsed", "t_gap", "step_time", "n_cars", "n_pedestrians"]
+
+    # control: the latest slot, flags and the sequence numbers of the slots
+    _LATEST = 0
+    _VIEWER_CLOSED = 1  # set by the reader, e.g. the window of the plotter was closed
+    _STOPPED = 2  # set by the writer, the reader should close
+    _SEQUENCE = 3
+    _N_CONTROL = 5
+
+    def __init__(self, n_cells: int, n_lights: int, name: str = None) -> None:
+        self.n_cells: int = n_cells
+        self.n_lights: int = n_lights
+
+        self._fields: list[tuple[str, tuple, np.dtype]] = FrameBuffer._get_fields(n_cells, n_lights)
+        slot_size = sum(self._get_field_size(shape, dtype) for _, shape, dtype in self._fields)
+        size = FrameBuffer._N_CONTROL * 8 + 2 * slot_size
+
+        if name is None:
+            self._shared_memory: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shared_memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name=name)
+
+        buf = self._shared_memory.buf
+        self._control: np.ndarray = np.ndarray((FrameBuffer._N_CONTROL,), dtype=np.int64, buffer=buf)
+        self._slots: list[dict[str, np.ndarray]] = []
+        offset = FrameBuffer._N_CONTROL * 8
+        for _ in range(2):
+            slot = {}
+            for field, shape, dtype in self._fields:
+                slot[field] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+                offset += self._get_field_size(shape, dtype)
+            self._slots.append(slot)
+        if name is None:
+            self._control[:] = 0
+
+        self._last_read: tuple[int, int] = (-1, 0)  # slot and its sequence number
+
+    @staticmethod
+    def _get_fields(n_cells: int, n_lights: int) -> list[tuple[str, tuple, np.dtype]]:
+        # the arrays of a frame
+        return [
+            ("stats", (len(FrameBuffer.STATS),), np.dtype(np.float64)),
+            ("cells", (n_cells,), np.dtype(np.int32)),
+            ("colors", (n_cells, 3), np.dtype(np.uint8)),
+            ("velocity", (n_cells,), np.dtype(np.float32)),
+            ("green", (n_lights,), np.dtype(bool)),
+        ]
+
+    @staticmethod
+    def _get_field_size(shape: tuple, dtype: np.dtype) -> int:
+        # aligned to 8 bytes
+        size = int(np.prod(shape)) * dtype.itemsize
+        return (size + 7) // 8 * 8
+
+    @staticmethod
+    def new_frame(n_cells: int, n_lights: int) -> dict[str, np.ndarray]:
+        """
+        Arrays of a frame outside the shared memory, to be filled and written (or read into).
+        """
+        return {
+            field: np.zeros(shape, dtype=dtype)
+            for field, shape, dtype in FrameBuffer._get_fields(n_cells, n_lights)
+        }
+
+    def write(self, frame: dict[str, np.ndarray]) -> None:
+        slot = 1 - int(self._control[FrameBuffer._LATEST])
+        sequence = FrameBuffer._SEQUENCE + slot
+        self._control[sequence] += 1
+        for field, array in self._slots[slot].items():
+            np.copyto(array, frame[field])
+        self._control[sequence] += 1
+        self._control[FrameBuffer._LATEST] = slot
+
+    def read(self, frame: dict[str, np.ndarray], attempts: int = 3) -> bool:
+        """
+        Copies the latest complete frame into ``frame``.
+        Returns False if there is no frame yet, or no frame newer than the one read last time.
+        """
+        for _ in range(attempts):
+            slot = int(self._control[FrameBuffer._LATEST])
+            sequence = int(self._control[FrameBuffer._SEQUENCE + slot])
+            if sequence == 0 or (slot, sequence) == self._last_read:
+                return False
+            if sequence % 2 == 1:
+                continue
+            for field, array in self._slots[slot].items():
+                np.copyto(frame[field], array)
+            if int(self._control[FrameBuffer._SEQUENCE + slot]) == sequence:
+                self._last_read = (slot, sequence)
+                return True
+        return False
+
+    def set_viewer_closed(self) -> None:
+        self._control[FrameBuffer._VIEWER_CLOSED] = 1
+
+    def is_viewer_closed(self) -> bool:
+        return bool(self._control[FrameBuffer._VIEWER_CLOSED])
+
+    def set_stopped(self) -> None:
+        self._control[FrameBuffer._STOPPED] = 1
+
+    def is_stopped(self) -> bool:
+        return bool(self._control[FrameBuffer._STOPPED])
+
+    # ======================
+    # shared memory
+
+    def get_layout(self) -> dict:
+        """
+        Everything another process needs to attach to the buffer.
+        """
+        return {
+            "name": self._shared_memory.name,
+            "n_cells": self.n_cells,
+            "n_lights": self.n_lights,
+        }
+
+    @staticmethod
+    def attach(layout: dict) -> FrameBuffer:
+        return FrameBuffer(layout["n_cells"], layout["n_lights"], name=layout["name"])
+
+    def close(self, unlink: bool = False) -> None:
+        """
+        Releases the shared memory (unlink only in the process that created it).
+        """
+        if self._shared_memory is None:
+            return
+        self._control = None
+        self._slots = []
+        self._shared_memory.close()
+        if unlink:
+            self._shared_memory.unlink()
+        self._shared_memory = None
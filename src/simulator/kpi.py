@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import numpy as np
+from abc import ABC, abstractmethod
+
+from .simulator import Simulator
+
+
+class KPI(ABC):
+    """
+    Key performance indicator of a simulation run, accumulated step by step
+    (so it does not need the recorded dataframes).
+    """
+
+    name: str = ""
+    description: str = ""
+
+    @abstractmethod
+    def update(self, sim: Simulator) -> None:
+        # called after every step of the simulation
+        ...
+
+    @abstractmethod
+    def result(self) -> float:
+        ...
+
+
+class _MeanPerStepKPI(KPI):
+    def __init__(self) -> None:
+        self._sum: float = 0
+        self._n_steps: int = 0
+
+    @abstractmethod
+    def _value(self, sim: Simulator) -> float:
+        ...
+
+    def update(self, sim: Simulator) -> None:
+        self._sum += self._value(sim)
+        self._n_steps += 1
+
+    def result(self) -> float:
+        return self._sum / self._n_steps if self._n_steps > 0 else 0.
+
+
+class CarsStoppedAvg(_MeanPerStepKPI):
+    name = "cars_stopped_avg"
+    description = "average number of stopped cars (velocity 0)"
+
+    def _value(self, sim: Simulator) -> float:
+        return np.count_nonzero(sim.get_cars_velocities() == 0)
+
+
+class CarsCountAvg(_MeanPerStepKPI):
+    name = "cars_count_avg"
+    description = "average number of cars in the simulation"
+
+    def _value(self, sim: Simulator) -> float:
+        return len(sim.cars)
+
+
+class PedestriansCountAvg(_MeanPerStepKPI):
+    name = "pedestrians_count_avg"
+    description = "average number of pedestrians in the simulation"
+
+    def _value(self, sim: Simulator) -> float:
+        return len(sim.pedestrians)
+
+
+class CarsVelocityAvg(_MeanPerStepKPI):
+    name = "cars_velocity_avg"
+    description = "average velocity of cars [m/s]"
+
+    def _value(self, sim: Simulator) -> float:
+        velocities = sim.get_cars_velocities()
+        return velocities.mean() if len(velocities) > 0 else 0.
+
+
+class CarsStoppedRatio(KPI):
+    name = "cars_stopped_ratio"
+    description = "average number of stopped cars divided by the average number of cars (see main.py)"
+
+    def __init__(self) -> None:
+        self._stopped = CarsStoppedAvg()
+        self._count = CarsCountAvg()
+
+    def update(self, sim: Simulator) -> None:
+        self._stopped.update(sim)
+        self._count.update(sim)
+
+    def result(self) -> float:
+        count = self._count.result()
+        return self._stopped.result() / count if count > 0 else 0.
+
+
+class RoadsOccupancyAvg(_MeanPerStepKPI):
+    name = "roads_occupancy_avg"
+    description = "average share of occupied cells of the roads for cars"
+
+    def _value(self, sim: Simulator) -> float:
+        arena = sim.get_cell_arena()
+        cells = arena.lanes * arena.n_cell
+        is_road = ~arena.is_pavement
+        return arena.get_occupied(pavements=False).sum() / cells[is_road].sum() if is_road.any() else 0.
+
+
+class CarsDelay(KPI):
+    name = "cars_delay"
+    description = "total time spent by cars standing still [s]"
+
+    def __init__(self) -> None:
+        self._delay: float = 0
+
+    def update(self, sim: Simulator) -> None:
+        self._delay += np.count_nonzero(sim.get_cars_velocities() == 0) * sim.get_step_time()
+
+    def result(self) -> float:
+        return self._delay
+
+
+class CarsFinished(KPI):
+    name = "cars_finished"
+    description = "number of cars that reached their destination"
+
+    def __init__(self) -> None:
+        self._finished: int = 0
+
+    def update(self, sim: Simulator) -> None:
+        self._finished = sim.get_cars_finished()
+
+    def result(self) -> float:
+        return self._finished
+
+
+KPIS: dict[str, type[KPI]] = {
+    kpi.name: kpi
+    for kpi in (
+        CarsStoppedAvg,
+        CarsCountAvg,
+        CarsStoppedRatio,
+        CarsVelocityAvg,
+        CarsDelay,
+        CarsFinished,
+        PedestriansCountAvg,
+        RoadsOccupancyAvg,
+    )
+}
+
+DEFAULT_KPIS: list[str] = [
+    CarsStoppedAvg.name,
+    CarsCountAvg.name,
+    CarsStoppedRatio.name,
+]
+
+
+def create_kpis(names: list[str]) -> list[KPI]:
+    for name in names:
+        if name not in KPIS.keys():
+            raise RuntimeError(f"KPI {name} does not exist! Available KPIs: {', '.join(KPIS.keys())}")
+    return [KPIS[name]() for name in names]
@@ -0,0 +1,99 @@
+import numpy as np
+import networkx as nx
+
+from .elements.road import Road
+from .road_index import RoadIndex
+
+
+class LaneTable:
+    """
+    Lane preferences of cars compiled from the static geometry of the car layer.
+
+    For every incoming road and every junction that can be reached right after it,
+    the table stores the lanes a car should use before the junction (rightmost first).
+    For every pair of consecutive roads, it stores the lanes of the outgoing road
+    that each lane of the incoming road leads to.
+    """
+
+    def __init__(self, graph: nx.DiGraph, road_index: RoadIndex) -> None:
+        self._preferred_lanes: dict[tuple[int, int], np.ndarray] = {}  # (road in, next junction) - lanes
+        self._next_lanes: dict[tuple[int, int], list[np.ndarray]] = {}  # (road in, road out) - lane - lanes
+        # (road in, next junction) - lowest and highest (exclusive) preferred lane,
+        #   (road in, its own target) - all the lanes, for the last road of a path
+        bounds: dict[tuple[int, int], tuple[int, int]] = {}
+
+        for source, junction_id, data in graph.edges.data():
+            rd_in: Road = data['road']
+            if not rd_in.is_type_for_cars():
+                continue
+            bounds[rd_in.id, junction_id] = (0, rd_in.lanes)
+
+            edges_out = [
+                road_index.get_endpoints(rd_id)
+                for rd_id in road_index.get_outgoing(junction_id)
+            ]
+            if len(edges_out) == 0:
+                continue
+
+            node = graph.nodes[junction_id]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                diff = np.arctan(np.divide(
+                    node['y'] - graph.nodes[source]['y'],
+                    node['x'] - graph.nodes[source]['x'],
+                ))
+
+                edges_out_d = [  # calculate tan
+                    (np.arctan(np.divide(
+                        graph.nodes[e[1]]['y'] - node['y'],
+                        graph.nodes[e[1]]['x'] - node['x']
+                    )) - diff,
+                     e[2], e[1])
+                    for e in edges_out
+                ]
+            edges_out_d = sorted(edges_out_d, key=lambda x: x[0])
+
+            n_lanes = rd_in.lanes
+            n_roads_out = len(edges_out_d)
+            for road_id, (_, rd_out, next_junction_id) in enumerate(edges_out_d):
+                l_bound = int(np.floor(road_id / n_roads_out * n_lanes))
+                u_bound = int(np.ceil((road_id + 1) / n_roads_out * n_lanes))
+                # reverse order
+                self._preferred_lanes[rd_in.id, next_junction_id] = np.arange(n_lanes)[l_bound:u_bound][::-1]
+                bounds[rd_in.id, next_junction_id] = (l_bound, min(u_bound, n_lanes))
+
+                n_lanes_out = rd_out.lanes
+                self._next_lanes[rd_in.id, rd_out.id] = [
+                    np.arange(n_lanes_out)[
+                        int(np.floor(lane_id / n_lanes * n_lanes_out)):
+                        int(np.ceil((lane_id + 1) / n_lanes * n_lanes_out))
+                    ]
+                    for lane_id in range(n_lanes)
+                ]
+
+        # the bounds as arrays sorted by their keys (road in * number of junctions + next junction),
+        #   for looking up many cars at once
+        self._n_junctions: int = max(graph.nodes, default=-1) + 1
+        keys = sorted(bounds.keys())
+        self._bounds_keys: np.ndarray = np.array([r * self._n_junctions + j for r, j in keys], dtype=np.int64)
+        self._bounds: np.ndarray = np.array([bounds[k] for k in keys], dtype=np.int64).reshape(-1, 2)
+
+    def get_preferred_lanes(self, rd_in_id: int, next_junction_id: int) -> np.ndarray:
+        return self._preferred_lanes[rd_in_id, next_junction_id]
+
+    def get_preferred_bounds(self, rd_in_ids: np.ndarray, next_junction_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Preferred lanes of many cars at once, as the lowest and the highest (exclusive) lane
+        (the preferred lanes are always adjacent). The next junction of a car on the last road of its path
+        is the target of the road, all its lanes are preferred then.
+        """
+        keys = rd_in_ids * self._n_junctions + next_junction_ids
+        i = np.minimum(np.searchsorted(self._bounds_keys, keys), len(self._bounds_keys) - 1)
+        unknown = self._bounds_keys[i] != keys
+        if np.any(unknown):
+            k = int(np.argmax(unknown))
+            raise RuntimeError(f"Junction {int(next_junction_ids[k])} can not be reached "
+                               f"right after road {int(rd_in_ids[k])}!")
+        return self._bounds[i, 0], self._bounds[i, 1]
+
+    def get_next_lanes(self, rd_in_id: int, rd_out_id: int, lane: int) -> np.ndarray:
+        return self._next_lanes[rd_in_id, rd_out_id][lane]
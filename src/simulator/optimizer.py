@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from .simulator import Simulator
+from .kpi import KPIS
+from .sweep import _run_job
+
+
+def get_light_variables(model_path: str) -> list[int]:
+    """
+    Ids of the lights whose timings can be optimized, i.e. the lights that are not
+    complementary to another light (complementary lights follow them).
+    """
+    with open(model_path, "r") as source_file:
+        source = json.load(source_file)
+    return [l["id"] for l in source["lights"] if "complementary_to" not in l]
+
+
+class SignalTimingOptimizer:
+    """
+    Searches the green and red durations of lights minimising (or maximising) a KPI,
+    with successive halving: all candidates are evaluated with short simulations,
+    only the best 1 / eta of them are evaluated again with eta times longer simulations,
+    and so on, until a single candidate is left or the simulations reach max_steps.
+
+    Candidates are drawn at random from the given bounds [s] (the current plan of the model
+    is always the first candidate). Every candidate of a rung is evaluated with the same seeds
+    (derived from the seed, the rung and the replication), so the candidates are compared under the same random demand.
+    """
+
+    def __init__(
+            self,
+            model_path: str,
+            kpi: str = "cars_stopped_avg",
+            minimize: bool = True,
+            lights: list[int] = None,
+            green_bounds: tuple[int, int] = (10, 90),
+            red_bounds: tuple[int, int] = (10, 90),
+            n_candidates: int = 27,
+            eta: int = 3,
+            min_steps: int = 400,
+            max_steps: int = 3600,
+            n_replications: int = 2,
+            seed: int = 0,
+            engine: Simulator.EngineEnum = Simulator.EngineEnum.OBJECTS,
+            max_workers: int = None,
+    ) -> None:
+        if kpi not in KPIS.keys():
+            raise RuntimeError(f"KPI {kpi} does not exist! Available KPIs: {', '.join(KPIS.keys())}")
+        if eta < 2:
+            raise RuntimeError("eta must be at least 2!")
+        variables = get_light_variables(model_path)
+        lights = lights if lights is not None else variables
+        for light_id in lights:
+            if light_id not in variables:
+                raise RuntimeError(f"Light {light_id} does not exist or is complementary to another light!")
+
+        self._model_path: str = model_path
+        self._kpi: str = kpi
+        self._minimize: bool = minimize
+        self._lights: list[int] = lights
+        self._green_bounds: tuple[int, int] = green_bounds
+        self._red_bounds: tuple[int, int] = red_bounds
+        self._n_candidates: int = n_candidates
+        self._eta: int = eta
+        self._min_steps: int = min_steps
+        self._max_steps: int = max_steps
+        self._n_replications: int = n_replications
+        self._seed: int = seed
+        self._engine: Simulator.EngineEnum = engine
+        self._max_workers: int = max_workers if max_workers is not None else os.cpu_count()
+
+        self._candidates: list[dict[str, int]] = []
+        self._history: list[dict] = []  # one row per evaluated (rung, candidate)
+        self._steps_simulated: int = 0
+        self._best: int = 0
+
+    def _sample_candidates(self) -> list[dict[str, int]]:
+        rng = np.random.default_rng(self._seed)
+        # durations are whole steps, so the lights toggle exactly at the end of a step
+        candidates = [{}]  # the current plan of the model
+        for _ in range(self._n_candidates - 1):
+            candidate = {}
+            for light_id in self._lights:
+                candidate[f"lights.{light_id}.duration_green"] = int(rng.integers(*self._green_bounds, endpoint=True))
+                candidate[f"lights.{light_id}.duration_red"] = int(rng.integers(*self._red_bounds, endpoint=True))
+            candidates.append(candidate)
+        return candidates
+
+    def _evaluate(self, executor: ProcessPoolExecutor | None, candidate_ids: list[int], steps: int,
+                  rung: int) -> dict[int, float]:
+        jobs = [
+            (candidate_id, self._candidates[candidate_id], self._model_path, steps,
+             i, np.random.SeedSequence(self._seed, spawn_key=(rung, i)), [self._kpi], self._engine)
+            for i in range(self._n_replications)
+            for candidate_id in candidate_ids
+        ]
+        results = executor.map(_run_job, jobs) if executor is not None else map(_run_job, jobs)
+        values: dict[int, list[float]] = {candidate_id: [] for candidate_id in candidate_ids}
+        for result in results:
+            values[result["config"]].append(result["kpis"][self._kpi])
+            self._steps_simulated += result["steps"]
+        return {candidate_id: float(np.mean(v)) for candidate_id, v in values.items()}
+
+    def run(self) -> dict[str, int]:
+        """
+        Returns the overrides of the best plan found (see apply_overrides).
+        """
+        self._candidates = self._sample_candidates()
+        self._history = []
+        self._steps_simulated = 0
+
+        executor = ProcessPoolExecutor(max_workers=self._max_workers) if self._max_workers > 1 else None
+        try:
+            candidate_ids = list(range(len(self._candidates)))
+            steps = self._min_steps
+            rung = 0
+            while True:
+                steps = min(steps, self._max_steps)
+                values = self._evaluate(executor, candidate_ids, steps, rung)
+                for candidate_id, value in values.items():
+                    self._history.append({"rung": rung, "steps": steps, "candidate": candidate_id, self._kpi: value})
+
+                ranked = sorted(candidate_ids, key=lambda c: values[c], reverse=not self._minimize)
+                if len(ranked) == 1 or steps >= self._max_steps:
+                    candidate_ids = ranked[:1]
+                    break
+                candidate_ids = ranked[:max(1, len(ranked) // self._eta)]
+                steps *= self._eta
+                rung += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self._best = candidate_ids[0]
+        return self.get_best()
+
+    def get_best(self) -> dict[str, int]:
+        return dict(self._candidates[self._best])
+
+    def get_best_value(self) -> float:
+        # value of the KPI in the last rung the best candidate was evaluated in
+        return [h[self._kpi] for h in self._history if h["candidate"] == self._best][-1]
+
+    def get_steps_simulated(self) -> int:
+        return self._steps_simulated
+
+    def get_history(self) -> pd.DataFrame:
+        """
+        Value of the KPI of every candidate in every rung it was evaluated in,
+        together with its light timings.
+        """
+        history = pd.DataFrame(self._history)
+        candidates = pd.DataFrame(self._candidates, index=pd.RangeIndex(len(self._candidates), name="candidate"))
+        return history.join(candidates, on="candidate")
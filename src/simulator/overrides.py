@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import copy
+import itertools
+import numbers
+
+
+# entity type - key of the entity in the model - parameters that can be overridden
+OVERRIDABLE: dict[str, tuple[str, tuple[str, ...]]] = {
+    "lights": ("id", ("duration_green", "duration_red", "state")),
+    "spawners": ("junction", ("spawn_freq", "spawn_freq_std", "random_delay_on_start", "demand_profile")),
+    "roads": ("id", ("v_avg", "v_std")),
+}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _is_demand_profile(value) -> bool:
+    return isinstance(value, (list, tuple)) \
+        and len(value) > 0 \
+        and all(isinstance(p, (list, tuple)) and len(p) == 2 and all(_is_number(x) for x in p) for p in value)
+
+
+# parameter - whether a value of the parameter is valid, and what is expected
+VALUE_CHECKS: dict[str, tuple[callable, str]] = {
+    "duration_green": (_is_number, "a number"),
+    "duration_red": (_is_number, "a number"),
+    "state": (lambda value: value in ("red", "green"), "red or green"),
+    "spawn_freq": (_is_number, "a number"),
+    "spawn_freq_std": (_is_number, "a number"),
+    "random_delay_on_start": (lambda value: isinstance(value, bool), "true or false"),
+    "demand_profile": (_is_demand_profile, "a list of [time, factor] points"),
+    "v_avg": (_is_number, "a number"),
+    "v_std": (_is_number, "a number"),
+}
+
+
+def parse_key(key: str) -> tuple[str, int, str]:
+    """
+    Splits an override key, e.g. "lights.3.duration_green", into (entity type, id, parameter).
+    """
+    parts = key.split(".")
+    if len(parts) != 3:
+        raise RuntimeError(f"Override {key} is not of the form <type>.<id>.<parameter>!")
+    entity_type, entity_id, parameter = parts
+    if entity_type not in OVERRIDABLE.keys():
+        raise RuntimeError(f"Override {key}: {entity_type} can not be overridden! "
+                           f"Available: {', '.join(OVERRIDABLE.keys())}")
+    if parameter not in OVERRIDABLE[entity_type][1]:
+        raise RuntimeError(f"Override {key}: {parameter} of {entity_type} can not be overridden! "
+                           f"Available: {', '.join(OVERRIDABLE[entity_type][1])}")
+    try:
+        entity_id = int(entity_id)
+    except ValueError:
+        raise RuntimeError(f"Override {key}: {entity_id} is not an id!")
+    return entity_type, entity_id, parameter
+
+
+def check_override(key: str, value) -> tuple[str, int, str]:
+    """
+    Checks the key (see parse_key) and the type of the value of an override,
+    e.g. "false" (a string) is not a value of spawners.0.random_delay_on_start.
+    """
+    entity_type, entity_id, parameter = parse_key(key)
+    is_valid, expected = VALUE_CHECKS[parameter]
+    if not is_valid(value):
+        raise RuntimeError(f"Override {key}: {value!r} is not a valid value, expected {expected}!")
+    return entity_type, entity_id, parameter
+
+
+def apply_overrides(source: dict, overrides: dict[str, float | str]) -> dict:
+    """
+    Returns a copy of the parsed model with the given parameters replaced.
+    The source itself is not modified.
+
+    Overrides map keys of the form <type>.<id>.<parameter> to values, e.g.
+    {"lights.3.duration_green": 40, "spawners.12.spawn_freq": .3, "roads.7.v_avg": 10}.
+    Lights complementary to other lights follow them, so they can not be overridden directly.
+    """
+    source = dict(source)
+    copied: set[str] = set()
+    for key, value in overrides.items():
+        entity_type, entity_id, parameter = check_override(key, value)
+        if entity_type not in copied:
+            # only the overridden lists are copied
+            source[entity_type] = copy.deepcopy(source[entity_type])
+            copied.add(entity_type)
+
+        id_key = OVERRIDABLE[entity_type][0]
+        entities = [e for e in source[entity_type] if e[id_key] == entity_id]
+        if len(entities) == 0:
+            raise RuntimeError(f"Override {key}: {entity_type} {entity_id} does not exist!")
+        entity = entities[0]
+        if entity_type == "lights" and "complementary_to" in entity:
+            raise RuntimeError(f"Override {key}: light {entity_id} is complementary to "
+                               f"{entity['complementary_to']}, override {entity['complementary_to']} instead!")
+        entity[parameter] = value
+    return source
+
+
+def expand_grid(grid: dict[str, list]) -> list[dict[str, float | str]]:
+    """
+    All combinations of the given values, e.g.
+    {"lights.0.duration_green": [30, 60], "lights.0.duration_red": [30, 60]} gives 4 configurations.
+    """
+    for key, values in grid.items():
+        for value in values:
+            check_override(key, value)
+    keys = list(grid.keys())
+    return [
+        dict(zip(keys, values))
+        for values in itertools.product(*(grid[key] for key in keys))
+    ]
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import threading
+from time import monotonic
+
+
+class RealTimeScheduler:
+    """
+    Paces steps of the simulation in real time without busy waiting.
+
+    Step n is due at origin + n * t_gap (monotonic clock), so the time spent on the steps
+    themselves and the inaccuracy of sleeping do not accumulate. If the simulation falls behind
+    by more than ``max_lag`` seconds, the schedule starts over from the current time
+    instead of running the missed steps as fast as possible.
+
+    The pace can be changed and waiting can be interrupted from other threads.
+    """
+
+    def __init__(self, t_gap: float = 0, max_lag: float = 1) -> None:
+        self._condition: threading.Condition = threading.Condition()
+        self._t_gap: float = t_gap  # [s]
+        self._max_lag: float = max_lag  # [s]
+        self._origin: float | None = None  # time of the last (re)start of the schedule [s]
+        self._n_steps: int = 0  # steps made since the origin
+        self._stopped: bool = False
+
+    def get_t_gap(self) -> float:
+        return self._t_gap
+
+    def set_t_gap(self, t_gap: float) -> None:
+        with self._condition:
+            if t_gap == self._t_gap:
+                return
+            if self._origin is not None:
+                # the new pace starts from the time the last step was due
+                self._origin = self._origin + self._n_steps * self._t_gap
+                self._n_steps = 0
+            self._t_gap = t_gap
+            self._condition.notify_all()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def resume(self) -> None:
+        with self._condition:
+            self._stopped = False
+
+    def is_stopped(self) -> bool:
+        return self._stopped
+
+    def wait(self) -> bool:
+        """
+        Waits until the next step is due. Returns False if it was interrupted by stop().
+        """
+        with self._condition:
+            while not self._stopped:
+                if self._t_gap <= 0:
+                    self._origin = None
+                    self._n_steps = 0
+                    return True
+                now = monotonic()
+                if self._origin is None:
+                    # the first step is due after t_gap
+                    self._origin = now - self._n_steps * self._t_gap
+                elif now - (self._due() + self._t_gap) > self._max_lag:
+                    # the next step is due now
+                    self._origin = now - (self._n_steps + 1) * self._t_gap
+                remaining = self._due() + self._t_gap - now
+                if remaining <= 0:
+                    self._n_steps += 1
+                    return True
+                # woken up early by stop() or by a change of the pace
+                self._condition.wait(remaining)
+            return False
+
+    def _due(self) -> float:
+        # time the last step was due
+        return self._origin + self._n_steps * self._t_gap
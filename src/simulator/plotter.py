@@ -3,10 +3,14 @@ from __future__ import annotations
 import numpy as np
 import pygame as pg
 import threading
+import warnings
+import multiprocessing
+from collections import OrderedDict
 from enum import Enum
 
-from src.simulator.simulator import Simulator
-from src.simulator.elements.road import Road
+from .simulator import Simulator
+from .frame_buffer import FrameBuffer
+from .elements.road import Road
 
 
 class Plotter:
@@ -15,29 +19,73 @@ class Plotter:
         YES = 1
         YES_WITH_LABELS = 2
 
+    class DetailEnum(Enum):
+        AUTO = 0  # cells, or density when zoomed out so far that the cells would overlap
+        CELLS = 1  # every car and pedestrian
+        DENSITY = 2  # every road as one line coloured by the share of occupied cells
+        SPEED = 3  # every road as one line coloured by the mean speed relative to the average speed of the road
+
     def __init__(
             self,
             simulator: Simulator,
             background_img: str = None,
             plot_graph_on_start: PlotGraphEnum = PlotGraphEnum.NO,
+            detail_on_start: DetailEnum = DetailEnum.AUTO,
             bg_opacity_on_start: float = .7,
             scale_on_start: float = 1,
-            print_controls=True
+            print_controls=True,
+            fps: float = 60,
+            frame_buffer: FrameBuffer = None,
     ) -> None:
         self._simulator: simulator = simulator
         self._thread: threading.Thread | None = None
+        self._fps: float = fps  # cap of the frame rate (0 - no cap)
+
+        # state of the simulation shown: read from the frame buffer if given (the simulation runs
+        #   in another process and the simulator only provides the network), captured from the simulator otherwise
+        self._frame_buffer: FrameBuffer | None = frame_buffer
+        n_cells = len(self._simulator.get_cell_arena().cells)
+        n_lights = len(self._simulator.get_signal_plan())
+        if frame_buffer is not None and (frame_buffer.n_cells != n_cells or frame_buffer.n_lights != n_lights):
+            raise RuntimeError("Frame buffer does not match the network!")
+        self._frame: dict[str, np.ndarray] = FrameBuffer.new_frame(n_cells, n_lights)
 
         (width, height) = (1920, 1080)
         root = pg.display.set_mode((width, height))  # , pg.FULLSCREEN)
         pg.display.set_caption('Traffic Simulator')
         root.fill((50, 50, 50))
         self._root: pg.Surface = root
-        self._surface: pg.Surface = pg.Surface((
+        # everything is drawn straight into the window, transformed from the coordinates of the map surface
+        #   (the rescaled model) by the view, see _get_view
+        self._surface_size: tuple[float, float] = (
             self.rescale(self._simulator.w),
             self.rescale(self._simulator.h)
-        ))
+        )
 
         self._background_img = background_img
+        # the background scaled to the surface (loaded once), the static layer (background, opacity overlay,
+        #   nodes and inactive cells) and the labels of the roads drawn over the dynamic content;
+        #   the layers are drawn at the zoom of the view and cover the window with a margin (a tile of the surface),
+        #   and are rebuilt only when the key (opacity, graph visibility, zoom, level of detail) changes
+        #   or the view is moved out of the tile
+        self._background: pg.Surface | None = None
+        self._static_layer: pg.Surface | None = None
+        self._labels_layer: pg.Surface | None = None
+        self._static_layer_key: tuple | None = None
+        self._static_layer_rect: pg.Rect | None = None  # the tile, in the coordinates of the surface
+
+        # positions (in the coordinates of the surface) of every cell of the network, in the order
+        #   of the cells of the simulator's cell arena, of every light and of every road, see _build_geometry
+        self._cell_pos: np.ndarray = np.zeros((0, 2))
+        self._cell_is_pavement: np.ndarray = np.zeros(0, dtype=bool)
+        self._lights_index: np.ndarray = np.zeros(0, dtype=np.int64)  # index in the signal plan
+        self._lights_pos: np.ndarray = np.zeros((0, 2))
+        self._lights_r: np.ndarray = np.zeros(0)
+        self._roads_line: np.ndarray = np.zeros((0, 4))  # start and end, in the order of the roads of the arena
+        self._roads_lanes: np.ndarray = np.zeros(0, dtype=np.int64)
+        self._roads_v_avg: np.ndarray = np.zeros(0)  # [m/s]
+        self._roads_offset: np.ndarray = np.zeros(0, dtype=np.int64)  # first cell of every road
+        self._build_geometry()
 
         self._d_x = 0
         self._d_y = 0
@@ -46,8 +94,16 @@ class Plotter:
         self._scale = min(max(scale_on_start, self._scale_min), self._scale_max)
 
         self._plot_graph: Plotter.PlotGraphEnum = plot_graph_on_start
+        self._detail: Plotter.DetailEnum = detail_on_start
         self._bg_opacity = max(0., min(bg_opacity_on_start, 1.))
 
+        # fonts by size, rendered texts by (text, font size, colour) (least recently used first)
+        #   and the controls panel, which never changes
+        self._fonts: dict[int, pg.font.Font] = {}
+        self._texts: OrderedDict[tuple[str, int, tuple], pg.Surface] = OrderedDict()
+        self._texts_capacity: int = 2048
+        self._controls_panel: pg.Surface | None = None
+
         self._running = False
 
         if print_controls:
@@ -64,9 +120,12 @@ class Plotter:
     def _run(self) -> None:
         pg.font.init()
         pg.font.SysFont('Arial', 32)
+        clock = pg.time.Clock()
 
         self._running = True
         while self._running:
+            if self._frame_buffer is not None and self._frame_buffer.is_stopped():
+                break
             for event in pg.event.get():
                 if (event.type == pg.QUIT
                         or (event.type == pg.KEYDOWN
@@ -78,6 +137,8 @@ class Plotter:
                     break
                 if event.type == pg.KEYDOWN and event.key == pg.K_g:
                     self._plot_graph = Plotter.PlotGraphEnum((self._plot_graph.value + 1) % 3)
+                if event.type == pg.KEYDOWN and event.key == pg.K_l:
+                    self._detail = Plotter.DetailEnum((self._detail.value + 1) % len(Plotter.DetailEnum))
             if not self._running:
                 break
             pressed_keys = pg.key.get_pressed()
@@ -109,263 +170,405 @@ class Plotter:
                 self._bg_opacity = max(self._bg_opacity - .1, 0)
 
             self._draw()
-        self._simulator.stop()
+            clock.tick(self._fps)
+        if self._frame_buffer is not None:
+            self._frame_buffer.set_viewer_closed()
+        else:
+            self._simulator.stop()
+
+    def _get_view(self) -> tuple[float, float, float]:
+        """
+        Zoom (pixels of the window per pixel of the surface) and the position of the surface in the window.
+        """
+        w, h = self._surface_size
+        init_scale_x = self._root.get_width() / w
+        init_scale_y = self._root.get_height() / h
+        init_scale = min(init_scale_x, init_scale_y)
+
+        init_pos_x = (self._root.get_width() - w) / 2
+        init_pos_y = (self._root.get_height() - h) / 2
+
+        k = self._scale * init_scale
+        d_x = (w - int(w * k)) // 2
+        d_y = (h - int(h * k)) // 2
+        return k, init_pos_x + self._d_x + d_x, init_pos_y + self._d_y + d_y
+
+    def _get_detail(self, k: float) -> DetailEnum:
+        if self._detail != Plotter.DetailEnum.AUTO:
+            return self._detail
+        # the cells of the cars would be closer than a few pixels
+        if self.rescale(Road.d_cell_avg_cars) * k < self._LOD_CELL_SPACING:
+            return Plotter.DetailEnum.DENSITY
+        return Plotter.DetailEnum.CELLS
 
     def _draw(self):
 
-        # plot background
+        # plot background and static graph
 
         self._root.fill((50, 50, 50))
 
-        if self._background_img is not None:
+        k, x, y = self._get_view()
+        detail = self._get_detail(k)
+        self._update_static_layer(k, x, y, detail)
+        if self._static_layer is not None:
+            layer_pos = (x + self._static_layer_rect.x * k, y + self._static_layer_rect.y * k)
+            self._root.blit(self._static_layer, layer_pos)
+
+        # plot lights, cars and pedestrians
+
+        self._update_frame()
+        if detail == Plotter.DetailEnum.CELLS:
+            self._plot_edges_state(k, x, y)
+        else:
+            self._plot_edges_density(k, x, y, speed=detail == Plotter.DetailEnum.SPEED)
+
+        if self._plot_graph == Plotter.PlotGraphEnum.YES_WITH_LABELS and self._labels_layer is not None:
+            self._root.blit(self._labels_layer, layer_pos)
+
+        mouse_x, mouse_y = pg.mouse.get_pos()
+        mouse_x = (mouse_x - x) / int(self._surface_size[0] * k) * self._simulator.w
+        mouse_y = (mouse_y - y) / int(self._surface_size[1] * k) * self._simulator.h
+
+        self._plot_controls()
+
+        self._plot_stats(mouse_pos=(mouse_x, mouse_y))
+
+        pg.display.update()
+
+    def _get_background(self) -> pg.Surface | None:
+        if self._background is None and self._background_img is not None:
             try:
                 bg_img = pg.image.load(self._background_img)
-                bg_img = pg.transform.scale(bg_img, (
+                self._background = pg.transform.scale(bg_img, (
                     self.rescale(self._simulator.w),
                     self.rescale(self._simulator.h)
-                ))
-                self._surface.blit(bg_img, (0, 0))
+                )).convert()
             except Exception as e:
                 print("Error loading background image: " + str(e))
                 self._background_img = None
-        if self._background_img is None:
-            self._surface.fill(pg.Color('black'))
-
-        s = pg.Surface((
-            self.rescale(self._simulator.w),
-            self.rescale(self._simulator.h)
-        ))
+        return self._background
+
+    def _get_visible_rect(self, k: float, x: float, y: float, margin: float = 0) -> pg.Rect:
+        # the part of the surface in the window (enlarged by the margin, a share of the window), clipped to the surface
+        w, h = self._root.get_width() / k, self._root.get_height() / k
+        rect = pg.Rect(
+            int(np.floor(-x / k - w * margin)),
+            int(np.floor(-y / k - h * margin)),
+            int(np.ceil(w * (1 + 2 * margin))) + 1,
+            int(np.ceil(h * (1 + 2 * margin))) + 1,
+        )
+        return rect.clip(pg.Rect(0, 0, int(self._surface_size[0]), int(self._surface_size[1])))
+
+    def _update_static_layer(self, k: float, x: float, y: float, detail: DetailEnum) -> None:
+        key = (self._bg_opacity, self._plot_graph, k, detail != Plotter.DetailEnum.CELLS)
+        visible = self._get_visible_rect(k, x, y)
+        if key == self._static_layer_key \
+                and self._static_layer_rect is not None \
+                and self._static_layer_rect.contains(visible):
+            return
+        self._static_layer_key = key
+        self._static_layer_rect = self._get_visible_rect(k, x, y, margin=self._STATIC_LAYER_MARGIN)
+        rect = self._static_layer_rect
+        if rect.width == 0 or rect.height == 0:
+            # the surface is out of the window
+            self._static_layer = None
+            self._labels_layer = None
+            return
+
+        size = (int(np.ceil(rect.width * k)), int(np.ceil(rect.height * k)))
+        layer = pg.Surface(size).convert()
+        self._static_layer = layer
+
+        bg_img = self._get_background()
+        if bg_img is not None:
+            layer.blit(pg.transform.scale(bg_img.subsurface(rect), size), (0, 0))
+        else:
+            layer.fill(pg.Color('black'))
+
+        s = pg.Surface(size)
         s.set_alpha(int(self._bg_opacity * 255))  # alpha level
         s.fill(pg.Color('white'))  # this fills the entire surface
-        self._surface.blit(s, (0, 0))  # (0,0) are the top-left coordinates
-
-        # plot all shit
+        layer.blit(s, (0, 0))  # (0,0) are the top-left coordinates
 
         if self._plot_graph.value > Plotter.PlotGraphEnum.NO.value:
             self._plot_nodes(
+                layer,
+                k,
                 plot_indicators=self._plot_graph == Plotter.PlotGraphEnum.YES_WITH_LABELS
             )
+            if detail == Plotter.DetailEnum.CELLS:
+                self._plot_edges_static(layer, k)
 
-        self._plot_edges(
-            plot_inactive_cells=self._plot_graph.value > Plotter.PlotGraphEnum.NO.value,
-            plot_indicators=self._plot_graph == Plotter.PlotGraphEnum.YES_WITH_LABELS,
-            inactive_state=-1
-        )
-
-        # plot view
+        self._labels_layer = None
+        if self._plot_graph == Plotter.PlotGraphEnum.YES_WITH_LABELS:
+            self._labels_layer = pg.Surface(size, pg.SRCALPHA).convert_alpha()
+            self._plot_edges_labels(self._labels_layer, k)
 
-        init_scale_x = self._root.get_width() / self._surface.get_width()
-        init_scale_y = self._root.get_height() / self._surface.get_height()
-        init_scale = min(init_scale_x, init_scale_y)
-
-        init_pos_x = (self._root.get_width() - self._surface.get_width()) / 2
-        init_pos_y = (self._root.get_height() - self._surface.get_height()) / 2
-
-        old_w = self._surface.get_width()
-        old_h = self._surface.get_height()
-        scale = self._scale
-        new_surface = self._surface
-        new_surface = pg.transform.scale(new_surface, (
-            int(old_w * scale * init_scale),
-            int(old_h * scale * init_scale)
-        ))
-
-        d_x = (old_w - new_surface.get_width()) // 2
-        d_y = (old_h - new_surface.get_height()) // 2
-
-        self._root.blit(
-            new_surface,
-            (
-                init_pos_x + self._d_x + d_x,
-                init_pos_y + self._d_y + d_y
-            )
-        )
-
-        x, y = pg.mouse.get_pos()
-        x -= init_pos_x+ self._d_x + d_x
-        y -= init_pos_y+ self._d_y + d_y
-        x = x / new_surface.get_width() * self._simulator.w
-        y = y / new_surface.get_height() * self._simulator.h
-
-        self._plot_controls()
-
-        self._plot_stats(mouse_pos=(x, y))
-
-        pg.display.update()
+    def _to_layer(self, pos: np.ndarray, k: float) -> np.ndarray:
+        # from the coordinates of the surface to the coordinates of the static layer
+        return (pos - (self._static_layer_rect.x, self._static_layer_rect.y)) * k
 
     def _plot_nodes(
             self,
+            surface: pg.Surface,
+            k: float,
             plot_indicators=False,
     ):
+        node_r = 6
+        border_width = 2
+        bounds = surface.get_rect().inflate(self.rescale(node_r) * k * 4, self.rescale(node_r) * k * 4)
         for id, node in self._simulator.graph.nodes.data():
-            node_r = 6
+            pos = self._to_layer(np.array([self.rescale(node['x']), self.rescale(node['y'])]), k)
+            if not bounds.collidepoint(pos[0], pos[1]):
+                continue
             pg.draw.circle(
-                self._surface,
+                surface,
                 pg.Color('gray'),
-                (
-                    self.rescale(node['x']),
-                    self.rescale(node['y'])
-                ),
-                self.rescale(node_r),
+                pos,
+                self.rescale(node_r) * k,
             )
-            border_width = 2
             if id in self._simulator.spawners.keys():
                 additional_bw = border_width if id in self._simulator.terminal_junctions else 0
                 pg.draw.circle(
-                    self._surface,
+                    surface,
                     pg.Color('red'),
-                    (
-                        self.rescale(node['x']),
-                        self.rescale(node['y'])
-                    ),
-                    self.rescale(node_r + additional_bw),
-                    int(self.rescale(border_width + additional_bw)),
+                    pos,
+                    self.rescale(node_r + additional_bw) * k,
+                    max(1, int(self.rescale(border_width + additional_bw) * k)),
                 )
             if id in self._simulator.terminal_junctions:
                 pg.draw.circle(
-                    self._surface,
+                    surface,
                     pg.Color('black'),
-                    (
-                        self.rescale(node['x']),
-                        self.rescale(node['y'])
-                    ),
-                    self.rescale(node_r),
-                    int(self.rescale(border_width)),
+                    pos,
+                    self.rescale(node_r) * k,
+                    max(1, int(self.rescale(border_width) * k)),
                 )
             if plot_indicators:
                 self.__blit_text(
                     str(id),
-                    (
-                        self.rescale(node['x']),
-                        self.rescale(node['y'])
-                    ),
-                    font_size=12,
+                    pos,
+                    font_size=max(1, round(12 * k)),
                     center_x=True,
                     center_y=True,
                     color=pg.Color('white'),
-                    surface=self._surface,
+                    surface=surface,
                 )
 
-    def _plot_edges(
-            self,
-            plot_inactive_cells=False,
-            plot_indicators=False,
-            inactive_state=-1
-    ):
-
-        for source, target, data in self._simulator.graph.edges.data():
-            start_point = self._simulator.graph.nodes[source]
-            start_point = np.array([start_point['x'], start_point['y']])
-            end_point = self._simulator.graph.nodes[target]
-            end_point = np.array([end_point['x'], end_point['y']])
-
-            rd: Road = data['road']
-            lights = self._simulator.lights[rd.traffic_light_at_end] \
-                if rd.traffic_light_at_end != -1 \
-                else None
-
-            lines = rd.lanes
-
-            is_pavement = rd.is_type_for_pedestrians()
-
-            deg = np.arctan2(
-                end_point[1] - start_point[1],
-                end_point[0] - start_point[0]
-            ) # radians
-            # deg = np.arctan2(
-            #     end_point['y'] - start_point['y'],
-            #     end_point['x'] - start_point['x']
-            # ) # radians
-
-            line_padding = 6
-            opposite_line_padding = line_padding * 2
-            cell_r = 2.5
-            node_r = 6
-            for line_index in range(lines):
-                # if lane in oposite direction exists:
-
-                d_left = (line_index - (lines - 1) / 2) * line_padding
-
-                if self._simulator.graph.has_edge(target, source):
-                    d_left += opposite_line_padding // 2
+    # ======================
+    # roads
+
+    _LINE_PADDING = 6
+    _CELL_R = 2.5
+    _NODE_R = 6
+    _LOD_CELL_SPACING = 3  # [px] the least distance of the cells of the cars in the window drawn with DetailEnum.AUTO
+    _STATIC_LAYER_MARGIN = .25  # margin of the static layer around the window, a share of its size
+
+    def _get_edge_geometry(self, source: int, target: int, rd: Road):
+        """
+        Start and end points of the lanes of the road and the points of its lights (None if there are no lights).
+        """
+        start_point = self._simulator.graph.nodes[source]
+        start_point = np.array([start_point['x'], start_point['y']])
+        end_point = self._simulator.graph.nodes[target]
+        end_point = np.array([end_point['x'], end_point['y']])
+
+        has_lights = rd.traffic_light_at_end != -1
+        is_pavement = rd.is_type_for_pedestrians()
+
+        deg = np.arctan2(
+            end_point[1] - start_point[1],
+            end_point[0] - start_point[0]
+        ) # radians
+
+        opposite_line_padding = self._LINE_PADDING * 2
+        cell_r = self._CELL_R
+        node_r = self._NODE_R
+        lanes = []
+        for line_index in range(rd.lanes):
+            # if lane in oposite direction exists:
+
+            d_left = (line_index - (rd.lanes - 1) / 2) * self._LINE_PADDING
+
+            if self._simulator.graph.has_edge(target, source):
+                d_left += opposite_line_padding // 2
+
+            d_start = self._calculate_line_shift(
+                deg,
+                -node_r / 2 if not is_pavement else 0,
+                d_left
+            )
+            d_end = self._calculate_line_shift(
+                deg,
+                -node_r - cell_r * 2 if has_lights else (
+                    -node_r if not is_pavement else 0
+                ),
+                d_left
+            )
+            start = (
+                self.rescale(start_point[0] + d_start[0]),
+                self.rescale(start_point[1] + d_start[1])
+            )
+            end = (
+                self.rescale(end_point[0] + d_end[0]),
+                self.rescale(end_point[1] + d_end[1])
+            )
 
-                d_start = self._calculate_line_shift(
-                    deg,
-                    -node_r / 2 if not is_pavement else 0,
-                    d_left
-                )
-                d_end = self._calculate_line_shift(
+            lights_pos = None
+            if has_lights and (line_index == 0 or not is_pavement):
+                d_end_lights = self._calculate_line_shift(
                     deg,
-                    -node_r - cell_r * 2 if lights is not None else (
-                        -node_r if not is_pavement else 0
-                    ),
+                    -node_r,
                     d_left
                 )
-                start = (
-                    self.rescale(start_point[0] + d_start[0]),
-                    self.rescale(start_point[1] + d_start[1])
-                )
-                end = (
-                    self.rescale(end_point[0] + d_end[0]),
-                    self.rescale(end_point[1] + d_end[1])
+                lights_pos = (
+                    self.rescale(end_point[0] + d_end_lights[0]),
+                    self.rescale(end_point[1] + d_end_lights[1])
                 )
+            lanes.append((start, end, lights_pos))
+        return lanes
+
+    def _build_geometry(self) -> None:
+        arena = self._simulator.get_cell_arena()
+        road_index = {int(road_id): i for i, road_id in enumerate(arena.road_ids)}
+        cell_r = self._CELL_R
+
+        self._cell_pos = np.zeros((len(arena.cells), 2))
+        self._cell_is_pavement = np.repeat(arena.is_pavement, arena.lanes * arena.n_cell)
+        self._roads_line = np.zeros((len(arena.road_ids), 4))
+        self._roads_lanes = arena.lanes.copy()
+        self._roads_v_avg = np.zeros(len(arena.road_ids))
+        self._roads_offset = arena.offset[:-1].copy()
+        lights_index, lights_pos, lights_r = [], [], []
+        for source, target, data in self._simulator.graph.edges.data():
+            rd: Road = data['road']
+            i = road_index[rd.id]
+            offset = arena.offset[i]
+            steps = (np.arange(rd.n_cell) + 1) / rd.n_cell
+            lanes = self._get_edge_geometry(source, target, rd)
+            for line_index, (start, end, light_pos) in enumerate(lanes):
+                lane_offset = offset + line_index * rd.n_cell
+                pos = self._cell_pos[lane_offset:lane_offset + rd.n_cell]
+                pos[:, 0] = start[0] + (end[0] - start[0]) * steps + cell_r / 2
+                pos[:, 1] = start[1] + (end[1] - start[1]) * steps + cell_r / 2
+
+                if light_pos is not None:
+                    light_r = cell_r + 1
+                    if rd.is_type_for_pedestrians():
+                        light_r -= .5
+                    lights_index.append(self._simulator.get_signal_plan().get_index(rd.traffic_light_at_end))
+                    lights_pos.append(light_pos)
+                    lights_r.append(self.rescale(light_r))
+
+            # the middle of the lanes
+            self._roads_line[i] = np.mean([[*start, *end] for start, end, _ in lanes], axis=0)
+            self._roads_v_avg[i] = rd.v_avg
+
+        self._lights_index = np.array(lights_index, dtype=np.int64)
+        self._lights_pos = np.array(lights_pos, dtype=float).reshape(-1, 2)
+        self._lights_r = np.array(lights_r, dtype=float)
+
+    def _plot_edges_static(self, surface: pg.Surface, k: float):
+        # inactive cells, the occupied ones are drawn over them every frame
+        r = self.rescale(self._CELL_R / 3) * k
+        color = pg.Color('black')
+        pos = self._to_layer(self._cell_pos, k)
+        w, h = surface.get_size()
+        visible = (pos[:, 0] >= -r) & (pos[:, 0] < w + r) & (pos[:, 1] >= -r) & (pos[:, 1] < h + r)
+        for p in pos[visible].tolist():
+            if r < 1.5:
+                # a circle this small would be drawn as a cross
+                surface.set_at((int(p[0]), int(p[1])), color)
+            else:
+                pg.draw.circle(surface, color, p, r)
+
+    def _plot_edges_labels(self, surface: pg.Surface, k: float):
+        font_size = max(1, round(12 * k))
+        for source, target, data in self._simulator.graph.edges.data():
+            rd: Road = data['road']
+            start_point = self._simulator.graph.nodes[source]
+            end_point = self._simulator.graph.nodes[target]
+            x_avg = (start_point['x'] + end_point['x']) / 2
+            y_avg = (start_point['y'] + end_point['y']) / 2
+            self.__blit_text(
+                str(rd.id),
+                self._to_layer(np.array([self.rescale(x_avg), self.rescale(y_avg)]), k),
+                font_size=font_size,
+                center_x=True,
+                center_y=True,
+                color=pg.Color('black'),
+                surface=surface,
+            )
 
-                if lights is not None and (line_index == 0 or not is_pavement):
-                    lights_r = cell_r + 1
-                    if is_pavement:
-                        lights_r -= .5
-                    d_end_lights = self._calculate_line_shift(
-                        deg,
-                        -node_r,
-                        d_left
-                    )
-                    pg.draw.circle(
-                        self._surface,
-                        pg.color.Color('red') if lights.state == lights.state.RED else pg.color.Color('green'),
-                        (
-                            self.rescale(end_point[0] + d_end_lights[0]),
-                            self.rescale(end_point[1] + d_end_lights[1])
-                        ),
-                        self.rescale(lights_r),
-                    )
-
-                for i, cell in enumerate(rd.get_cells(line_index)):
-                    r = cell_r / 3
-                    color = pg.Color('black')
-
-                    if cell != inactive_state:
-                        if rd.is_type_for_cars():
-                            color = self._simulator.cars[cell]._color
-                            r = cell_r
-                        elif rd.is_type_for_pedestrians():
-                            color = self._simulator.pedestrians[cell]._color
-                            r = cell_r *2/3
-                    if cell != inactive_state or plot_inactive_cells:
-                        pg.draw.circle(
-                            self._surface,
-                            color,
-                            (
-                                int(start[0] + (end[0] - start[0]) * (i + 1) / rd.n_cell + cell_r / 2),
-                                int(start[1] + (end[1] - start[1]) * (i + 1) / rd.n_cell + cell_r / 2)
-                            ),
-                            self.rescale(r),
-                        )
-
-            if plot_indicators:
-                x_avg = (start_point[0] + end_point[0]) / 2
-                y_avg = (start_point[1] + end_point[1]) / 2
-                self.__blit_text(
-                    str(rd.id),
-                    (
-                        self.rescale(x_avg),
-                        self.rescale(y_avg)
-                    ),
-                    font_size=12,
-                    center_x=True,
-                    center_y=True,
-                    color=pg.Color('black'),
-                    surface=self._surface,
-                )
+    def _update_frame(self) -> None:
+        if self._frame_buffer is not None:
+            # keeps the last frame if there is no newer one
+            self._frame_buffer.read(self._frame)
+        else:
+            self._simulator.capture_frame(self._frame)
+
+    def _get_in_window(self, pos: np.ndarray, margin: float) -> np.ndarray:
+        w, h = self._root.get_size()
+        return (pos[:, 0] >= -margin) & (pos[:, 0] < w + margin) & (pos[:, 1] >= -margin) & (pos[:, 1] < h + margin)
+
+    def _plot_lights(self, k: float, x: float, y: float):
+        pos = self._lights_pos * k + (x, y)
+        r = self._lights_r * k
+        green = self._frame["green"][self._lights_index]
+        visible = self._get_in_window(pos, r.max(initial=0))
+        for p, light_r, light_green in zip(pos[visible].tolist(), r[visible].tolist(), green[visible].tolist()):
+            pg.draw.circle(self._root, pg.Color('green') if light_green else pg.Color('red'), p, light_r)
+
+    def _plot_edges_state(self, k: float, x: float, y: float):
+        # lights and occupied cells (in the window), the only parts of the roads that change between frames
+        self._plot_lights(k, x, y)
+
+        car_r = self.rescale(self._CELL_R) * k
+        pedestrian_r = self.rescale(self._CELL_R * 2 / 3) * k
+        cells = self._frame["cells"]
+        occupied = np.flatnonzero(cells != -1)
+        pos = self._cell_pos[occupied] * k + (x, y)
+        visible = self._get_in_window(pos, car_r)
+        occupied = occupied[visible]
+        for color, p, is_pavement in zip(
+                self._frame["colors"][occupied].tolist(),
+                pos[visible].tolist(),
+                self._cell_is_pavement[occupied].tolist()
+        ):
+            pg.draw.circle(self._root, color, p, pedestrian_r if is_pavement else car_r)
+
+    def _plot_edges_density(self, k: float, x: float, y: float, speed: bool = False):
+        # every road (in the window) as one line, from green (empty or free flow) to red (full or standing)
+        occupied = self._frame["cells"] != -1
+        n_occupied = np.add.reduceat(occupied.astype(np.int64), self._roads_offset) \
+            if len(occupied) > 0 \
+            else np.zeros(0, dtype=np.int64)
+        if speed:
+            v = np.add.reduceat(np.where(occupied, self._frame["velocity"], 0), self._roads_offset) \
+                if len(occupied) > 0 \
+                else np.zeros(0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                v_ratio = np.where(n_occupied > 0, v / n_occupied / self._roads_v_avg, 1)
+            value = 1 - np.clip(np.nan_to_num(v_ratio, nan=1, posinf=1), 0, 1)
+        else:
+            value = n_occupied / np.diff(np.append(self._roads_offset, len(occupied)))
+        colors = np.zeros((len(value), 3), dtype=np.int64)
+        colors[:, 0] = np.clip(2 * value, 0, 1) * 255
+        colors[:, 1] = np.clip(2 - 2 * value, 0, 1) * 255
+
+        line = self._roads_line * k + (x, y, x, y)
+        widths = np.maximum(1, np.round(self.rescale(self._CELL_R) * self._roads_lanes * k)).astype(np.int64)
+        w, h = self._root.get_size()
+        visible = (np.maximum(line[:, 0], line[:, 2]) >= 0) & (np.minimum(line[:, 0], line[:, 2]) < w) \
+            & (np.maximum(line[:, 1], line[:, 3]) >= 0) & (np.minimum(line[:, 1], line[:, 3]) < h)
+        for (x_0, y_0, x_1, y_1), color, width in zip(
+                line[visible].tolist(),
+                colors[visible].tolist(),
+                widths[visible].tolist()
+        ):
+            pg.draw.line(self._root, color, (x_0, y_0), (x_1, y_1), width)
+
+        self._plot_lights(k, x, y)
 
     def _calculate_line_shift(self, deg, d_up, d_left) -> np.array:
         d_x = d_up * np.cos(deg) + d_left * np.cos(deg + np.pi / 2)
@@ -373,6 +576,11 @@ class Plotter:
         return np.array([d_x, d_y])
 
     def _plot_controls(self):
+        if self._controls_panel is None:
+            self._controls_panel = self._render_controls()
+        self._root.blit(self._controls_panel, (0, 0))
+
+    def _render_controls(self) -> pg.Surface:
         header = "Controls:"
         content = self.get_controls_str().split("\n")
         pad = 10
@@ -397,19 +605,24 @@ class Plotter:
                 font_size=16,
                 surface=surface
             )
-        self._root.blit(surface, (0, 0))
+        return surface
 
     def _plot_stats(self, mouse_pos: tuple[float, float]):
         header = "Stats:"
-        t_s = self._simulator.get_step_time()
-        t = self._simulator.get_time_elapsed()
+        # whole numbers are shown without the decimal point
+        stats = {
+            name: int(value) if float(value).is_integer() else float(value)
+            for name, value in zip(FrameBuffer.STATS, self._frame["stats"])
+        }
+        t_s = stats["step_time"]
+        t = stats["time_elapsed"]
         content = [
-            f"Gap time: {self._simulator.get_t_gap()} [s]",
+            f"Gap time: {stats['t_gap']} [s]",
             f"Step time: {t_s} [s]",
-            f"Step: {self._simulator.get_current_step()} / {self._simulator.get_max_steps()}",
+            f"Step: {stats['step']} / {stats['max_steps']}",
             f"Time elapsed: {t // 60} [min] {t % 60} [s] ({t} [s])",
-            f"Total cars: {len(self._simulator.cars)}",
-            f"Total pedestrians: {len(self._simulator.pedestrians)}",
+            f"Total cars: {stats['n_cars']}",
+            f"Total pedestrians: {stats['n_pedestrians']}",
             f"Mouse position: ({mouse_pos[0]:.0f}, {mouse_pos[1]:.0f}) [m]",
         ]
         pad = 10
@@ -436,6 +649,22 @@ class Plotter:
             )
         self._root.blit(surface, (self._root.get_width() - w, 0))
 
+    def _get_font(self, font_size: int) -> pg.font.Font:
+        if font_size not in self._fonts.keys():
+            self._fonts[font_size] = pg.font.SysFont('Arial', font_size)
+        return self._fonts[font_size]
+
+    def _render_text(self, text: str, font_size: int, color) -> pg.Surface:
+        key = (text, font_size, tuple(pg.Color(color)))
+        if key in self._texts.keys():
+            self._texts.move_to_end(key)
+            return self._texts[key]
+        span = self._get_font(font_size).render(text, True, color)
+        self._texts[key] = span
+        if len(self._texts) > self._texts_capacity:
+            self._texts.popitem(last=False)
+        return span
+
     def __blit_text(
             self,
             text,
@@ -448,8 +677,9 @@ class Plotter:
             center_y=False
     ):
         if font is None:
-            font = pg.font.SysFont('Arial', font_size)
-        span_id = font.render(text, True, color)
+            span_id = self._render_text(text, font_size, color)
+        else:
+            span_id = font.render(text, True, color)
         w, h = span_id.get_width(), span_id.get_height()
         pos_x, pos_y = pos
         if center_x:
@@ -472,5 +702,70 @@ class Plotter:
             " - zoom: z/x",
             " - reset zoom and position: c",
             " - change graph visibility: g",
+            " - change level of detail: l",
             " - change background opacity: o/p"
         ])
+
+
+def _run_plotter_process(source_file_name: str, layout: dict, plotter_kwargs: dict) -> None:
+    # the simulator of the plotter's process only provides the network, it is never stepped
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        simulator = Simulator(source_file_name)
+    frame_buffer = FrameBuffer.attach(layout)
+    try:
+        plotter = Plotter(simulator, frame_buffer=frame_buffer, **plotter_kwargs)
+        plotter._run()
+        del plotter
+    finally:
+        frame_buffer.close()
+        pg.quit()
+
+
+class PlotterProcess:
+    """
+    Plotter running in a separate process, so drawing never competes with the simulation for the GIL.
+
+    The simulation publishes frames into a frame buffer in shared memory (see Simulator.attach_frame_buffer)
+    at most ``fps`` times per second, and the plotter draws the latest one at most ``fps`` times per second.
+    Neither of them waits for the other. The plotter loads the network from the model file of the simulator.
+    Closing the plotter stops the simulation, as with Plotter.
+    """
+
+    def __init__(self, simulator: Simulator, fps: float = 30, **plotter_kwargs) -> None:
+        self._simulator: Simulator = simulator
+        self._fps: float = fps
+        self._plotter_kwargs: dict = plotter_kwargs
+        self._frame_buffer: FrameBuffer | None = None
+        self._process: multiprocessing.Process | None = None
+
+    def run(self) -> None:
+        self._frame_buffer = self._simulator.create_frame_buffer()
+        self._simulator.attach_frame_buffer(self._frame_buffer, fps=self._fps)
+        # spawned, so the process does not inherit the state of the simulation (nor of pygame)
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=_run_plotter_process,
+            args=[
+                self._simulator.get_source_file_name(),
+                self._frame_buffer.get_layout(),
+                dict(self._plotter_kwargs, fps=self._fps),
+            ],
+            daemon=True,
+        )
+        self._process.start()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def stop(self) -> None:
+        """
+        Closes the plotter and releases the frame buffer.
+        """
+        if self._process is None:
+            return
+        self._simulator.detach_frame_buffer()
+        self._frame_buffer.set_stopped()
+        self._process.join()
+        self._process = None
+        self._frame_buffer.close(unlink=True)
+        self._frame_buffer = None
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+
+from .simulator import Simulator
+from .runner import run_simulation
+
+
+def t_critical(df: int, confidence: float = .95) -> float:
+    """
+    Two-sided critical value of the Student's t-distribution
+    (Cornish-Fisher expansion around the normal quantile, accurate enough for df >= 3).
+    """
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    if df <= 0:
+        return float("nan")
+    return (z
+            + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+            + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4))
+
+
+def summarize(results: pd.DataFrame, confidence: float = .95) -> pd.DataFrame:
+    """
+    Mean, standard deviation and confidence interval of the mean of every column
+    (every column is a KPI, every row is a replication).
+    """
+    n = len(results)
+    mean = results.mean()
+    std = results.std(ddof=1)  # NaN for a single replication
+    half_width = t_critical(n - 1, confidence) * std / np.sqrt(n)
+    return pd.DataFrame({
+        "mean": mean,
+        "std": std,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "n": n,
+    })
+
+
+def _run_replication(args: tuple) -> dict:
+    model_path, steps, seed, kpis, engine = args
+    return run_simulation(model_path, steps, seed=seed, kpis=kpis, engine=engine)
+
+
+class ReplicationRunner:
+    """
+    Runs independent replications of a simulation (differing only by their seeds)
+    in a pool of processes and aggregates their KPIs.
+    Workers return only the KPI summaries of their runs.
+    """
+
+    def __init__(
+            self,
+            model_path: str,
+            n_replications: int,
+            steps: int = 3600,
+            base_seed: int = 0,
+            kpis: list[str] = None,
+            engine: Simulator.EngineEnum = Simulator.EngineEnum.OBJECTS,
+            max_workers: int = None,
+    ) -> None:
+        self._model_path: str = model_path
+        self._n_replications: int = n_replications
+        self._steps: int = steps
+        self._base_seed: int = base_seed
+        self._kpis: list[str] | None = kpis
+        self._engine: Simulator.EngineEnum = engine
+        self._max_workers: int = max_workers if max_workers is not None else os.cpu_count()
+
+        self._results: list[dict] = []
+
+    def get_seeds(self) -> list[int]:
+        return [self._base_seed + i for i in range(self._n_replications)]
+
+    def run(self) -> pd.DataFrame:
+        """
+        Returns the KPIs of every replication (one row per replication, indexed by seed).
+        """
+        jobs = [
+            (self._model_path, self._steps, seed, self._kpis, self._engine)
+            for seed in self.get_seeds()
+        ]
+        if self._max_workers <= 1:
+            self._results = [_run_replication(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+                self._results = list(executor.map(_run_replication, jobs))
+        return self.get_results()
+
+    def get_results(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [r["kpis"] for r in self._results],
+            index=pd.Index([r["seed"] for r in self._results], name="seed")
+        )
+
+    def get_summary(self, confidence: float = .95) -> pd.DataFrame:
+        return summarize(self.get_results(), confidence)
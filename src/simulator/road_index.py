@@ -0,0 +1,67 @@
+import numpy as np
+import networkx as nx
+
+from .elements.road import Road
+
+
+class RoadIndex:
+    """
+    Load-time index of the road network: road id - (source, target, road) map
+    and per-junction arrays of outgoing and incoming road ids,
+    separately for the car and the pavement layer.
+
+    Closed roads keep their endpoints, but are left out of the adjacency arrays.
+    """
+
+    def __init__(self, graph: nx.DiGraph, closed_roads: set[int] = None) -> None:
+        closed_roads = closed_roads if closed_roads is not None else set()
+
+        self._endpoints: dict[int, tuple[int, int, Road]] = {}
+
+        out_roads: dict[bool, dict[int, list[int]]] = {False: {}, True: {}}  # is_pavement - junction - roads
+        in_roads: dict[bool, dict[int, list[int]]] = {False: {}, True: {}}
+        for source, target, data in graph.edges.data():
+            rd: Road = data['road']
+            self._endpoints[rd.id] = (source, target, rd)
+            if rd.id in closed_roads:
+                continue
+            out_roads[rd.is_pavement].setdefault(source, []).append(rd.id)
+            in_roads[rd.is_pavement].setdefault(target, []).append(rd.id)
+
+        # road id - target junction, for looking up many roads at once
+        self._targets: np.ndarray = np.zeros(max(self._endpoints.keys(), default=-1) + 1, dtype=int) - 1
+        for rd_id, (_, target, _) in self._endpoints.items():
+            self._targets[rd_id] = target
+
+        empty = np.zeros(0, dtype=int)
+        self._out_roads: dict[bool, dict[int, np.ndarray]] = {
+            is_pavement: {j: np.array(roads[j], dtype=int) if j in roads.keys() else empty
+                          for j in graph.nodes}
+            for is_pavement, roads in out_roads.items()
+        }
+        self._in_roads: dict[bool, dict[int, np.ndarray]] = {
+            is_pavement: {j: np.array(roads[j], dtype=int) if j in roads.keys() else empty
+                          for j in graph.nodes}
+            for is_pavement, roads in in_roads.items()
+        }
+
+    def get_endpoints(self, road_id: int) -> tuple[int, int, Road]:
+        return self._endpoints[road_id]
+
+    def get_source(self, road_id: int) -> int:
+        return self._endpoints[road_id][0]
+
+    def get_target(self, road_id: int) -> int:
+        return self._endpoints[road_id][1]
+
+    def get_targets(self, road_ids: np.ndarray) -> np.ndarray:
+        return self._targets[road_ids]
+
+    def get_road(self, road_id: int) -> Road:
+        return self._endpoints[road_id][2]
+
+    def get_outgoing(self, junction_id: int, pavements: bool = False) -> np.ndarray:
+        return self._out_roads[pavements][junction_id]
+
+    def get_incoming(self, junction_id: int, pavements: bool = False) -> np.ndarray:
+        return self._in_roads[pavements][junction_id]
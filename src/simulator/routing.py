@@ -0,0 +1,100 @@
+import numpy as np
+import networkx as nx
+
+
+class RoutingTable:
+    """
+    Shortest-path (in number of roads) next-hop table of a single layer of the road network.
+
+    The table is a matrix of junction indices: ``next_hop[i, k]`` is the index of
+    the junction that follows junction ``i`` on the shortest path to the ``k``-th target,
+    ``i`` itself if ``i`` is the target, or -1 if the target cannot be reached from ``i``.
+    Columns are computed for the given targets (usually the terminal junctions) when the table is built,
+    and lazily for any other target the first time it is requested.
+    """
+
+    def __init__(self, graph: nx.Graph, targets: list[int] = None) -> None:
+        self._graph: nx.Graph = graph
+        self._nodes: list[int] = list(graph.nodes)
+        self._node_index: dict[int, int] = {n: i for i, n in enumerate(self._nodes)}
+        # the same as arrays, for looking up many junctions at once
+        self._node_ids: np.ndarray = np.array(self._nodes, dtype=np.int64)
+        self._node_positions: np.ndarray = np.zeros(max(self._nodes, default=-1) + 1, dtype=np.int64) - 1
+        self._node_positions[self._node_ids] = np.arange(len(self._nodes))
+        self._target_index: dict[int, int] = {}  # junction id - column
+        self._next_hop: np.ndarray = np.zeros((len(self._nodes), 0), dtype=np.int32)
+
+        if targets is not None:
+            self.add_targets(targets)
+
+    def add_targets(self, targets: list[int]) -> None:
+        targets = [t for t in dict.fromkeys(targets) if t not in self._target_index.keys()]
+        if len(targets) == 0:
+            return
+
+        # BFS from the target over reversed edges gives, for every junction,
+        #   its successor on one of the shortest paths leading to the target
+        reversed_graph = self._graph.reverse(copy=False) if self._graph.is_directed() else self._graph
+        columns = np.zeros((len(self._nodes), len(targets)), dtype=np.int32) - 1
+        for k, target in enumerate(targets):
+            if target not in self._node_index.keys():
+                raise RuntimeError(f"Junction {target} does not exist!")
+            t = self._node_index[target]
+            columns[t, k] = t
+            for node, successor in nx.bfs_predecessors(reversed_graph, target):
+                columns[self._node_index[node], k] = self._node_index[successor]
+            self._target_index[target] = self._next_hop.shape[1] + k
+
+        self._next_hop = np.hstack([self._next_hop, columns])
+
+    def _get_column(self, target: int) -> int:
+        if target not in self._target_index.keys():
+            self.add_targets([target])
+        return self._target_index[target]
+
+    def next_hop(self, source: int, target: int) -> int:
+        """
+        Returns the junction that follows ``source`` on the shortest path to ``target``,
+        ``source`` itself if it is the target, or -1 if the target is unreachable.
+        """
+        i = self._next_hop[self._node_index[source], self._get_column(target)]
+        return self._nodes[i] if i != -1 else -1
+
+    def get_next_hops(self, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        next_hop of many pairs of junctions at once (-1 for the unreachable targets).
+        """
+        unique_targets, inverse = np.unique(targets, return_inverse=True)
+        columns = np.array([self._get_column(int(t)) for t in unique_targets], dtype=np.int64)[inverse]
+        i = self._next_hop[self._node_positions[sources], columns]
+        return np.where(i != -1, self._node_ids[i], -1)
+
+    def get_reachable_targets(self, targets: list[int]) -> dict[int, np.ndarray]:
+        """
+        Returns, for every junction, the given targets that can be reached from it (in the given order).
+        """
+        targets = np.array(targets, dtype=np.int64)
+        reachable = self._next_hop[:, [self._get_column(t) for t in targets]] != -1
+        return {n: targets[reachable[i]] for i, n in enumerate(self._nodes)}
+
+    def has_path(self, source: int, target: int) -> bool:
+        return self._next_hop[self._node_index[source], self._get_column(target)] != -1
+
+    def path(self, source: int, target: int, max_len: int = None) -> list[int]:
+        """
+        Returns the shortest path from ``source`` to ``target`` (both included),
+        truncated to its first ``max_len`` junctions if ``max_len`` is given.
+
+        Raises ``nx.NetworkXNoPath`` if the target is unreachable.
+        """
+        k = self._get_column(target)
+        i = self._node_index[source]
+        t = self._node_index[target]
+        if self._next_hop[i, k] == -1:
+            raise nx.NetworkXNoPath(f"Node {target} not reachable from {source}")
+
+        path = [source]
+        while i != t and (max_len is None or len(path) < max_len):
+            i = self._next_hop[i, k]
+            path.append(self._nodes[i])
+        return path
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from time import time
+
+from .simulator import Simulator
+from .telemetry import TelemetryRecorder
+from .kpi import create_kpis, DEFAULT_KPIS
+
+
+def run_simulation(
+        model_path: str,
+        steps: int,
+        seed: int = None,
+        kpis: list[str] = None,
+        engine: Simulator.EngineEnum = Simulator.EngineEnum.OBJECTS,
+        t_gap: float = 0,
+        telemetry: TelemetryRecorder = None,
+) -> dict:
+    """
+    Runs a single simulation without any visualisation and returns its summary:
+    the KPIs and basic information about the run (JSON-serializable).
+
+    Telemetry is not recorded unless a recorder is given.
+    """
+    if telemetry is None:
+        telemetry = TelemetryRecorder(cars_every=0, lights_every=0)
+
+    sim = Simulator(model_path, engine=engine, telemetry=telemetry, seed=seed)
+    results = run_steps(sim, steps, kpis=kpis, t_gap=t_gap)
+    sim.close()
+    return {"model": model_path, **results}
+
+
+def run_steps(
+        sim: Simulator,
+        steps: int,
+        kpis: list[str] = None,
+        t_gap: float = 0,
+) -> dict:
+    """
+    Runs the given number of steps of an already loaded simulator
+    and returns the summary of the run (see run_simulation).
+    """
+    kpis = create_kpis(kpis if kpis is not None else DEFAULT_KPIS)
+
+    t_start = time()
+    for _ in range(steps):
+        sim.step(t_gap=t_gap)
+        for kpi in kpis:
+            kpi.update(sim)
+    t_end = time()
+
+    s_made = sim.get_current_step()
+    return {
+        "seed": sim.get_seed(),
+        "engine": sim.get_engine().name,
+        "steps": s_made,
+        "time_elapsed_simulated": sim.get_time_elapsed(),  # [s]
+        "time_elapsed_real": t_end - t_start,  # [s]
+        "steps_per_second": s_made / (t_end - t_start) if t_end > t_start else float("inf"),
+        "kpis": {kpi.name: float(kpi.result()) for kpi in kpis},
+    }
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import numpy as np
+
+from .elements.light import Light
+
+
+class SignalPlan:
+    """
+    Fixed-time plan of all the lights compiled into arrays (cycle, offset and red split per light),
+    so the state of every light at any simulated time is computed directly, without stepping.
+
+    A light is red for the first ``duration_red`` seconds of its cycle and green for the rest:
+    with p = (t + offset) mod (duration_red + duration_green), it is green if p >= duration_red.
+    A light that starts green has offset = duration_red.
+
+    Lights complementary to other lights are stored as references to their root light,
+    so they always stay in phase with it (also when its timings are changed).
+    """
+
+    def __init__(self) -> None:
+        self._index: dict[int, int] = {}  # light id - index in the arrays
+        self.ids: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.duration_green: np.ndarray = np.zeros(0)  # [s]
+        self.duration_red: np.ndarray = np.zeros(0)  # [s]
+        self.offset: np.ndarray = np.zeros(0)  # [s]
+        # index of the root light (itself for root lights) and whether the light negates its root
+        self.root: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.negates: np.ndarray = np.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add_light(self, id: int, duration_green: float, duration_red: float, state: Light.State) -> None:
+        self._append(id, len(self.ids), False)
+        self._set_root_timing(len(self.ids) - 1, duration_green, duration_red, state == Light.State.GREEN)
+
+    def add_complementary_light(self, id: int, complementary_to: int, negates: bool) -> None:
+        if complementary_to not in self._index.keys():
+            raise RuntimeError(f"Light {id} is complementary to {complementary_to}, "
+                               f"but {complementary_to} does not exist!")
+        root = self.root[self._index[complementary_to]]
+        self._append(id, root, negates ^ self.negates[self._index[complementary_to]])
+        self._update_dependents(root)
+
+    def _append(self, id: int, root: int, negates: bool) -> None:
+        if id in self._index.keys():
+            raise RuntimeError(f"Light {id} already exists!")
+        self._index[id] = len(self.ids)
+        self.ids = np.append(self.ids, id)
+        self.duration_green = np.append(self.duration_green, 0.)
+        self.duration_red = np.append(self.duration_red, 0.)
+        self.offset = np.append(self.offset, 0.)
+        self.root = np.append(self.root, root)
+        self.negates = np.append(self.negates, negates)
+
+    def _set_root_timing(self, i: int, duration_green: float, duration_red: float, starts_green: bool) -> None:
+        self.duration_green[i] = duration_green
+        self.duration_red[i] = duration_red
+        self.offset[i] = duration_red if starts_green else 0
+        self._update_dependents(i)
+
+    def _update_dependents(self, root: int) -> None:
+        dependents = (self.root == root) & (np.arange(len(self.ids)) != root)
+        negates = dependents & self.negates
+        follows = dependents & ~self.negates
+        dg, dr, offset = self.duration_green[root], self.duration_red[root], self.offset[root]
+        self.duration_green[follows] = dg
+        self.duration_red[follows] = dr
+        self.offset[follows] = offset
+        # red while the root is green and the other way round: the cycle is shifted by the root's red
+        self.duration_green[negates] = dr
+        self.duration_red[negates] = dg
+        self.offset[negates] = (offset + dg) % (dg + dr) if dg + dr > 0 else 0
+
+    def set_timing(self, id: int, duration_green: float, duration_red: float, t: float = 0) -> None:
+        """
+        Changes the durations of a root light (and of the lights complementary to it).
+        The light keeps its state at time t and starts the new cycle from there.
+        """
+        i = self._index[id]
+        if self.root[i] != i:
+            raise RuntimeError(f"Light {id} is complementary to {self.ids[self.root[i]]}, "
+                               f"change {self.ids[self.root[i]]} instead!")
+        green, _ = self.get_state(id, t)
+        self._set_root_timing(i, duration_green, duration_red, green)
+        # the new cycle starts at time t
+        self.offset[i] = (self.offset[i] - t) % (duration_green + duration_red)
+        self._update_dependents(i)
+
+    def get_index(self, id: int) -> int:
+        return self._index[id]
+
+    def get_states(self, t: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        States of all the lights at the simulated time t [s]:
+        whether they are green and the time remaining until they change [s].
+        """
+        cycle = self.duration_green + self.duration_red
+        p = np.mod(t + self.offset, cycle)
+        green = p >= self.duration_red
+        remaining = np.where(green, cycle - p, self.duration_red - p)
+        return green, remaining
+
+    def get_state(self, id: int, t: float) -> tuple[bool, float]:
+        i = self._index[id]
+        cycle = self.duration_green[i] + self.duration_red[i]
+        p = (t + self.offset[i]) % cycle
+        green = p >= self.duration_red[i]
+        return bool(green), float(cycle - p if green else self.duration_red[i] - p)
@@ -1,18 +1,65 @@
 import numpy as np
 import networkx as nx
 import json
-import threading
+import warnings
+from math import ceil
+from time import monotonic
 import pandas as pd
-
-from simulator.elements.pedestrian import Pedestrian
-from src.simulator.elements.spawner import Spawner
-from simulator.elements.car import Car
-from src.simulator.elements.road import Road
-from src.simulator.elements.light import Light
+from enum import Enum
+
+from .elements.pedestrian import Pedestrian
+from .elements.spawner import Spawner
+from .elements.car import Car
+from .elements.road import Road
+from .elements.light import Light
+from .routing import RoutingTable
+from .road_index import RoadIndex
+from .lane_table import LaneTable
+from .vehicle_store import VehicleStore
+from .telemetry import TelemetryRecorder
+from .pacing import RealTimeScheduler
+from .signal_plan import SignalPlan
+from .cell_arena import CellArena
+from .frame_buffer import FrameBuffer
+from .demand_profile import DemandProfile
+from .overrides import apply_overrides
 
 
 class Simulator:
-    def __init__(self, source_file_name: str) -> None:
+    class EngineEnum(Enum):
+        # every car is a separate Car object, stepped one by one
+        OBJECTS = 0
+        # cars are kept in the arrays of a VehicleStore, the cars that are not at the ends of their roads
+        #   are stepped all at once (see _step_cars_vectorised); the same model, its KPIs agree with the ones
+        #   of OBJECTS over several seeds (see benchmark.check_engines), the single runs differ
+        VEHICLE_STORE = 1
+
+    # keys of the independent random streams (see _get_rng)
+    _STREAM_SIMULATOR = 0
+    _STREAM_CARS = 1
+    _STREAM_PEDESTRIANS = 2
+    _STREAM_SPAWNERS = 3
+    _STREAM_VEHICLES = 4
+    _STREAM_COLORS = 5
+
+    # number of colours of spawned entities drawn at once
+    _COLORS_BLOCK_SIZE = 256
+
+    def __init__(
+            self,
+            source_file_name: str,
+            engine: EngineEnum = EngineEnum.OBJECTS,
+            telemetry: TelemetryRecorder = None,
+            seed: int | np.random.SeedSequence = None,
+            shared_cells: bool = False,
+    ) -> None:
+        # every simulator draws only from its own random streams, derived from the seed
+        #   (a random seed is chosen if none is given, see get_seed)
+        self._seed_sequence: np.random.SeedSequence = seed \
+            if isinstance(seed, np.random.SeedSequence) \
+            else np.random.SeedSequence(seed)
+        self._rng: np.random.Generator = self._get_rng(Simulator._STREAM_SIMULATOR)
+
         self.graph: nx.DiGraph = nx.DiGraph()
         self.w = 0  # [m]
         self.h = 0  # [m]
@@ -22,23 +69,84 @@ class Simulator:
         self.spawners: dict[int, Spawner] = {}
         self.terminal_junctions: list[int] = []
         self.lights: dict[int, Light] = {}  # junction - light
+        self._signal_plan: SignalPlan = SignalPlan()  # states of the lights at any time
+        self._source: dict = {}  # parsed model, kept for reset
+
+        self._engine: Simulator.EngineEnum = engine
+        self._vehicles: VehicleStore | None = None
+        self._shared_cells: bool = shared_cells  # whether the cells are in shared memory (see CellArena)
+        self._cells: CellArena | None = None
+
+        # ids of spawned entities grow monotonically, so an id is never reused within a run
+        self._next_car_id: int = 0
+        self._next_pedestrian_id: int = 0
+        # instances of the entities that left the simulation, recycled by the following ones
+        self._cars_pool: list[Car] = []
+        self._pedestrians_pool: list[Pedestrian] = []
+        # colours of the entities, drawn in blocks (of cars and of pedestrians) consumed with a cursor
+        self._colors_rng: dict[bool, np.random.Generator] = {}
+        self._colors: dict[bool, np.ndarray] = {}
+        self._colors_cursor: dict[bool, int] = {}
+
+        # mode-specific views of the graph, rebuilt only when the topology changes
+        self._closed_roads: set[int] = set()
+        self._cars_graph: nx.DiGraph = nx.DiGraph()
+        self._pedestrians_graph: nx.Graph = nx.Graph()
+        self._pedestrians_digraph: nx.DiGraph = nx.DiGraph()
+
+        # road id - endpoints and per-junction adjacency of the car and pavement layers
+        self._road_index: RoadIndex | None = None
+        self._lane_table: LaneTable | None = None
+
+        # next-hop routing tables of the car and pedestrian layers
+        self._cars_routing: RoutingTable | None = None
+        self._pedestrians_routing: RoutingTable | None = None
 
         self._step_time = 1  # [s]
 
+        # entities that can not do anything until some event happens are parked (skipped):
+        #   id - step in which they were parked
+        self._parked_cars: dict[int, int] = {}
+        self._parked_pedestrians: dict[int, int] = {}
+        # cars woken up, but not stepped yet (their skipped steps are caught up first)
+        self._woken_cars: dict[int, int] = {}
+        # events waking the parked entities up:
+        #   step - parked entities (id, step parked) to wake up before it
+        self._cars_timers: dict[int, list[tuple[int, int]]] = {}
+        self._pedestrians_timers: dict[int, list[tuple[int, int]]] = {}
+        #   (road, lane, cell) - parked cars to wake up when the cell is freed
+        self._cell_watchers: dict[tuple[int, int, int], dict[int, int]] = {}
+
         self._is_running = False
+        self._n_cars_finished = 0
+        self._n_pedestrians_finished = 0
         self._current_step = 0
         self._max_steps = 0
-        self._t_gap = 0
+        self._scheduler: RealTimeScheduler = RealTimeScheduler()
+
+        self._telemetry: TelemetryRecorder = telemetry if telemetry is not None else TelemetryRecorder()
 
-        self._cars_df = pd.DataFrame()
-        self._lights_df = pd.DataFrame()
+        # frames for a plotter in another process (see attach_frame_buffer),
+        #   published at most once per frame interval [s] of real time
+        self._frame_buffer: FrameBuffer | None = None
+        self._frame: dict[str, np.ndarray] = {}
+        self._frame_interval: float = 0
+        self._frame_due: float = 0
 
+        self._source_file_name: str = source_file_name
         self.load(source_file_name)
 
     def load(self, source_file_name: str) -> None:
         with open(source_file_name, "r") as source_file:
-            source = json.load(source_file)
+            self._source = json.load(source_file)
+
+        self._load_network(self._source)
+        self._load_state(self._source)
+        self._build_topology()
+        self._check_spawners()
 
+    def _load_network(self, source: dict) -> None:
+        # static part of the model: junctions and roads
         self.w = source["width"]
         self.h = source["height"]
 
@@ -52,6 +160,8 @@ class Simulator:
                 self.terminal_junctions.append(node["id"])
 
         for edge in source["roads"]:
+            if edge["id"] in self.edges_map.keys():
+                raise RuntimeError(f"Road {edge['id']} already exists!")
             node_src = self.graph.nodes[edge["source"]]
             node_tgt = self.graph.nodes[edge["target"]]
             distance = np.sqrt((node_tgt["x"] - node_src["x"]) ** 2 + (node_tgt["y"] - node_src["y"]) ** 2)
@@ -70,6 +180,51 @@ class Simulator:
             )
             self.edges_map[edge["id"]] = rd
 
+        # cells of all the roads in one array, the roads hold views into it
+        self._cells = CellArena(self.edges_map, shared=self._shared_cells)
+
+        # terminal junctions of each layer: the ones with roads (or pavements) of the layer
+        self._cars_terminals: list[int] = [
+            j for j in self.terminal_junctions
+            if any(e[2].is_type_for_cars() for e in self._get_adjacent_edges(j))
+        ]
+        self._pedestrians_terminals: list[int] = [
+            j for j in self.terminal_junctions
+            if any(e[2].is_type_for_pedestrians() for e in self._get_adjacent_edges(j))
+        ]
+
+    def _get_adjacent_edges(self, junction_id: int) -> list[tuple[int, int, Road]]:
+        return list(self.graph.in_edges(junction_id, data="road")) + list(self.graph.out_edges(junction_id, data="road"))
+
+    def _check_spawners(self) -> None:
+        # every road a spawner spawns on must lead to some terminal junction,
+        #   terminals that can not be reached from a spawner are only reported
+        for junction_id, spawner in self.spawners.items():
+            destinations = self._get_destination_index(spawner.is_for_pedesrians())
+            terminals = self._pedestrians_terminals if spawner.is_for_pedesrians() else self._cars_terminals
+            reachable = set()
+            for road_id in self._get_spawn_roads(spawner):
+                start = self._road_index.get_target(road_id)
+                road_destinations = [j for j in destinations[start] if j != junction_id]
+                if len(road_destinations) == 0:
+                    raise RuntimeError(f"Spawner {junction_id}: no terminal junction can be reached "
+                                       f"through road {road_id}!")
+                reachable.update(road_destinations)
+            unreachable = [j for j in terminals if j != junction_id and j not in reachable]
+            if len(unreachable) > 0:
+                warnings.warn(f"Spawner {junction_id}: terminal junctions "
+                              f"{', '.join(str(j) for j in unreachable)} can not be reached!")
+
+    def _load_state(self, source: dict) -> None:
+        # dynamic part of the model: cars, pedestrians, lights and spawners
+        for pedestrians in (False, True):
+            self._colors_rng[pedestrians] = self._get_rng(Simulator._STREAM_COLORS, int(pedestrians))
+            self._colors[pedestrians] = np.zeros((0, 3), dtype=np.uint8)
+            self._colors_cursor[pedestrians] = 0
+
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            self._vehicles = VehicleStore(self.edges_map, rng=self._get_rng(Simulator._STREAM_VEHICLES))
+
         for c in source["cars"]:
             car_id = c["id"]
             if c["road"] not in self.edges_map.keys():
@@ -78,7 +233,7 @@ class Simulator:
             if self.edges_map[c["road"]].is_pavement:
                 raise RuntimeError(f"Car {car_id} is on road {c['road']}, "
                                    f"but {c['road']} is a pavement!")
-            self.cars[car_id] = Car(
+            self._add_car(
                 car_id,
                 c["road"],
                 c["lane"],
@@ -86,7 +241,7 @@ class Simulator:
                 c["target_junction"],
                 c["velocity"]
             )
-            self.edges_map[c["road"]].cells[c["lane"], c["cell"]] = car_id
+            self.edges_map[c["road"]].take_cell(c["lane"], c["cell"], car_id)
 
         for p in source["pedestrians"]:
             ped_id = p["id"]
@@ -96,7 +251,7 @@ class Simulator:
             if not self.edges_map[p["road"]].is_pavement:
                 raise RuntimeError(f"Pedestrian {ped_id} is on road {p['road']}, "
                                    f"but {p['road']} is not a pavement!")
-            self.pedestrians[ped_id] = Pedestrian(
+            self._add_pedestrian(
                 ped_id,
                 p["road"],
                 p["lane"],
@@ -105,8 +260,12 @@ class Simulator:
                 p["velocity"],
                 p["t_walk_lights"]
             )
-            self.edges_map[p["road"]].cells[p["lane"], p["cell"]] = ped_id
+            self.edges_map[p["road"]].take_cell(p["lane"], p["cell"], ped_id)
 
+        self._next_car_id = max(self.cars.keys()) + 1 if len(self.cars) > 0 else 0
+        self._next_pedestrian_id = max(self.pedestrians.keys()) + 1 if len(self.pedestrians) > 0 else 0
+
+        self._signal_plan = SignalPlan()
         for l in source["lights"]:
             state_map = {
                 True: Light.State.GREEN,
@@ -121,11 +280,13 @@ class Simulator:
                 duration_green = other.duration_red if l["negates"] else other.duration_green
                 duration_red = other.duration_green if l["negates"] else other.duration_red
                 state = state_map[negates ^ (other.state == Light.State.GREEN)]
+                self._signal_plan.add_complementary_light(l["id"], l["complementary_to"], negates)
 
             else:
                 duration_green = l["duration_green"]
                 duration_red = l["duration_red"]
                 state = state_map[l["state"] == "green"]
+                self._signal_plan.add_light(l["id"], duration_green, duration_red, state)
 
             self.lights[l["id"]] = Light(
                 l["id"],
@@ -144,33 +305,202 @@ class Simulator:
                 s['spawns_pedestrians'],
                 s['spawn_freq'],
                 s['spawn_freq_std'],
-                s['random_delay_on_start']
+                s['random_delay_on_start'],
+                rng=self._get_rng(Simulator._STREAM_SPAWNERS, s['junction']),
+                demand_profile=DemandProfile(s['demand_profile']) if 'demand_profile' in s else None
             )
 
+    def reset(self, seed: int | np.random.SeedSequence = None, overrides: dict[str, float] = None) -> None:
+        """
+        Restores the initial state of the model, so it can be run again (e.g. with another seed)
+        without parsing the JSON file and building the graph again.
+
+        Overrides change parameters of lights, spawners and roads (see overrides.py),
+        they are applied to the initial state only - the source file is not modified.
+        """
+        source = apply_overrides(self._source, overrides) if overrides else self._source
+
+        self._seed_sequence = seed \
+            if isinstance(seed, np.random.SeedSequence) \
+            else np.random.SeedSequence(seed)
+        self._rng = self._get_rng(Simulator._STREAM_SIMULATOR)
+
+        self._cells.clear()
+        for edge in source["roads"]:
+            rd = self.edges_map[edge["id"]]
+            rd.v_avg = edge["v_avg"]
+            rd.v_std = edge["v_std"]
+            rd.traffic_light_at_end = -1
+
+        if self._engine == Simulator.EngineEnum.OBJECTS:
+            self._cars_pool.extend(self.cars.values())
+        self._pedestrians_pool.extend(self.pedestrians.values())
+        self.cars = {}
+        self.pedestrians = {}
+        self.lights = {}
+        self.spawners = {}
+        self._vehicles = None
+        self._clear_parked()
+
+        self._is_running = False
+        self._n_cars_finished = 0
+        self._n_pedestrians_finished = 0
+        self._current_step = 0
+        self._max_steps = 0
+        self._scheduler = RealTimeScheduler()
+        self._telemetry.clear()
+
+        self._load_state(source)
+        if len(self._closed_roads) > 0:
+            self._closed_roads.clear()
+            self._build_topology()
+
+    def _get_rng(self, stream: int, key: int = 0) -> np.random.Generator:
+        # independent random stream, e.g. of the car with the given id;
+        #   it depends only on the seed, the stream and the key,
+        #   so the same entity gets the same random numbers in different scenarios
+        return np.random.default_rng(np.random.SeedSequence(
+            self._seed_sequence.entropy,
+            spawn_key=self._seed_sequence.spawn_key + (stream, key)
+        ))
+
+    def get_seed(self) -> int:
+        return self._seed_sequence.entropy
+
+    def close_road(self, road_id: int) -> None:
+        """
+        Closes the road for routing. Entities that are already on the road
+        leave it normally, but no new entity will enter it. Entities whose
+        destination becomes unreachable are assigned a new one.
+        """
+        if road_id not in self.edges_map.keys():
+            raise RuntimeError(f"Road {road_id} does not exist!")
+        if road_id in self._closed_roads:
+            return
+        self._closed_roads.add(road_id)
+        self._wake_all()
+        self._build_topology()
+        self._reroute_unreachable()
+
+    def open_road(self, road_id: int) -> None:
+        if road_id not in self.edges_map.keys():
+            raise RuntimeError(f"Road {road_id} does not exist!")
+        if road_id not in self._closed_roads:
+            return
+        self._closed_roads.remove(road_id)
+        self._wake_all()
+        self._build_topology()
+
+    def is_road_closed(self, road_id: int) -> bool:
+        return road_id in self._closed_roads
+
+    def _build_topology(self) -> None:
+        self._road_index = RoadIndex(self.graph, self._closed_roads)
+        self._lane_table = LaneTable(self.graph, self._road_index)
+        self._build_subgraphs()
+        self._build_routing_tables()
+
+    def _build_subgraphs(self) -> None:
+        open_edges = [e for e in self.graph.edges.data() if e[2]['road'].id not in self._closed_roads]
+
+        self._cars_graph = nx.DiGraph()
+        self._cars_graph.add_nodes_from(self.graph.nodes.data())
+        self._cars_graph.add_edges_from([e for e in open_edges if e[2]['road'].is_type_for_cars()])
+
+        pedestrian_edges = [e for e in open_edges if e[2]['road'].is_type_for_pedestrians()]
+        self._pedestrians_graph = nx.Graph()
+        self._pedestrians_graph.add_nodes_from(self.graph.nodes.data())
+        self._pedestrians_graph.add_edges_from(pedestrian_edges)
+        self._pedestrians_digraph = nx.DiGraph()
+        self._pedestrians_digraph.add_nodes_from(self.graph.nodes.data())
+        self._pedestrians_digraph.add_edges_from(pedestrian_edges)
+
+    def _build_routing_tables(self) -> None:
+        self._cars_routing = RoutingTable(
+            self._cars_graph,
+            self._cars_terminals + [car.target_junction for car in self.cars.values()]
+        )
+        self._pedestrians_routing = RoutingTable(
+            self._pedestrians_graph,
+            self._pedestrians_terminals + [ped.target_junction for ped in self.pedestrians.values()]
+        )
+        # junction - terminal junctions of the layer reachable from it
+        self._cars_destinations = self._cars_routing.get_reachable_targets(self._cars_terminals)
+        self._pedestrians_destinations = self._pedestrians_routing.get_reachable_targets(self._pedestrians_terminals)
+
+    def _get_destination_index(self, pedestrians: bool = False) -> dict[int, np.ndarray]:
+        return self._pedestrians_destinations if pedestrians else self._cars_destinations
+
+    def _reroute_unreachable(self) -> None:
+        for entities, routing, destinations, error_msg in (
+                (self.cars.values(), self._cars_routing, self._cars_destinations,
+                 "No destinations for cars!"),
+                (self.pedestrians.values(), self._pedestrians_routing, self._pedestrians_destinations,
+                 "No destinations for pedestrians!"),
+        ):
+            for entity in entities:
+                closest_junction_id = self._road_index.get_target(entity.rd)
+                if routing.has_path(closest_junction_id, entity.target_junction):
+                    continue
+                entity.target_junction = self._get_random_reachable_destination(
+                    destinations[closest_junction_id],
+                    self._rng,
+                    error_msg
+                )
+
+    def _get_random_reachable_destination(
+            self,
+            destinations: np.ndarray,
+            rng: np.random.Generator,
+            error_msg: str = "No destinations for cars!"
+    ) -> int:
+        # destinations are the reachable ones, see _get_destination_index
+        if len(destinations) == 0:
+            raise RuntimeError(error_msg)
+        return int(rng.choice(destinations))
+
+    def _get_reachable_destination(
+            self,
+            destinations: np.ndarray,
+            u: float,
+            error_msg: str = "No destinations for cars!"
+    ) -> int:
+        # the destination given by u in [0, 1) among the reachable ones (all equally likely)
+        if len(destinations) == 0:
+            raise RuntimeError(error_msg)
+        return int(destinations[int(u * len(destinations))])
+
     def stop(self) -> None:
         self._is_running = False
+        self._scheduler.stop()
+
+    def get_cell_arena(self) -> CellArena:
+        return self._cells
+
+    def get_roads_occupancy(self, pavements: bool = False) -> pd.Series:
+        """
+        Share of occupied cells of every road for cars (or of every pavement), indexed by road id.
+        """
+        ids = self._cells.road_ids[self._cells.is_pavement == pavements]
+        return pd.Series(self._cells.get_occupancy(pavements), index=pd.Index(ids, name="road"))
 
     def step(self, steps=1, t_gap=0):
-        # returns (time elapsed, avg cars stopped)
+        # t_gap is the real time between steps [s] (0 - as fast as possible),
+        #   it can be changed while stepping, see set_t_gap and set_real_time_factor
         self._is_running = True
         self._max_steps += steps
-        self._t_gap = t_gap
+        self._scheduler.set_t_gap(t_gap)
+        self._scheduler.resume()
 
         for i in range(steps):
-            self._current_step += 1
-            if t_gap > 0:
-                lock = threading.Lock()
-                lock.acquire()
-                if t_gap > 0:
-                    threading.Timer(t_gap, lock.release).start()
-                try:
-                    while lock.locked():
-                        if not self._is_running:
-                            break
-                except KeyboardInterrupt:
+            try:
+                if not self._scheduler.wait():
                     self._is_running = False
+            except KeyboardInterrupt:
+                self._is_running = False
             if not self._is_running:
                 break
+            self._current_step += 1
             self._step()
 
         self._is_running = False
@@ -178,76 +508,536 @@ class Simulator:
     def _step(self):
         self._step_lights()
 
-        cars_ids_for_removal = []
-        for car in self.cars.values():
-            indicator = self._step_car(car)
-            if indicator == -1:
-                cars_ids_for_removal.append(car.id)
-        for id in cars_ids_for_removal:
-            self.cars.pop(id)
-
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            self._step_cars_vectorised()
+        else:
+            self._wake_due_cars()
+            cars_ids_for_removal = []
+            for car in self.cars.values():
+                if car.id in self._parked_cars:
+                    continue
+                if car.id in self._woken_cars:
+                    self._resume_car(car)
+                indicator = self._step_car(car)
+                if indicator == -1:
+                    cars_ids_for_removal.append(car.id)
+                elif car.velocity == 0:
+                    self._try_park_follower(car)
+            for id in cars_ids_for_removal:
+                self._remove_car(id)
+
+        self._wake_due_pedestrians()
         pedestrians_ids_for_removal = []
         for ped in self.pedestrians.values():
+            if ped.id in self._parked_pedestrians:
+                continue
             indicator = self._step_pedestrian(ped)
             if indicator == -1:
                 pedestrians_ids_for_removal.append(ped.id)
         for id in pedestrians_ids_for_removal:
-            self.pedestrians.pop(id)
+            self._remove_pedestrian(id)
 
         for s in self.spawners.values():
-            if s.step(self._step_time) or not s.is_queue_empty():
+            s.step(self._step_time)
+            # at most one entity per spawner and step, the others wait in the queue
+            if not s.is_queue_empty():
                 if not s.is_for_pedesrians():
                     self._spawn_car(s._junction)
                 else:
                     self._spawn_pedestrian(s._junction)
 
         self._update_cars_dataframe()
+        self._update_pedestrians_dataframe()
         self._update_lights_dataframe()
 
+        self._publish_frame()
+
     def _step_lights(self):
-        for light in self.lights.values():
-            light.step(self._step_time)
+        # the states are given by the signal plan, the lights only mirror them
+        green, remaining = self._signal_plan.get_states(self.get_time_elapsed())
+        for light, is_green, t_remaining in zip(self.lights.values(), green.tolist(), remaining.tolist()):
+            light.state = Light.State.GREEN if is_green else Light.State.RED
+            light.counter = t_remaining
+
+    def _step_cars_vectorised(self):
+        # the cars at the ends of their roads (junctions, lights) are stepped one by one,
+        #   the others at once: they decide about changing lanes, then they move ahead behind the cars ahead
+        #   (see _move_cars_ahead_vectorised); the random numbers of the decisions are drawn for all the slots
+        #   of the store at once. only the cars waiting at the ends of their roads are parked: a car standing
+        #   behind another one must be able to follow it in the step it moves
+        self._wake_due_cars()
+        vs = self._vehicles
+        slots = vs.get_active_slots()
+
+        stepped_cars = []
+        cars_ids_for_removal = []
+        for slot in slots[vs.is_at_road_end(slots)].tolist():
+            car = vs.get_view(slot)
+            if car.id in self._parked_cars:
+                continue
+            if car.id in self._woken_cars:
+                self._resume_car(car)
+            indicator = self._step_car_before_movement(car)
+            if indicator == -1:
+                cars_ids_for_removal.append(car.id)
+            else:
+                stepped_cars.append(car)
+        for id in cars_ids_for_removal:
+            self._remove_car(id)
+
+        slots = vs.get_active_slots()
+        ids = vs.ids[slots]
+        skipped = vs.is_at_road_end(slots) \
+            | np.isin(ids, [car.id for car in stepped_cars]) \
+            | np.isin(ids, np.fromiter(self._parked_cars.keys(), dtype=np.int64, count=len(self._parked_cars)))
+        slots = slots[~skipped]
+        if len(self._woken_cars) > 0:
+            woken = np.fromiter(self._woken_cars.keys(), dtype=np.int64, count=len(self._woken_cars))
+            for id in ids[~skipped][np.isin(ids[~skipped], woken)].tolist():
+                self._resume_car(self.cars[id])
+
+        if len(slots) > 0:
+            random = vs.get_random(5)[slots]
+            moving = self._change_lanes_vectorised(slots, random)
+            self._move_cars_ahead_vectorised(slots[moving], random[moving])
+
+    def _change_lanes_vectorised(self, slots: np.ndarray, random: np.ndarray) -> np.ndarray:
+        # the decisions of _step_car_before_movement for the cars that are not at the ends of their roads,
+        #   made from the cells occupied at the start of the phase; returns which cars still move ahead
+        vs = self._vehicles
+        rd = vs.rd[slots]
+        lane = vs.lane[slots]
+        cell = vs.cell[slots]
+        closest_junction = self._road_index.get_targets(rd)
+
+        # ======================
+        # jam counters of the cars standing still
+
+        standing = vs.velocity[slots] == 0
+        vs.jam_counter[slots[standing]] += self._step_time
+        jammed = standing & (vs.jam_counter[slots] > 60 * (3 + (-1 + 2 * vs.profile[slots])))
+        for slot, junction_id in zip(slots[jammed].tolist(), closest_junction[jammed].tolist()):
+            self._reroute_jammed_car(vs.get_view(slot), junction_id)
+
+        next_junction = self._cars_routing.get_next_hops(closest_junction, vs.target_junction[slots])
+        if np.any(next_junction == -1):
+            k = int(np.argmax(next_junction == -1))
+            raise RuntimeError(f"Path between car {int(vs.ids[slots[k]])} "
+                               f"current position ({int(closest_junction[k])}) "
+                               f"and its destination ({int(vs.target_junction[slots[k]])}) does not exist!")
+
+        # ======================
+        # changing line before junctions
+
+        d_remaining = vs.get_remaining_distance(slots)
+        considering = (d_remaining < 40) & (random[:, 0] > .66) \
+            | (d_remaining < 20) & (random[:, 1] > .33) \
+            | (d_remaining < 10) \
+            | (random[:, 2] > .6)
+        l_low, l_high = self._lane_table.get_preferred_bounds(rd, next_junction)
+        occupied = self._cells.cells != -1
+
+        # ============
+        # if car is not on the desired lane, it changes lane towards it if the desired lane is free,
+        #   continues ahead if there is some space ahead in the desired lane, or stops
+        wrong_lane = np.flatnonzero(considering & ((lane < l_low) | (lane >= l_high)))
+        l_desired = np.where(lane[wrong_lane] >= l_high[wrong_lane], l_high[wrong_lane] - 1, l_low[wrong_lane])
+        l_new = lane[wrong_lane] + np.sign(l_desired - lane[wrong_lane])
+        desired = self._cells.get_positions(rd[wrong_lane], l_desired, cell[wrong_lane])
+        new = self._cells.get_positions(rd[wrong_lane], l_new, cell[wrong_lane])
+        to_desired = ~occupied[desired] & ~occupied[new] & (random[wrong_lane, 3] > .5)
+        desired_ends = self._cells.get_lane_ends(desired)
+        stopping = wrong_lane[~to_desired & (self._cells.count_occupied(desired, desired_ends, occupied) == desired_ends - desired)]
+
+        # ============
+        # if car is on the desired lane, it moves to the adjacent lane on the right if it is desired and free
+        right_lane = np.flatnonzero(considering & (lane >= l_low) & (lane + 1 < l_high))
+        right = self._cells.get_positions(rd[right_lane], lane[right_lane] + 1, cell[right_lane])
+        to_right = ~occupied[right] & (random[right_lane, 3] > .5)
+
+        # two cars changing to the same cell: the first one (by slot) changes
+        changing = np.concatenate([wrong_lane[to_desired], right_lane[to_right]])
+        changing_lanes = np.concatenate([l_new[to_desired], lane[right_lane[to_right]] + 1])
+        _, first = np.unique(np.concatenate([new[to_desired], right[to_right]]), return_index=True)
+        first = np.sort(first)
+        changing = changing[first]
+        self._move_cars_vectorised(slots[changing], changing_lanes[first], cell[changing])
+
+        vs.velocity[slots[stopping]] = 0
+        moving = np.ones(len(slots), dtype=bool)
+        moving[stopping] = False
+        # cars that changed towards the desired lane end their step
+        moving[changing[first < np.count_nonzero(to_desired)]] = False
+        return moving
+
+    def _move_cars_ahead_vectorised(self, slots: np.ndarray, random: np.ndarray) -> None:
+        # the car-following update and the passing of _get_car_movement and _move_car;
+        #   every car follows the car ahead in its lane from where that car has moved in this step,
+        #   as if the cars of a lane were stepped from the front to the back
+        vs = self._vehicles
+        t = self._step_time
+        rd = vs.rd[slots]
+        lane = vs.lane[slots]
+        cell = vs.cell[slots]
+        position = self._cells.get_positions(rd, lane, cell)
+        lane_end = self._cells.get_lane_ends(position)
+        d = vs.get_cell_distance(slots)
+
+        # cars that do not move ahead in this phase, in the cells they are in
+        static = self._cells.cells != -1
+        static[position] = False
+        next_static = self._cells.get_next_occupied(position, static)
+
+        # the moving car right ahead in the same lane (the lanes are contiguous in the arena)
+        order = np.argsort(-position, kind="stable")
+        leader = np.full(len(slots), -1)
+        same_lane = lane_end[order[1:]] == lane_end[order[:-1]]
+        leader[order[1:][same_lane]] = order[:-1][same_lane]
+        follower = np.full(len(slots), -1)
+        follower[leader[leader != -1]] = np.flatnonzero(leader != -1)
+
+        # all the cars are moved as if the cars ahead stood still, then the followers of the cars that moved
+        #   are moved again, until nothing changes (a car of a queue standing still is moved only once)
+        v_desired = np.zeros(len(slots))
+        v = np.zeros(len(slots))
+        d_c = np.zeros(len(slots), dtype=np.int64)
+        next_occupied = np.zeros(len(slots), dtype=np.int64)
+        k = np.arange(len(slots))
+        while len(k) > 0:
+            ahead = next_static[k]
+            has_leader = leader[k] != -1
+            leader_position = position[leader[k[has_leader]]] + d_c[leader[k[has_leader]]]
+            ahead[has_leader] = np.where(
+                ahead[has_leader] == -1, leader_position, np.minimum(ahead[has_leader], leader_position)
+            )
+            next_occupied[k] = ahead
+            has_car_ahead = ahead != -1
+            gap = ahead - position[k] - 1  # free cells ahead
+            v_desired[k], d_c_k = vs.get_movement(slots[k], t, np.where(has_car_ahead, gap * d[k], np.inf))
+
+            # a car can not get past the car ahead: it stops right behind it (see _move_car)
+            blocked = has_car_ahead & (d_c_k > gap)
+            d_c_k[blocked] = gap[blocked]
+            v[k] = np.where(blocked, d_c_k / t, v_desired[k])
+
+            changed = k[d_c_k != d_c[k]]
+            d_c[k] = d_c_k
+            k = follower[changed]
+            k = k[k != -1]
+
+        # ======================
+        # passing other cars
+
+        has_car_ahead = next_occupied != -1
+        future_cell = cell + d_c
+        passing = np.flatnonzero(
+            (lane != 0)
+            & (future_cell < vs.get_road_n_cell(slots) - 3)
+            & has_car_ahead
+            & (next_occupied - position < d_c + 4)
+            & (random[:, 4] > .5)
+        )
+        passing_cars = []
+        for k in passing.tolist():
+            # the car ahead is either a moving one, with its new velocity, or one that does not move ahead
+            if leader[k] != -1 and next_occupied[k] == position[leader[k]] + d_c[leader[k]]:
+                v_other = v[leader[k]]
+            else:
+                v_other = vs.velocity[vs.get_slot(int(self._cells.cells[next_occupied[k]]))]
+            if v_other != 0 and v_desired[k] / v_other >= 1.5:
+                passing_cars.append(k)
+
+        # ======================
+        # update car positions
+
+        vs.velocity[slots] = v
+        moved = d_c > 0
+        self._move_cars_vectorised(slots[moved], lane[moved], future_cell[moved])
+
+        for k in passing_cars:
+            car = vs.get_view(int(slots[k]))
+            x_rd: Road = self.edges_map[car.rd]
+            x_c = car.cell
+            # ... and there is a free lane on the left, change lane and accelerate to pass
+            if np.all(x_rd.cells[car.lane - 1, max(0, x_c - 2):x_c + 1] == -1):
+                self._free_cell(x_rd, car.lane, x_c)
+                self._take_cell(x_rd, car.lane - 1, x_c, car.id)
+                car.lane -= 1
+                car.velocity += 2
+
+    def _move_cars_vectorised(self, slots: np.ndarray, lanes: np.ndarray, cells: np.ndarray) -> None:
+        # moves the cars to the given (free) cells of their roads at once, see _free_cell and _take_cell
+        if len(slots) == 0:
+            return
+        vs = self._vehicles
+        rd = vs.rd[slots]
+        old_lanes = vs.lane[slots]
+        old_cells = vs.cell[slots]
+        old = self._cells.get_positions(rd, old_lanes, old_cells)
+        new = self._cells.get_positions(rd, lanes, cells)
+
+        arena = self._cells.cells
+        arena[old] = -1
+        arena[new] = vs.ids[slots]
+        vs.lane[slots] = lanes
+        vs.cell[slots] = cells
+        for road_id in np.unique(rd).tolist():
+            self.edges_map[road_id].invalidate_index()
+
+        # the cars waiting for the freed cells are woken up
+        if len(self._cell_watchers) > 0:
+            for key in zip(rd.tolist(), old_lanes.tolist(), old_cells.tolist()):
+                watchers = self._cell_watchers.pop(key, None)
+                if watchers is not None:
+                    for id, step_parked in watchers.items():
+                        self._wake_car(id, step_parked)
+
+    def _add_car(
+            self,
+            id: int,
+            rw: int,
+            lane: int,
+            cell: int,
+            target_junction: int,
+            velocity: float = 0
+    ) -> None:
+        rng = self._get_rng(Simulator._STREAM_CARS, id)
+        color = self._get_color()
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            self.cars[id] = self._vehicles.add(id, rw, lane, cell, target_junction, velocity, rng, color)
+        elif len(self._cars_pool) > 0:
+            car = self._cars_pool.pop()
+            car.reset(id, rw, lane, cell, target_junction, velocity, rng, color)
+            self.cars[id] = car
+        else:
+            self.cars[id] = Car(id, rw, lane, cell, target_junction, velocity, rng, color)
+
+    def _remove_car(self, id: int) -> None:
+        self._n_cars_finished += 1
+        car = self.cars.pop(id)
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            self._vehicles.remove(id)
+        else:
+            self._cars_pool.append(car)
+
+    def _add_pedestrian(
+            self,
+            id: int,
+            rw: int,
+            lane: int,
+            cell: int,
+            target_junction: int,
+            velocity: float = 1.1,
+            t_walk_lights: float = 5
+    ) -> None:
+        rng = self._get_rng(Simulator._STREAM_PEDESTRIANS, id)
+        color = self._get_color(pedestrians=True)
+        if len(self._pedestrians_pool) > 0:
+            pedestrian = self._pedestrians_pool.pop()
+            pedestrian.reset(id, rw, lane, cell, target_junction, velocity, t_walk_lights, rng, color)
+            self.pedestrians[id] = pedestrian
+        else:
+            self.pedestrians[id] = Pedestrian(
+                id, rw, lane, cell, target_junction, velocity, t_walk_lights, rng, color
+            )
+
+    def _remove_pedestrian(self, id: int) -> None:
+        self._n_pedestrians_finished += 1
+        self._pedestrians_pool.append(self.pedestrians.pop(id))
+
+    def _get_color(self, pedestrians: bool = False) -> tuple:
+        if self._colors_cursor[pedestrians] == len(self._colors[pedestrians]):
+            self._colors[pedestrians] = (
+                50 + self._colors_rng[pedestrians].integers(150, size=(Simulator._COLORS_BLOCK_SIZE, 3))
+            ).astype(np.uint8)
+            self._colors_cursor[pedestrians] = 0
+        color = self._colors[pedestrians][self._colors_cursor[pedestrians]]
+        self._colors_cursor[pedestrians] += 1
+        return tuple(int(c) for c in color)
+
+    # ======================
+    # parking
+
+    def _free_cell(self, rd: Road, lane: int, cell: int) -> None:
+        # all cells of car roads are freed here, so the cars waiting for them are woken up
+        #   (and a parked car whose cell is freed by another car standing in the same cell)
+        occupant = rd.cells[lane, cell]
+        if occupant != -1 and occupant in self._parked_cars:
+            self._wake_car(int(occupant), self._parked_cars[occupant])
+        rd.free_cell(lane, cell)
+        if len(self._cell_watchers) > 0:
+            watchers = self._cell_watchers.pop((rd.id, lane, cell), None)
+            if watchers is not None:
+                for id, step_parked in watchers.items():
+                    self._wake_car(id, step_parked)
+
+    def _take_cell(self, rd: Road, lane: int, cell: int, id: int) -> None:
+        # a parked car whose cell is taken by another car is woken up,
+        #   its next step depends on it
+        occupant = rd.cells[lane, cell]
+        if occupant != -1 and occupant in self._parked_cars:
+            self._wake_car(int(occupant), self._parked_cars[occupant])
+        rd.take_cell(lane, cell, id)
+
+    def _park_car(self, car: Car, wake_step: int = None, watched_cells: list[tuple[int, int, int]] = ()) -> None:
+        """
+        Skips the car until the given step or until one of the given cells is freed.
+        The car is also woken up when its jam counter makes it choose another destination.
+        """
+        step = self._current_step
+        self._parked_cars[car.id] = step
+
+        # the jam counter is increased in every step the car stands still
+        threshold = 60 * (3 + car.get_profile_parameter())
+        jam_step = step + max(1, int((threshold - car.get_jam_counter()) // self._step_time) + 1)
+        wake_step = jam_step if wake_step is None else min(wake_step, jam_step)
+        self._cars_timers.setdefault(wake_step, []).append((car.id, step))
+
+        for cell in watched_cells:
+            self._cell_watchers.setdefault(cell, {})[car.id] = step
+
+    def _try_park_follower(self, car: Car) -> None:
+        """
+        Parks a stopped car that can neither move ahead nor change lanes:
+        the cell ahead is taken by a car standing still and the cells of the lanes it could change to are taken.
+        It is woken up when any of these cells is freed (the car ahead moves only by leaving its cell).
+        """
+        if car.id in self._parked_cars:
+            return
+        x_rd: Road = self.edges_map[car.rd]
+        x_l = car.lane
+        x_c = car.cell
+        if x_c >= x_rd.n_cell - 1 or x_rd.cells[x_l, x_c] != car.id:
+            return
+        car_ahead_id = int(x_rd.cells[x_l, x_c + 1])
+        if car_ahead_id == -1:
+            return
+        car_ahead = self.cars[car_ahead_id]
+        if car_ahead.velocity != 0 or car_ahead.rd != x_rd.id or car_ahead.cell != x_c + 1:
+            return
+        # cells of the other lanes the car could change to (see _step_car_before_movement)
+        path = self._cars_routing.path(self._road_index.get_target(x_rd.id), car.target_junction, max_len=2)
+        if len(path) > 1:
+            l_desired_options = self._lane_table.get_preferred_lanes(x_rd.id, path[1])
+        else:
+            l_desired_options = np.arange(x_rd.lanes)[::-1]
+        if x_l not in l_desired_options:
+            side_lanes = [l_desired_options[0] if x_l > l_desired_options[0] else l_desired_options[-1]]
+        else:
+            side_lanes = []
+            for ln in l_desired_options:
+                if ln == x_l:
+                    break
+                if abs(ln - x_l) == 1:
+                    side_lanes.append(int(ln))
+        for ln in side_lanes:
+            if x_rd.cells[ln, x_c] == -1:
+                return
+        # starting from a standstill, the car must not get past the car ahead
+        _, d_c = self._get_car_movement(car)
+        if d_c > 1:
+            return
+
+        self._park_car(car, watched_cells=[
+            (x_rd.id, int(ln), x_c) for ln in side_lanes
+        ] + [(x_rd.id, x_l, x_c + 1)])
+
+    def _wake_car(self, id: int, step_parked: int) -> None:
+        # the car may have been woken up (and parked again) by another event
+        if self._parked_cars.get(id) != step_parked:
+            return
+        del self._parked_cars[id]
+        self._woken_cars[id] = step_parked
+
+    def _wake_due_cars(self) -> None:
+        for id, step_parked in self._cars_timers.pop(self._current_step, ()):
+            self._wake_car(id, step_parked)
+
+    def _resume_car(self, car: Car) -> None:
+        # catches up the steps the car was skipped in: in each of them it would stand still
+        #   (increasing its jam counter) and, before the end of the road,
+        #   it would draw the same random numbers deciding about changing lanes
+        n_skipped = self._current_step - self._woken_cars.pop(car.id) - 1
+        if n_skipped <= 0:
+            return
+        car.increment_jam_counter(n_skipped * self._step_time)
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            # the cars of the store draw from its random numbers, see VehicleStore.get_random
+            return
+
+        x_rd: Road = self.edges_map[car.rd]
+        if car.cell == x_rd.n_cell - 1:
+            return
+        d_remaining = x_rd.distance - (car.cell + 1) * x_rd.d_cell
+        for _ in range(n_skipped):
+            _ = d_remaining < 40 and car._rng.random() > .66 \
+                or d_remaining < 20 and car._rng.random() > .33 \
+                or d_remaining < 10 \
+                or car._rng.random() > .6
+
+    def _park_pedestrian(self, pedestrian: Pedestrian, t_wait: float) -> None:
+        step = self._current_step
+        self._parked_pedestrians[pedestrian.id] = step
+        self._pedestrians_timers.setdefault(step + ceil(t_wait / self._step_time), []).append((pedestrian.id, step))
+
+    def _wake_due_pedestrians(self) -> None:
+        for id, step_parked in self._pedestrians_timers.pop(self._current_step, ()):
+            if self._parked_pedestrians.get(id) == step_parked:
+                del self._parked_pedestrians[id]
+
+    def _wake_all(self) -> None:
+        # e.g. after the routes or the timings of lights change
+        for id, step_parked in self._parked_cars.items():
+            self._woken_cars[id] = step_parked
+        self._parked_cars.clear()
+        self._parked_pedestrians.clear()
+        self._cars_timers.clear()
+        self._pedestrians_timers.clear()
+        self._cell_watchers.clear()
+
+    def _clear_parked(self) -> None:
+        self._wake_all()
+        self._woken_cars.clear()
+
+    def get_parked_cars(self) -> list[int]:
+        return list(self._parked_cars.keys())
+
+    def get_parked_pedestrians(self) -> list[int]:
+        return list(self._parked_pedestrians.keys())
 
     def _step_car(self, car: Car) -> int:
+        indicator = self._step_car_before_movement(car)
+        if indicator is not None:
+            return indicator
+        v, d_c = self._get_car_movement(car)
+        self._move_car(car, v, d_c)
+        return 0
+
+    def _step_car_before_movement(self, car: Car) -> int | None:
+        # returns -1 if the car left the simulation, 0 if its step is done,
+        #   None if it still has to move ahead
         x_rd: Road = self.edges_map[car.rd]  # edge
         x_l = car.lane
         x_c = car.cell
 
         car_roads_subgraph = self._get_roads_for_cars_subgraph()
 
-        closest_junction_id = [
-            e[1] for e in car_roads_subgraph.edges.data()
-            if e[2]['road'].id == x_rd.id  # cannot use enumeration and compare i with id because of nx sorting edges
-        ][0]
+        closest_junction_id = self._road_index.get_target(x_rd.id)
         target_junction_id = car.target_junction
 
         if car.velocity == 0:
             car.increment_jam_counter(self._step_time)
             if car.get_jam_counter() > 60 * (3 + car.get_profile_parameter()):
-                car.reset_jam_counter()
-                destinations = self.terminal_junctions
-                dest_ok = False
-                destination = np.random.choice(destinations)
-                while not dest_ok:
-                    try:
-                        nx.astar_path(
-                            car_roads_subgraph,
-                            closest_junction_id,
-                            destination
-                        )
-                        dest_ok = True
-                    except nx.NetworkXNoPath:
-                        destinations = [j for j in destinations if j != destination]
-                        if len(destinations) == 0:
-                            raise RuntimeError("No destinations for cars!")
-                        destination = np.random.choice(destinations)
-                car.target_junction = destination
+                self._reroute_jammed_car(car, closest_junction_id)
+                # the car heads to the new destination already in this step
+                target_junction_id = car.target_junction
 
         try:
-            path = nx.astar_path(
-                car_roads_subgraph,
+            # only the current and the next junction are needed
+            path = self._cars_routing.path(
                 closest_junction_id,
-                target_junction_id
+                target_junction_id,
+                max_len=2
             )
         except nx.NetworkXNoPath:
             raise RuntimeError(f"Path between car {car.id} "
@@ -261,7 +1051,7 @@ class Simulator:
             # ============
             # reaching destination
             if path[-1] == closest_junction_id:
-                self.edges_map[x_rd.id].free_cell(x_l, x_c)
+                self._free_cell(x_rd, x_l, x_c)
                 return -1
 
             # ============
@@ -271,6 +1061,8 @@ class Simulator:
                 lights = self.lights[potential_lights]
                 if lights.state == Light.State.RED:
                     car.velocity = 0
+                    # nothing changes until the light turns green
+                    self._park_car(car, self._current_step + ceil(lights.get_remaining_time() / self._step_time))
                     return 0
 
             # ============
@@ -280,14 +1072,7 @@ class Simulator:
             next_road_cells = self.edges_map[next_road].cells
             next_road_first_cells = next_road_cells[:, 0]
 
-            n_lanes_in = x_rd.lanes
-            n_lanes_out = len(next_road_first_cells)
-            lane_id = x_l
-
-            l_bound = int(np.floor(lane_id / n_lanes_in * n_lanes_out))
-            u_bound = int(np.ceil((lane_id + 1) / n_lanes_in * n_lanes_out))
-
-            options = np.arange(n_lanes_out)[l_bound:u_bound]
+            options = self._lane_table.get_next_lanes(x_rd.id, next_road, x_l)
 
             next_lane = -1
             for ln in options:
@@ -298,15 +1083,17 @@ class Simulator:
             if next_lane == -1:
                 # stop car
                 car.velocity = 0
+                # nothing changes until one of the lanes it can enter is freed
+                self._park_car(car, watched_cells=[(next_road, ln, 0) for ln in options])
                 return 0
             else:
                 # move car to next road
                 car.set_junction_velocity()
-                x_rd.free_cell(x_l, x_c)
+                self._free_cell(x_rd, x_l, x_c)
                 x_rd = self.edges_map[next_road]
                 x_l = next_lane
                 x_c = 0
-                x_rd.cells[x_l, x_c] = car.id
+                self._take_cell(x_rd, x_l, x_c, car.id)
                 car.rd = next_road
                 car.lane = x_l
                 car.cell = x_c
@@ -316,15 +1103,15 @@ class Simulator:
         # changing line before junctions
 
         d_remaining = x_rd.distance - (x_c + 1) * x_rd.d_cell
-        if d_remaining < 40 and np.random.random() > .66 \
-                or d_remaining < 20 and np.random.random() > .33 \
+        if d_remaining < 40 and car._rng.random() > .66 \
+                or d_remaining < 20 and car._rng.random() > .33 \
                 or d_remaining < 10 \
-                or np.random.random() > .6:
-            # or car.get_profile_parameter() > .5 and np.random.random() > .5:
+                or car._rng.random() > .6:
+            # or car.get_profile_parameter() > .5 and car._rng.random() > .5:
 
             # choosing lanes that satisfy the conditions
             if len(path) > 1:
-                l_desired_options = self._get_lane_pref_before_junction(path[0], x_rd.id, path[1])
+                l_desired_options = self._lane_table.get_preferred_lanes(x_rd.id, path[1])
             else:  # last edge
                 l_desired_options = np.arange(x_rd.lanes)[::-1]
 
@@ -335,17 +1122,17 @@ class Simulator:
                     -1]  # > because reversed
 
                 # ... and there is a free lane on the desired road, change lane
-                if x_rd.cells[l_desired, x_c] == -1 and np.random.random() > .5:
+                if x_rd.cells[l_desired, x_c] == -1 and car._rng.random() > .5:
                     l_diff = l_desired - x_l
                     l_diff = max(-1, min(l_diff, 1))
                     l_new = x_l + l_diff
-                    x_rd.free_cell(x_l, x_c)
-                    x_rd.cells[l_new, x_c] = car.id
+                    self._free_cell(x_rd, x_l, x_c)
+                    self._take_cell(x_rd, l_new, x_c, car.id)
                     car.lane = l_new
                     return 0
                 # ... and there is no free lane on the desired road,
                 #     but there is some space ahead, continue ahead
-                elif any(x_rd.cells[l_desired, x_c:] == -1):
+                elif x_rd.has_free_cell(l_desired, x_c):
                     pass
                 # ... and there is no free lane on the desired road,
                 #     and there is no space ahead, stop
@@ -360,14 +1147,30 @@ class Simulator:
                         break
                     if (abs(ln - x_l) == 1  # if lane is adjacent
                             and x_rd.cells[ln, x_c] == -1  # if lane is empty
-                            and np.random.random() > .5  # randomize
+                            and car._rng.random() > .5  # randomize
                     ):
-                        x_rd.free_cell(x_l, x_c)
-                        x_rd.cells[ln, x_c] = car.id
+                        self._free_cell(x_rd, x_l, x_c)
+                        self._take_cell(x_rd, ln, x_c, car.id)
                         car.lane = ln
                         x_l = ln
                         # return 0
 
+        return None
+
+    def _reroute_jammed_car(self, car: Car, junction_id: int) -> None:
+        # a car standing still for too long chooses another destination
+        car.reset_jam_counter()
+        car.target_junction = self._get_random_reachable_destination(
+            self._cars_destinations[junction_id],
+            car._rng
+        )
+
+    def _get_car_movement(self, car: Car) -> tuple[float, int]:
+        # returns the new velocity of the car and the number of cells it wants to move ahead
+        x_rd: Road = self.edges_map[car.rd]
+        x_l = car.lane
+        x_c = car.cell
+
         # ======================
         # classic movement ahead
 
@@ -375,15 +1178,16 @@ class Simulator:
         v = car.velocity
         t = self._step_time
 
-        d_max = np.where(x_rd.get_cells(x_l) != -1)[x_c + 1:]
         a_max = 1.25 + car.get_profile_parameter(0, 1)
 
-        # v for slowing down before junction or breaking
-        v_special = car._junction_velocity if len(d_max) == 0 else 0
+        # v for slowing down before junction or breaking behind the car ahead
+        next_occupied = x_rd.get_next_occupied(x_l, x_c)
+        v_special = car._junction_velocity if next_occupied == -1 else 0
 
         d_remaining = x_rd.distance - (x_c + 1) * d
-        if len(d_max) > 0:
-            d_remaining = min(d_max, d_remaining)
+        if next_occupied != -1:
+            # free space to the car ahead
+            d_remaining = min((next_occupied - x_c - 1) * d, d_remaining)
 
         breaking = False
         if v > v_special:
@@ -400,9 +1204,7 @@ class Simulator:
         a = (v_desired - v) / t
         a = max(-a_max, min(a, a_max))
 
-        float(v)
         v = max(0., v + a * t)
-        car.velocity = v
 
         d_c = int((v * t) // d)  # desired distance to move
         if 0 <= d_c < 1 and v != 0:
@@ -410,6 +1212,16 @@ class Simulator:
         if x_c + d_c >= x_rd.n_cell:
             d_c = x_rd.n_cell - x_c - 1
 
+        return v, d_c
+
+    def _move_car(self, car: Car, v: float, d_c: int) -> None:
+        x_rd: Road = self.edges_map[car.rd]
+        x_l = car.lane
+        x_c = car.cell
+        t = self._step_time
+
+        car.velocity = v
+
         if x_rd.cells[x_l, x_c + d_c] != -1:
             # @FIXME: this smells
             d_c -= 1
@@ -424,11 +1236,10 @@ class Simulator:
         # if car is not at the end of the road ...
         if x_l != 0 and future_cell < x_rd.n_cell - 3:
             ahead_cell = future_cell + 1
-            cells_ahead = x_rd.get_cells(car.lane)[car.cell + 1:ahead_cell + 3]
-            car_ahead_id = np.where(cells_ahead != -1)[0]
+            next_occupied = x_rd.get_next_occupied(car.lane, car.cell)
             # ... and there is a car ahead ...
-            if len(car_ahead_id) != 0:
-                car_ahead_id = cells_ahead[car_ahead_id[0]]
+            if next_occupied != -1 and next_occupied < ahead_cell + 3:
+                car_ahead_id = x_rd.cells[car.lane, next_occupied]
                 car_ahead = self.cars[car_ahead_id]
                 v_other = car_ahead.velocity
                 # ... and it is slower than the current car ...
@@ -436,83 +1247,38 @@ class Simulator:
                         and v / v_other >= 1.5:
                     move_cells = x_rd.get_cells(x_l - 1)[future_cell - 2: future_cell]
                     # ... and there is a free lane on the left, change lane and accelerate to pass
-                    if all(move_cells == -1) and np.random.random() > .5:
+                    if all(move_cells == -1) and car._rng.random() > .5:
                         x_l -= 1
                         car.velocity += 2
 
         # ======================
         # update car position
 
-        x_rd.free_cell(x_l_old, x_c)
-        x_rd.cells[x_l, x_c + d_c] = car.id
+        if d_c == 0 and x_l == x_l_old and x_rd.cells[x_l, x_c] == car.id:
+            # the car stays in its cell (freeing it would wake up the cars waiting for it)
+            return
+        self._free_cell(x_rd, x_l_old, x_c)
+        self._take_cell(x_rd, x_l, x_c + d_c, car.id)
         car.lane = x_l
         car.cell += d_c
 
-    def _get_lane_pref_before_junction(
-            self,
-            junction_id: int,
-            rd_in_id: int,
-            next_junction_id: int
-    ):
-        car_roads_subgraph = self._get_roads_for_cars_subgraph()
-        node = car_roads_subgraph.nodes[junction_id]
-        edge_in = [e for e in car_roads_subgraph.edges.data() if e[2]['road'].id == rd_in_id][0]
-        edges_out = [
-            e for e in car_roads_subgraph.edges.data()
-            if e[0] == junction_id
-        ]
-
-        with np.errstate(divide='ignore', invalid='ignore'):
-            diff = np.arctan(np.divide(
-                node['y'] - car_roads_subgraph.nodes[edge_in[0]]['y'],
-                node['x'] - car_roads_subgraph.nodes[edge_in[0]]['x'],
-            ))
-
-        edges_out_d = [  # calculate tan
-            (np.arctan(np.divide(
-                car_roads_subgraph.nodes[e[1]]['y'] - node['y'],
-                car_roads_subgraph.nodes[e[1]]['x'] - node['x']
-            )) - diff,
-             e[2]['road'].id, e[1])
-            for e in edges_out
-        ]
-
-        edges_out_d = sorted(edges_out_d, key=lambda x: x[0])
-        edges_out_d = np.array([[e[1], e[2]] for e in edges_out_d])  # road ids, next junction ids
-        road_id = np.argwhere(edges_out_d[:, 1] == next_junction_id)[0][0]
-        n_lanes = edge_in[2]['road'].lanes
-        n_roads_out = len(edges_out_d)
-
-        l_bound = int(np.floor(road_id / n_roads_out * n_lanes))
-        u_bound = int(np.ceil((road_id + 1) / n_roads_out * n_lanes))
-
-        options = np.arange(n_lanes)[l_bound:u_bound]
-        return options[::-1]  # reverse order
-
     def _step_pedestrian(self, pedestrian):
         x_rd: Road = self.edges_map[pedestrian.rd]
         x_l = pedestrian.lane
         x_c = pedestrian.cell
 
         pedestrian_roads_subgraph = self._get_roads_for_pedestrians_subgraph()
-        pedestrian_roads_subdigraph = self._get_roads_for_pedestrians_subgraph(digraph=True)
-
-        die = [
-            e for e in pedestrian_roads_subdigraph.edges.data()
-            if e[2]['road'].id == x_rd.id
-        ][0]
-        e = [
-            e for e in pedestrian_roads_subgraph.edges.data()
-            if e[2]['road'].id == x_rd.id  # cannot use enumeration and compare i with id because of nx sorting edges
-        ][0]
-        closest_junction_id = e[1]
+
+        die = self._road_index.get_endpoints(x_rd.id)
+        closest_junction_id = die[1]
         target_junction_id = pedestrian.target_junction
 
         try:
-            path = nx.astar_path(
-                pedestrian_roads_subgraph,
+            # the current junction and at most two next ones are needed
+            path = self._pedestrians_routing.path(
                 closest_junction_id,
-                target_junction_id
+                target_junction_id,
+                max_len=3
             )
         except nx.NetworkXNoPath:
             raise RuntimeError(f"Path between pedestrian {pedestrian.id} "
@@ -532,10 +1298,8 @@ class Simulator:
                 reversed_order = True
         next_reversed_order = False
         if len(path) > 1:
-            next_reversed_order = len( [
-                e for e in self.graph.edges.data() # we need to analyze digraph for direction
-                if e[0] == path[0] and e[1] == path[1]
-            ]) == 0
+            # we need to analyze digraph for direction
+            next_reversed_order = not self.graph.has_edge(path[0], path[1])
 
         if not reversed_order and x_c == x_rd.cells.shape[1] - 1 or reversed_order and x_c == 0:
             if path[-1] == closest_junction_id:
@@ -546,11 +1310,15 @@ class Simulator:
                 lights = self.lights[x_rd.traffic_light_at_end]
                 if lights.state == Light.State.RED:
                     pedestrian.velocity = 0
+                    # waits for the green light
+                    self._park_pedestrian(pedestrian, lights.get_remaining_time())
                     return 0
                 if lights.state == Light.State.GREEN:
                     t_remaining = lights.get_remaining_time()
                     if t_remaining < pedestrian.t_walk_lights:
                         pedestrian.velocity = 0
+                        # waits for the next green light
+                        self._park_pedestrian(pedestrian, t_remaining + lights.duration_red)
                         return 0
 
             next_road = pedestrian_roads_subgraph.edges[path[0], path[1]]['road'].id
@@ -566,48 +1334,48 @@ class Simulator:
                 if len(next_lines) == 0:
                     pedestrian.velocity = 0
                     return 0
-                next_line = np.random.choice(next_lines)
+                next_line = pedestrian._rng.choice(next_lines)
 
             self.edges_map[x_rd.id].free_cell(x_l, x_c)
             x_rd = self.edges_map[next_road]
             x_l = next_line
             x_c = 0 if not next_reversed_order else x_rd.n_cell - 1
-            x_rd.cells[x_l, x_c] = pedestrian.id
+            x_rd.take_cell(x_l, x_c, pedestrian.id)
             pedestrian.rd = next_road
             pedestrian.lane = x_l
             pedestrian.cell = x_c
             return 0
 
-        if np.random.random() > .8:
+        if pedestrian._rng.random() > .8:
             pedestrian.velocity = 0
             return 0
 
         # make pedestrian use right side of the road
-        if np.random.random() > .5:
+        if pedestrian._rng.random() > .5:
             if not reversed_order:
                 right_lanes = list(range(x_rd.lanes // 2, x_rd.lanes))
-                if x_l not in right_lanes and np.random.random() > .5:
+                if x_l not in right_lanes and pedestrian._rng.random() > .5:
                     x_rd.free_cell(x_l, x_c)
                     x_l += 1
                     pedestrian.lane = x_l
-                    x_rd.cells[x_l, x_c] = pedestrian.id
-                if x_l in right_lanes and x_l < x_rd.lanes -1 and np.random.random() > .75:
+                    x_rd.take_cell(x_l, x_c, pedestrian.id)
+                if x_l in right_lanes and x_l < x_rd.lanes -1 and pedestrian._rng.random() > .75:
                     x_rd.free_cell(x_l, x_c)
                     x_l -= 1
                     pedestrian.lane = x_l
-                    x_rd.cells[x_l, x_c] = pedestrian.id
+                    x_rd.take_cell(x_l, x_c, pedestrian.id)
             else:
                 left_lanes = list(range(x_rd.lanes // 2))
-                if x_l not in left_lanes and np.random.random() > .5:
+                if x_l not in left_lanes and pedestrian._rng.random() > .5:
                     x_rd.free_cell(x_l, x_c)
                     x_l -= 1
                     pedestrian.lane = x_l
-                    x_rd.cells[x_l, x_c] = pedestrian.id
-                if x_l in left_lanes and x_l > 0 and np.random.random() > .75:
+                    x_rd.take_cell(x_l, x_c, pedestrian.id)
+                if x_l in left_lanes and x_l > 0 and pedestrian._rng.random() > .75:
                     x_rd.free_cell(x_l, x_c)
                     x_l += 1
                     pedestrian.lane = x_l
-                    x_rd.cells[x_l, x_c] = pedestrian.id
+                    x_rd.take_cell(x_l, x_c, pedestrian.id)
 
 
         # now move forward (backward if reversed_order)
@@ -618,122 +1386,118 @@ class Simulator:
 
         x_rd.free_cell(x_l, x_c)
         next_cell = x_c + 1 if not reversed_order else x_c - 1
-        x_rd.cells[x_l, next_cell] = pedestrian.id
+        x_rd.take_cell(x_l, next_cell, pedestrian.id)
         pedestrian.cell = next_cell
         pedestrian.velocity = 1.1
 
         return 0
 
-    def _get_roads_for_cars_subgraph(self):
-        g = nx.DiGraph()
-        g.add_nodes_from(self.graph.nodes.data())
-        e = [e for e in self.graph.edges.data() if e[2]['road'].is_type_for_cars()]
-        g.add_edges_from(e)
-        return g
+    def _get_roads_for_cars_subgraph(self) -> nx.DiGraph:
+        return self._cars_graph
 
-    def _get_roads_for_pedestrians_subgraph(self, digraph=False):
-        g = nx.Graph() if not digraph else nx.DiGraph()
-        g.add_nodes_from(self.graph.nodes.data())
-        e = [e for e in self.graph.edges.data() if e[2]['road'].is_type_for_pedestrians()]
-        g.add_edges_from(e)
-        return g
+    def _get_roads_for_pedestrians_subgraph(self, digraph=False) -> nx.Graph:
+        return self._pedestrians_graph if not digraph else self._pedestrians_digraph
+
+    def _get_spawn_roads(self, spawner: Spawner) -> np.ndarray:
+        # open roads an entity can be spawned on
+        if spawner.is_for_pedesrians():
+            return np.concatenate([
+                self._road_index.get_outgoing(spawner._junction, pavements=True),
+                self._road_index.get_incoming(spawner._junction, pavements=True)
+            ])
+        return self._road_index.get_outgoing(spawner._junction)
 
     def _spawn_car(self, junction_id: int):
         spawner = self.spawners[junction_id]
-        car_roads_subgraph = self._get_roads_for_cars_subgraph()
-        edges_out = [e for e in car_roads_subgraph.edges.data() if e[0] == junction_id]
-        edges_out = np.array(edges_out)
-        edges_out = edges_out[np.random.permutation(len(edges_out))]
-        edge = edges_out[0]
-        rd: Road = edge[2]['road']
+        edges_out = self._get_spawn_roads(spawner)
+        if len(edges_out) == 0:  # all outgoing roads are closed
+            return
+        u_edge, u_lane, u_destination = spawner.get_choices()
+        edge = self._road_index.get_endpoints(edges_out[int(u_edge * len(edges_out))])
+        rd: Road = edge[2]
         first_cells = rd.cells[:, 0]
         empty_lanes = np.where(first_cells == -1)[0]
 
         if len(empty_lanes) == 0:
-            spawner.add_to_queue()
             return
         spawner.get_from_queue()
 
-        lane = np.random.choice(empty_lanes)
+        lane = empty_lanes[int(u_lane * len(empty_lanes))]
         cell = 0
-        car_id = max(self.cars.keys()) + 1 if len(self.cars) > 0 else 0
+        car_id = self._next_car_id
+        self._next_car_id += 1
 
-        destinations = [j for j in self.terminal_junctions if j != junction_id]
-        if len(destinations) == 0:
-            raise RuntimeError("No destinations for cars!")
-        destination = np.random.choice(destinations)
+        destinations = self._cars_destinations[edge[1]]
+        destination = self._get_reachable_destination(
+            destinations[destinations != junction_id],
+            u_destination
+        )
 
-        dest_ok = False
-        while not dest_ok:
-            try:
-                nx.astar_path(
-                    car_roads_subgraph,
-                    edge[1],
-                    destination
-                )
-                dest_ok = True
-            except nx.NetworkXNoPath:
-                destinations = [j for j in destinations if j != destination]
-                if len(destinations) == 0:
-                    raise RuntimeError("No destinations for cars!")
-                destination = np.random.choice(destinations)
-
-        self.cars[car_id] = Car(
+        self._add_car(
             car_id,
             rd.id,
             lane,
             cell,
             destination
         )
+        self._take_cell(rd, lane, cell, car_id)
 
 
     def _spawn_pedestrian(self, junction_id: int):
         spawner = self.spawners[junction_id]
-        pedestrians_roads_subgraph = self._get_roads_for_pedestrians_subgraph()
-        edges_out = [e for e in pedestrians_roads_subgraph.edges.data() if e[0] == junction_id or e[1] == junction_id]
-        edges_out = np.array(edges_out)
-        edges_out = edges_out[np.random.permutation(len(edges_out))]
-        edge = edges_out[0]
-        rd: Road = edge[2]['road']
+        edges_out = self._get_spawn_roads(spawner)
+        if len(edges_out) == 0:  # all adjacent pavements are closed
+            return
+        u_edge, u_lane, u_destination = spawner.get_choices()
+        edge = self._road_index.get_endpoints(edges_out[int(u_edge * len(edges_out))])
+        rd: Road = edge[2]
         first_cells = rd.cells[:, 0]
         empty_lanes = np.where(first_cells == -1)[0]
 
         if len(empty_lanes) == 0:
-            spawner.add_to_queue()
             return
         spawner.get_from_queue()
 
-        lane = np.random.choice(empty_lanes)
+        lane = empty_lanes[int(u_lane * len(empty_lanes))]
         cell = 0
-        pedestrian_id = max(self.pedestrians.keys()) + 1 if len(self.pedestrians) > 0 else 0
-
-        destinations = [j for j in self.terminal_junctions if j != junction_id]
-        if len(destinations) == 0:
-            raise RuntimeError("No destinations for pedestrians!")
-        destination = np.random.choice(destinations)
+        pedestrian_id = self._next_pedestrian_id
+        self._next_pedestrian_id += 1
+
+        destinations = self._pedestrians_destinations[edge[1]]
+        destination = self._get_reachable_destination(
+            destinations[destinations != junction_id],
+            u_destination,
+            "No destinations for pedestrians!"
+        )
 
-        dest_ok = False
-        while not dest_ok:
-            try:
-                nx.astar_path(
-                    pedestrians_roads_subgraph,
-                    edge[1],
-                    destination
-                )
-                dest_ok = True
-            except nx.NetworkXNoPath:
-                destinations = [j for j in destinations if j != destination]
-                if len(destinations) == 0:
-                    raise RuntimeError("No destinations for cars!")
-                destination = np.random.choice(destinations)
-
-        self.pedestrians[pedestrian_id] = Pedestrian(
+        self._add_pedestrian(
             pedestrian_id,
             rd.id,
             lane,
             cell,
             destination
         )
+        rd.take_cell(lane, cell, pedestrian_id)
+
+    def get_signal_plan(self) -> SignalPlan:
+        return self._signal_plan
+
+    def set_light_timing(self, light_id: int, duration_green: float, duration_red: float) -> None:
+        """
+        Changes the durations of a light (and of the lights complementary to it) from the current time on.
+        """
+        if light_id not in self.lights.keys():
+            raise RuntimeError(f"Light {light_id} does not exist!")
+        self._signal_plan.set_timing(light_id, duration_green, duration_red, self.get_time_elapsed())
+        self._wake_all()
+        for light in self.lights.values():
+            i = self._signal_plan.get_index(light.id)
+            light.duration_green = float(self._signal_plan.duration_green[i])
+            light.duration_red = float(self._signal_plan.duration_red[i])
+        self._step_lights()
+
+    def get_engine(self) -> EngineEnum:
+        return self._engine
 
     def get_step_time(self):
         return self._step_time
@@ -748,28 +1512,95 @@ class Simulator:
         return self._current_step * self._step_time
 
     def get_t_gap(self):
-        return self._t_gap
+        return self._scheduler.get_t_gap()
+
+    def set_t_gap(self, t_gap: float) -> None:
+        # takes effect immediately, also while another thread is stepping
+        self._scheduler.set_t_gap(t_gap)
+
+    def get_real_time_factor(self) -> float:
+        # simulated time per real time, inf if the simulation runs as fast as possible
+        t_gap = self._scheduler.get_t_gap()
+        return self._step_time / t_gap if t_gap > 0 else float("inf")
+
+    def set_real_time_factor(self, factor: float) -> None:
+        # e.g. 10 - 10 simulated seconds per real second
+        self.set_t_gap(self._step_time / factor if factor > 0 and factor != float("inf") else 0)
+
+    def get_cars_finished(self):
+        # number of cars that reached their destination
+        return self._n_cars_finished
+
+    def get_pedestrians_finished(self):
+        return self._n_pedestrians_finished
+
+    def get_cars_velocities(self) -> np.ndarray:
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            return self._vehicles.velocity[self._vehicles.get_active_slots()]
+        return np.fromiter((car.velocity for car in self.cars.values()), dtype=np.float64, count=len(self.cars))
 
     def _update_cars_dataframe(self):
-        cars = []
-        for car in self.cars.values():
-            d = car.__dict__()
-            d.update({
-                "step": self._current_step,
-                "closest_junction": [e[1] for e in self.graph.edges.data() if e[2]['road'].id == car.rd][0],
-            })
-            cars.append(d)
-        self._cars_df = pd.concat([self._cars_df, pd.DataFrame(cars)])
+        if not self._telemetry.is_recording(TelemetryRecorder.CARS, self._current_step):
+            return
+        if self._engine == Simulator.EngineEnum.VEHICLE_STORE:
+            vs = self._vehicles
+            slots = vs.get_active_slots()
+            columns = {
+                "id": vs.ids[slots],
+                "rw": vs.rd[slots],
+                "lane": vs.lane[slots],
+                "cell": vs.cell[slots],
+                "profile": vs.profile[slots],
+                "velocity": vs.velocity[slots],
+                "target_junction": vs.target_junction[slots],
+            }
+        else:
+            cars = list(self.cars.values())
+            n = len(cars)
+            columns = {
+                "id": np.fromiter((car.id for car in cars), dtype=np.int64, count=n),
+                "rw": np.fromiter((car.rd for car in cars), dtype=np.int64, count=n),
+                "lane": np.fromiter((car.lane for car in cars), dtype=np.int64, count=n),
+                "cell": np.fromiter((car.cell for car in cars), dtype=np.int64, count=n),
+                "profile": np.fromiter((car.profile for car in cars), dtype=np.float64, count=n),
+                "velocity": np.fromiter((car.velocity for car in cars), dtype=np.float64, count=n),
+                "target_junction": np.fromiter((car.target_junction for car in cars), dtype=np.int64, count=n),
+            }
+        columns["step"] = self._current_step
+        columns["closest_junction"] = self._road_index.get_targets(columns["rw"])
+        self._telemetry.append(TelemetryRecorder.CARS, columns)
+
+    def _update_pedestrians_dataframe(self):
+        if not self._telemetry.is_recording(TelemetryRecorder.PEDESTRIANS, self._current_step):
+            return
+        pedestrians = list(self.pedestrians.values())
+        n = len(pedestrians)
+        columns = {
+            "id": np.fromiter((ped.id for ped in pedestrians), dtype=np.int64, count=n),
+            "rw": np.fromiter((ped.rd for ped in pedestrians), dtype=np.int64, count=n),
+            "lane": np.fromiter((ped.lane for ped in pedestrians), dtype=np.int64, count=n),
+            "cell": np.fromiter((ped.cell for ped in pedestrians), dtype=np.int64, count=n),
+            "profile": np.fromiter((ped.profile for ped in pedestrians), dtype=np.float64, count=n),
+            "velocity": np.fromiter((ped.velocity for ped in pedestrians), dtype=np.float64, count=n),
+            "target_junction": np.fromiter((ped.target_junction for ped in pedestrians), dtype=np.int64, count=n),
+            "step": self._current_step,
+        }
+        columns["closest_junction"] = self._road_index.get_targets(columns["rw"])
+        self._telemetry.append(TelemetryRecorder.PEDESTRIANS, columns)
 
     def _update_lights_dataframe(self):
-        lights = []
-        for light in self.lights.values():
-            d = light.__dict__()
-            d.update({
-                "step": self._current_step,
-            })
-            lights.append(d)
-        self._lights_df = pd.concat([self._lights_df, pd.DataFrame(lights)])
+        if not self._telemetry.is_recording(TelemetryRecorder.LIGHTS, self._current_step):
+            return
+        lights = list(self.lights.values())
+        n = len(lights)
+        self._telemetry.append(TelemetryRecorder.LIGHTS, {
+            "id": np.fromiter((light.id for light in lights), dtype=np.int64, count=n),
+            "roadway": np.fromiter((light.road for light in lights), dtype=np.int64, count=n),
+            "duration_green": np.fromiter((light.duration_green for light in lights), dtype=np.float64, count=n),
+            "duration_red": np.fromiter((light.duration_red for light in lights), dtype=np.float64, count=n),
+            "state": np.fromiter((light.state.value for light in lights), dtype=np.int8, count=n),
+            "step": self._current_step,
+        })
 
     def get_junctions_dataframe(self) -> pd.DataFrame:
         junctions = []
@@ -795,7 +1626,86 @@ class Simulator:
         return pd.DataFrame(edges)
 
     def get_cars_dataframe(self) -> pd.DataFrame:
-        return self._cars_df
+        return self._telemetry.get_dataframe(TelemetryRecorder.CARS)
+
+    def get_pedestrians_dataframe(self) -> pd.DataFrame:
+        return self._telemetry.get_dataframe(TelemetryRecorder.PEDESTRIANS)
 
     def get_lights_dataframe(self) -> pd.DataFrame:
-        return self._lights_df
+        return self._telemetry.get_dataframe(TelemetryRecorder.LIGHTS)
+
+    # ======================
+    # frames
+
+    def get_source_file_name(self) -> str:
+        return self._source_file_name
+
+    def create_frame_buffer(self) -> FrameBuffer:
+        """
+        Frame buffer (in shared memory) matching the network of the simulator.
+        """
+        return FrameBuffer(len(self._cells.cells), len(self._signal_plan))
+
+    def attach_frame_buffer(self, frame_buffer: FrameBuffer, fps: float = 30) -> None:
+        """
+        Publishes frames into the buffer after the steps, at most ``fps`` frames per second of real time,
+        the steps in between do not publish anything. Writing a frame never waits for its reader.
+        """
+        if frame_buffer.n_cells != len(self._cells.cells) or frame_buffer.n_lights != len(self._signal_plan):
+            raise RuntimeError("Frame buffer does not match the network!")
+        self._frame_buffer = frame_buffer
+        self._frame = FrameBuffer.new_frame(frame_buffer.n_cells, frame_buffer.n_lights)
+        self._frame_interval = 1 / fps if fps > 0 else 0
+        self._frame_due = 0
+        self._publish_frame()
+
+    def detach_frame_buffer(self) -> None:
+        self._frame_buffer = None
+        self._frame = {}
+
+    def capture_frame(self, frame: dict[str, np.ndarray]) -> None:
+        """
+        Fills the arrays of a frame (see FrameBuffer) with the current state of the simulation.
+        """
+        cells = frame["cells"]
+        np.copyto(cells, self._cells.cells)
+        occupied = np.flatnonzero(cells != -1)
+        if len(occupied) > 0:
+            is_pavement = np.repeat(self._cells.is_pavement, self._cells.lanes * self._cells.n_cell)[occupied]
+            entities = [
+                self.pedestrians[id] if pavement else self.cars[id]
+                for id, pavement in zip(cells[occupied].tolist(), is_pavement.tolist())
+            ]
+            frame["colors"][occupied] = [entity._color for entity in entities]
+            frame["velocity"][occupied] = [entity.velocity for entity in entities]
+        frame["green"][:] = self._signal_plan.get_states(self.get_time_elapsed())[0]
+        frame["stats"][:] = [
+            self._current_step,
+            self._max_steps,
+            self.get_time_elapsed(),
+            self.get_t_gap(),
+            self._step_time,
+            len(self.cars),
+            len(self.pedestrians),
+        ]
+
+    def _publish_frame(self) -> None:
+        if self._frame_buffer is None:
+            return
+        if self._frame_buffer.is_viewer_closed():
+            # the plotter was closed, as with a plotter in the same process
+            self.detach_frame_buffer()
+            self.stop()
+            return
+        now = monotonic()
+        if now < self._frame_due:
+            return
+        self._frame_due = now + self._frame_interval
+        self.capture_frame(self._frame)
+        self._frame_buffer.write(self._frame)
+
+    def close(self) -> None:
+        # writes out the remaining telemetry records and stops the telemetry sink (if any),
+        #   and releases the shared memory of the cells (if any)
+        self._telemetry.close()
+        self._cells.close(unlink=True)
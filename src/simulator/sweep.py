@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+from .simulator import Simulator
+from .telemetry import TelemetryRecorder
+from .runner import run_steps
+from .replications import summarize
+from .overrides import expand_grid, parse_key
+
+
+# simulators loaded by the current (worker) process: (model, engine) - simulator
+_simulators: dict[tuple[str, Simulator.EngineEnum], Simulator] = {}
+
+
+def _get_simulator(model_path: str, engine: Simulator.EngineEnum) -> Simulator:
+    # the model is parsed once per process, the following jobs only reset it
+    key = (model_path, engine)
+    if key not in _simulators.keys():
+        _simulators[key] = Simulator(
+            model_path,
+            engine=engine,
+            telemetry=TelemetryRecorder(cars_every=0, lights_every=0)
+        )
+    return _simulators[key]
+
+
+def _run_job(args: tuple) -> dict:
+    config_id, overrides, model_path, steps, replication, seed, kpis, engine = args
+    sim = _get_simulator(model_path, engine)
+    sim.reset(seed=seed, overrides=overrides)
+    results = run_steps(sim, steps, kpis=kpis)
+    return {"config": config_id, "replication": replication, **results}
+
+
+class ParameterSweep:
+    """
+    Runs every configuration (a set of overridden parameters of lights, spawners and roads)
+    with the given number of replications, in a pool of processes.
+
+    Replication i of every configuration uses the same seed (the i-th child of SeedSequence(seed)),
+    so the configurations are compared under the same random demand,
+    while sweeps with different seeds do not share any replication.
+    Results are collected into a single table, one row per (configuration, replication).
+    """
+
+    def __init__(
+            self,
+            model_path: str,
+            configs: list[dict[str, float | str]],
+            n_replications: int = 1,
+            steps: int = 3600,
+            seed: int = 0,
+            kpis: list[str] = None,
+            engine: Simulator.EngineEnum = Simulator.EngineEnum.OBJECTS,
+            max_workers: int = None,
+    ) -> None:
+        for config in configs:
+            for key in config.keys():
+                parse_key(key)
+        self._model_path: str = model_path
+        self._configs: list[dict[str, float | str]] = configs
+        self._n_replications: int = n_replications
+        self._steps: int = steps
+        self._seed: int = seed
+        self._kpis: list[str] | None = kpis
+        self._engine: Simulator.EngineEnum = engine
+        self._max_workers: int = max_workers if max_workers is not None else os.cpu_count()
+
+        self._rows: list[dict] = []
+
+    @staticmethod
+    def from_grid(model_path: str, grid: dict[str, list], **kwargs) -> ParameterSweep:
+        return ParameterSweep(model_path, expand_grid(grid), **kwargs)
+
+    def get_configs(self) -> pd.DataFrame:
+        return pd.DataFrame(self._configs, index=pd.RangeIndex(len(self._configs), name="config"))
+
+    def get_seeds(self) -> list[np.random.SeedSequence]:
+        return np.random.SeedSequence(self._seed).spawn(self._n_replications)
+
+    def _get_jobs(self) -> list[tuple]:
+        return [
+            (config_id, config, self._model_path, self._steps, i, seed, self._kpis, self._engine)
+            for i, seed in enumerate(self.get_seeds())
+            for config_id, config in enumerate(self._configs)
+        ]
+
+    def iter_results(self) -> Iterator[dict]:
+        """
+        Yields the rows of the result table as soon as their jobs finish (in any order).
+        """
+        self._rows = []
+        jobs = self._get_jobs()
+        if self._max_workers <= 1:
+            results = map(_run_job, jobs)
+        else:
+            executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            results = (future.result() for future in as_completed([executor.submit(_run_job, job) for job in jobs]))
+        try:
+            for result in results:
+                row = self._to_row(result)
+                self._rows.append(row)
+                yield row
+        finally:
+            if self._max_workers > 1:
+                executor.shutdown(cancel_futures=True)
+
+    def run(self) -> pd.DataFrame:
+        for _ in self.iter_results():
+            pass
+        return self.get_results()
+
+    def _to_row(self, result: dict) -> dict:
+        return {
+            "config": result["config"],
+            "replication": result["replication"],
+            **self._configs[result["config"]],
+            **result["kpis"],
+            "time_elapsed_real": result["time_elapsed_real"],
+        }
+
+    def get_results(self) -> pd.DataFrame:
+        """
+        Tidy table of the results: one row per (configuration, replication),
+        with the overridden parameters and the KPIs as columns.
+        """
+        if len(self._rows) == 0:
+            return pd.DataFrame()
+        return pd.DataFrame(self._rows).sort_values(["config", "replication"], ignore_index=True)
+
+    def get_summary(self, confidence: float = .95) -> pd.DataFrame:
+        """
+        Mean and confidence interval of every KPI, one row per configuration.
+        """
+        results = self.get_results()
+        if len(results) == 0:
+            return pd.DataFrame()
+        kpi_columns = [c for c in results.columns if c not in ("config", "replication", "time_elapsed_real")
+                       and c not in self.get_configs().columns]
+        summaries = []
+        for config_id, group in results.groupby("config"):
+            summary = summarize(group[kpi_columns], confidence)
+            summary = summary.stack().to_frame().T  # (KPI, statistic) columns
+            summary.index = pd.Index([config_id], name="config")
+            summaries.append(summary)
+        summary = pd.concat(summaries)
+        summary.columns = [f"{kpi}_{statistic}" for kpi, statistic in summary.columns]
+        return self.get_configs().join(summary, how="right")
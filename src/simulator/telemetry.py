@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import os
+import glob
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from abc import ABC, abstractmethod
+from queue import Queue, Full
+from typing import Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+class ColumnTable:
+    """
+    Append-only table kept as growable NumPy column buffers.
+    The capacity doubles when the buffers are full, so appending is amortised O(rows appended).
+    """
+
+    def __init__(
+            self,
+            columns: dict[str, np.dtype],
+            categories: dict[str, dict[int, str]] = None,
+            capacity: int = 4096
+    ) -> None:
+        self._columns: dict[str, np.dtype] = columns
+        # integer codes of categorical columns - names shown in the dataframe
+        self._categories: dict[str, dict[int, str]] = categories if categories is not None else {}
+        self._capacity: int = capacity
+        self._n_rows: int = 0
+        self._buffers: dict[str, np.ndarray] = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in columns.items()
+        }
+        self._df: pd.DataFrame | None = None
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def get_columns(self) -> list[str]:
+        return list(self._columns.keys())
+
+    def append(self, columns: dict[str, np.ndarray | int | float]) -> None:
+        # scalars are broadcast to the length of the array columns
+        n = max([len(c) for c in columns.values() if isinstance(c, np.ndarray)], default=1)
+        if n == 0:
+            return
+        if self._n_rows + n > self._capacity:
+            capacity = self._capacity
+            while self._n_rows + n > capacity:
+                capacity *= 2
+            for name, buffer in self._buffers.items():
+                new_buffer = np.zeros(capacity, dtype=buffer.dtype)
+                new_buffer[:self._n_rows] = buffer[:self._n_rows]
+                self._buffers[name] = new_buffer
+            self._capacity = capacity
+
+        for name, buffer in self._buffers.items():
+            buffer[self._n_rows:self._n_rows + n] = columns[name]
+        self._n_rows += n
+        self._df = None
+
+    def get_column(self, name: str) -> np.ndarray:
+        return self._buffers[name][:self._n_rows]
+
+    def clear(self) -> None:
+        self._n_rows = 0
+        self._df = None
+
+    def take_chunk(self) -> dict[str, np.ndarray]:
+        """
+        Removes all rows from the table and returns them as columns
+        (categorical columns are decoded to their names).
+        """
+        chunk = {}
+        for name, buffer in self._buffers.items():
+            column = buffer[:self._n_rows]
+            if name in self._categories.keys():
+                codes = np.array(list(self._categories[name].keys()))
+                names = np.array(list(self._categories[name].values()))
+                column = names[np.searchsorted(codes, column)]
+            chunk[name] = column
+        # new buffers, so the returned columns are never overwritten
+        self._buffers = {
+            name: np.zeros(self._capacity, dtype=dtype)
+            for name, dtype in self._columns.items()
+        }
+        self.clear()
+        return chunk
+
+    def to_dataframe(self) -> pd.DataFrame:
+        if self._df is None:
+            df = pd.DataFrame({
+                name: buffer[:self._n_rows].copy()
+                for name, buffer in self._buffers.items()
+            })
+            for name, names in self._categories.items():
+                df[name] = df[name].map(names)
+            self._df = df
+        return self._df
+
+
+class TelemetrySink(ABC):
+    """
+    Destination of the chunks of telemetry records flushed by the TelemetryRecorder.
+    """
+
+    @abstractmethod
+    def write(self, table: str, chunk: dict[str, np.ndarray]) -> None:
+        ...
+
+    @abstractmethod
+    def read(self, table: str) -> Iterator[pd.DataFrame]:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        # drops all the chunks written so far
+        ...
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class DiskSink(TelemetrySink):
+    """
+    Writes chunks of telemetry records to files in the given directory
+    (Parquet if pyarrow is installed, .npz otherwise).
+
+    Writing is done by a background thread, so the simulation never waits for serialization or I/O.
+    At most ``max_pending`` chunks wait for the writer, which bounds the memory used: when the writer
+    falls behind, further chunks are dropped (with a warning) and counted, see get_n_dropped().
+    ``max_pending=0`` never drops chunks, but does not bound the memory.
+    """
+
+    def __init__(self, directory: str, use_parquet: bool = None, max_pending: int = 8) -> None:
+        if use_parquet is None:
+            use_parquet = pq is not None
+        if use_parquet and pq is None:
+            raise RuntimeError("Parquet output requires pyarrow!")
+        self._directory: str = directory
+        self._extension: str = "parquet" if use_parquet else "npz"
+        self._n_chunks: dict[str, int] = {}  # table - number of chunks written
+        self._n_dropped: dict[str, int] = {}  # table - number of chunks dropped
+        self._error: Exception | None = None
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue: Queue = Queue(maxsize=max_pending)
+        self._thread: threading.Thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, chunk = item
+                if self._error is None:
+                    self._write_chunk(path, chunk)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_chunk(self, path: str, chunk: dict[str, np.ndarray]) -> None:
+        if self._extension == "parquet":
+            pq.write_table(pa.table(chunk), path)
+        else:
+            np.savez(path, **chunk)
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Writing telemetry to {self._directory} failed: {self._error}")
+
+    def write(self, table: str, chunk: dict[str, np.ndarray]) -> None:
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise RuntimeError("DiskSink is closed!")
+        i = self._n_chunks.get(table, 0)
+        path = os.path.join(self._directory, f"{table}-{i:06d}.{self._extension}")
+        try:
+            self._queue.put_nowait((path, chunk))
+        except Full:
+            if sum(self._n_dropped.values()) == 0:
+                warnings.warn(f"Writing telemetry to {self._directory} falls behind, chunks are dropped!")
+            self._n_dropped[table] = self._n_dropped.get(table, 0) + 1
+            return
+        self._n_chunks[table] = i + 1
+
+    def get_n_dropped(self, table: str = None) -> int:
+        # number of chunks dropped because the writer fell behind (of all the tables if None)
+        if table is None:
+            return sum(self._n_dropped.values())
+        return self._n_dropped.get(table, 0)
+
+    def read(self, table: str) -> Iterator[pd.DataFrame]:
+        self.flush()
+        return read_chunks(self._directory, table)
+
+    def clear(self) -> None:
+        # the pending chunks are written first, so the writer does not recreate deleted files
+        self.flush()
+        for table in self._n_chunks.keys():
+            for path in glob.glob(os.path.join(self._directory, f"{table}-*.{self._extension}")):
+                os.remove(path)
+        self._n_chunks = {}
+        self._n_dropped = {}
+
+    def flush(self) -> None:
+        # waits until all the pending chunks are written
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            # blocks until the pending chunks are written
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+def read_chunks(directory: str, table: str) -> Iterator[pd.DataFrame]:
+    """
+    Streams the chunks of the given table written by a DiskSink, in order, as dataframes.
+    """
+    paths = sorted(
+        glob.glob(os.path.join(directory, f"{table}-*.parquet"))
+        + glob.glob(os.path.join(directory, f"{table}-*.npz"))
+    )
+    for path in paths:
+        if path.endswith(".parquet"):
+            yield pd.read_parquet(path)
+        else:
+            with np.load(path) as chunk:
+                yield pd.DataFrame({name: chunk[name] for name in chunk.files})
+
+
+def read_table(directory: str, table: str) -> pd.DataFrame:
+    chunks = list(read_chunks(directory, table))
+    if len(chunks) == 0:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+class TelemetryRecorder:
+    """
+    Records the dynamic state of the simulation (cars, pedestrians and lights) step by step.
+
+    Recording is configured separately for every type of entity:
+    0 turns it off, N records every N-th step (1 - every step).
+    The dataframes are built only when they are requested.
+
+    Without a sink, all the records are kept in memory. With a sink, every table is
+    handed over to the sink in chunks of ``chunk_size`` rows, so the memory used stays bounded.
+    """
+
+    CARS = "cars"
+    PEDESTRIANS = "pedestrians"
+    LIGHTS = "lights"
+
+    def __init__(
+            self,
+            cars_every: int = 1,
+            lights_every: int = 1,
+            pedestrians_every: int = 0,
+            sink: TelemetrySink = None,
+            chunk_size: int = 65536,
+    ) -> None:
+        self._every: dict[str, int] = {
+            TelemetryRecorder.CARS: cars_every,
+            TelemetryRecorder.PEDESTRIANS: pedestrians_every,
+            TelemetryRecorder.LIGHTS: lights_every,
+        }
+        self._sink: TelemetrySink | None = sink
+        self._chunk_size: int = chunk_size
+        self._tables: dict[str, ColumnTable] = {
+            TelemetryRecorder.CARS: ColumnTable({
+                "id": np.int64,
+                "rw": np.int64,
+                "lane": np.int64,
+                "cell": np.int64,
+                "profile": np.float64,
+                "velocity": np.float64,
+                "target_junction": np.int64,
+                "step": np.int64,
+                "closest_junction": np.int64,
+            }),
+            TelemetryRecorder.PEDESTRIANS: ColumnTable({
+                "id": np.int64,
+                "rw": np.int64,
+                "lane": np.int64,
+                "cell": np.int64,
+                "profile": np.float64,
+                "velocity": np.float64,
+                "target_junction": np.int64,
+                "step": np.int64,
+                "closest_junction": np.int64,
+            }),
+            TelemetryRecorder.LIGHTS: ColumnTable({
+                "id": np.int64,
+                "roadway": np.int64,
+                "duration_green": np.float64,
+                "duration_red": np.float64,
+                "state": np.int8,
+                "step": np.int64,
+            }, categories={
+                "state": {1: "RED", 2: "GREEN"},  # Light.State
+            }),
+        }
+
+    def is_recording(self, table: str, step: int) -> bool:
+        every = self._every[table]
+        return every > 0 and step % every == 0
+
+    def append(self, table: str, columns: dict[str, np.ndarray | int | float]) -> None:
+        self._tables[table].append(columns)
+        if self._sink is not None and len(self._tables[table]) >= self._chunk_size:
+            self._sink.write(table, self._tables[table].take_chunk())
+
+    def get_table(self, table: str) -> ColumnTable:
+        return self._tables[table]
+
+    def flush(self) -> None:
+        if self._sink is None:
+            return
+        for table, column_table in self._tables.items():
+            if len(column_table) > 0:
+                self._sink.write(table, column_table.take_chunk())
+        self._sink.flush()
+
+    def clear(self) -> None:
+        # drops the records kept in memory and the ones handed over to the sink
+        for column_table in self._tables.values():
+            column_table.clear()
+        if self._sink is not None:
+            self._sink.clear()
+
+    def close(self) -> None:
+        if self._sink is None:
+            return
+        self.flush()
+        self._sink.close()
+
+    def get_dataframe(self, table: str) -> pd.DataFrame:
+        if self._sink is None:
+            return self._tables[table].to_dataframe()
+        # everything recorded so far is read back from the sink
+        self.flush()
+        chunks = list(self._sink.read(table))
+        if len(chunks) == 0:
+            return self._tables[table].to_dataframe()
+        return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import numpy as np
+
+from .elements.car import Car
+from .elements.road import Road
+
+
+class VehicleStore:
+    """
+    Structure-of-arrays storage of cars.
+
+    Every car occupies a slot in contiguous arrays (road, lane, cell, velocity, profile,
+    target, jam counter and colour). Slots of removed cars are kept on a free-list and reused.
+    The arrays grow (doubling their size) when there are no free slots left.
+    """
+
+    def __init__(self, roads: dict[int, Road], capacity: int = 1024, rng: np.random.Generator = None) -> None:
+        self._rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+        self._capacity: int = 0
+        self._free: list[int] = []
+        self._slots: dict[int, int] = {}  # car id - slot
+        self._views: list[CarView | None] = []  # views of the slots, reused by the following cars
+
+        self.ids: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.rd: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.lane: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.cell: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.velocity: np.ndarray = np.zeros(0)  # [m/s]
+        self.profile: np.ndarray = np.zeros(0)
+        self.junction_velocity: np.ndarray = np.zeros(0)  # [m/s]
+        self.target_junction: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.jam_counter: np.ndarray = np.zeros(0)  # [s]
+        self.color: np.ndarray = np.zeros((0, 3), dtype=np.uint8)
+
+        # static parameters of the roads, indexed by road id
+        n_roads = max(roads.keys()) + 1 if len(roads) > 0 else 0
+        self._road_distance: np.ndarray = np.zeros(n_roads)  # [m]
+        self._road_d_cell: np.ndarray = np.ones(n_roads)  # [m]
+        self._road_n_cell: np.ndarray = np.zeros(n_roads, dtype=np.int64)
+        self._road_v_avg: np.ndarray = np.zeros(n_roads)  # [m/s]
+        self._road_v_std: np.ndarray = np.zeros(n_roads)  # [m/s]
+        for rd in roads.values():
+            self._road_distance[rd.id] = rd.distance
+            self._road_d_cell[rd.id] = rd.d_cell
+            self._road_n_cell[rd.id] = rd.n_cell
+            self._road_v_avg[rd.id] = rd.v_avg
+            self._road_v_std[rd.id] = rd.v_std
+
+        self._grow(capacity)
+
+    def _grow(self, capacity: int) -> None:
+        n_new = capacity - self._capacity
+        self.ids = np.concatenate([self.ids, np.zeros(n_new, dtype=np.int64) - 1])
+        self.rd = np.concatenate([self.rd, np.zeros(n_new, dtype=np.int64) - 1])
+        self.lane = np.concatenate([self.lane, np.zeros(n_new, dtype=np.int64)])
+        self.cell = np.concatenate([self.cell, np.zeros(n_new, dtype=np.int64)])
+        self.velocity = np.concatenate([self.velocity, np.zeros(n_new)])
+        self.profile = np.concatenate([self.profile, np.zeros(n_new)])
+        self.junction_velocity = np.concatenate([self.junction_velocity, np.zeros(n_new)])
+        self.target_junction = np.concatenate([self.target_junction, np.zeros(n_new, dtype=np.int64)])
+        self.jam_counter = np.concatenate([self.jam_counter, np.zeros(n_new)])
+        self.color = np.concatenate([self.color, np.zeros((n_new, 3), dtype=np.uint8)])
+        self._views.extend([None] * n_new)
+        # the lowest slots are reused first
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(
+            self,
+            id: int,
+            rw: int,
+            lane: int,
+            cell: int,
+            target_junction: int,
+            velocity: float = 0,
+            rng: np.random.Generator = None,
+            color: tuple = None
+    ) -> CarView:
+        if id in self._slots.keys():
+            raise RuntimeError(f"Car {id} already exists!")
+        if len(self._free) == 0:
+            self._grow(2 * self._capacity)
+        slot = self._free.pop()
+        self._slots[id] = slot
+        rng = rng if rng is not None else np.random.default_rng()
+
+        self.ids[slot] = id
+        self.rd[slot] = rw
+        self.lane[slot] = lane
+        self.cell[slot] = cell
+        self.profile[slot] = rng.random()
+        self.velocity[slot] = velocity
+        self.target_junction[slot] = target_junction
+        self.junction_velocity[slot] = 5 + (-1 + 2 * self.profile[slot])  # [m/s]
+        self.color[slot] = color if color is not None else 50 + rng.integers(150, size=3)
+        self.jam_counter[slot] = 0
+
+        if self._views[slot] is None:
+            self._views[slot] = CarView(self, slot, rng)
+        else:
+            self._views[slot]._rng = rng
+        return self._views[slot]
+
+    def remove(self, id: int) -> None:
+        slot = self._slots.pop(id)
+        self.ids[slot] = -1
+        self.rd[slot] = -1
+        self._free.append(slot)
+
+    def get_slot(self, id: int) -> int:
+        return self._slots[id]
+
+    def get_active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.ids != -1)
+
+    def get_view(self, slot: int) -> CarView:
+        return self._views[slot]
+
+    def get_random(self, n: int) -> np.ndarray:
+        """
+        Uniform random numbers for the decisions of the cars in a step, ``n`` per slot.
+        Every slot has its own row, so the numbers of a car do not depend on which other cars are stepped (e.g. parked).
+        """
+        return self._rng.random((self._capacity, n))
+
+    def is_at_road_end(self, slots: np.ndarray) -> np.ndarray:
+        return self.cell[slots] == self._road_n_cell[self.rd[slots]] - 1
+
+    def get_road_n_cell(self, slots: np.ndarray) -> np.ndarray:
+        return self._road_n_cell[self.rd[slots]]
+
+    def get_cell_distance(self, slots: np.ndarray) -> np.ndarray:
+        return self._road_d_cell[self.rd[slots]]
+
+    def get_remaining_distance(self, slots: np.ndarray) -> np.ndarray:
+        # distance from the end of the cell of every car to the end of its road [m]
+        rd = self.rd[slots]
+        return self._road_distance[rd] - (self.cell[slots] + 1) * self._road_d_cell[rd]
+
+    def get_movement(self, slots: np.ndarray, t: float, gaps: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Car-following update of the given cars, computed at once.
+        Gaps are the free space to the car ahead of every car [m] (inf if there is none).
+        Returns the new velocities and the number of cells each car wants to move ahead.
+        """
+        rd = self.rd[slots]
+        x_c = self.cell[slots]
+        v = self.velocity[slots]
+        profile = self.profile[slots]
+        d = self._road_d_cell[rd]
+        n_cell = self._road_n_cell[rd]
+
+        a_max = 1.25 + profile
+
+        # v for slowing down before junction or breaking behind the car ahead
+        has_car_ahead = np.isfinite(gaps) if gaps is not None else np.zeros(len(slots), dtype=bool)
+        v_special = np.where(has_car_ahead, 0., self.junction_velocity[slots])
+
+        d_remaining = self._road_distance[rd] - (x_c + 1) * d
+        if gaps is not None:
+            d_remaining = np.minimum(gaps, d_remaining)
+
+        d_safe_stop = ((v - v_special) / a_max) * (v / 2 + v_special / 2) + d  # distance to stop
+        breaking = (v > v_special) & (d_remaining < d_safe_stop)
+
+        v_diff_half = a_max / t / 2
+        v_normal = np.maximum(0, np.minimum(
+            v + v_diff_half * (1 + profile),
+            self._road_v_avg[rd] + self._road_v_std[rd] * (-1 + 2 * profile)
+        ))
+        v_desired = np.where(breaking, v_special, v_normal)
+
+        a = (v_desired - v) / t
+        a = np.clip(a, -a_max, a_max)
+
+        v = np.maximum(0., v + a * t)
+
+        d_c = ((v * t) // d).astype(np.int64)  # desired distance to move
+        d_c[(d_c == 0) & (v != 0)] = 1
+        d_c = np.minimum(d_c, n_cell - x_c - 1)
+
+        return v, d_c
+
+
+class CarView(Car):
+    """
+    Car stored in a VehicleStore. It exposes the interface of Car,
+    but all its attributes are read from and written to the arrays of the store.
+    A view belongs to a slot, so it is reused by the cars stored in the slot later.
+    """
+    __slots__ = ("_store", "_slot")
+
+    def __init__(self, store: VehicleStore, slot: int, rng: np.random.Generator):
+        # Car.__init__ is not called on purpose: the state lives in the store
+        self._store: VehicleStore = store
+        self._slot: int = slot
+        self._rng: np.random.Generator = rng
+
+    @property
+    def id(self) -> int:
+        return int(self._store.ids[self._slot])
+
+    @property
+    def rd(self) -> int:
+        return int(self._store.rd[self._slot])
+
+    @rd.setter
+    def rd(self, value: int):
+        self._store.rd[self._slot] = value
+
+    @property
+    def lane(self) -> int:
+        return int(self._store.lane[self._slot])
+
+    @lane.setter
+    def lane(self, value: int):
+        self._store.lane[self._slot] = value
+
+    @property
+    def cell(self) -> int:
+        return int(self._store.cell[self._slot])
+
+    @cell.setter
+    def cell(self, value: int):
+        self._store.cell[self._slot] = value
+
+    @property
+    def profile(self) -> float:
+        return float(self._store.profile[self._slot])
+
+    @property
+    def velocity(self) -> float:
+        return float(self._store.velocity[self._slot])
+
+    @velocity.setter
+    def velocity(self, value: float):
+        self._store.velocity[self._slot] = value
+
+    @property
+    def target_junction(self) -> int:
+        return int(self._store.target_junction[self._slot])
+
+    @target_junction.setter
+    def target_junction(self, value: int):
+        self._store.target_junction[self._slot] = value
+
+    @property
+    def jam_counter(self) -> float:
+        return float(self._store.jam_counter[self._slot])
+
+    @jam_counter.setter
+    def jam_counter(self, value: float):
+        self._store.jam_counter[self._slot] = value
+
+    @property
+    def _junction_velocity(self) -> float:
+        return float(self._store.junction_velocity[self._slot])
+
+    @property
+    def _color(self) -> tuple:
+        return tuple(int(c) for c in self._store.color[self._slot])